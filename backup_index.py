@@ -0,0 +1,130 @@
+import threading
+import logging
+import json
+import time
+import os
+
+#####################################
+##                                 ##
+##  Backup Store Index             ##
+##    originalStreams contents     ##
+##    keyed gparent\parent\file    ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+BACKUP_INDEX = 'backupIndex.json'
+
+
+def split_key(path):
+    """The gparent, parent and filename of a backup or library path."""
+    parts = path.replace('/', '\\').split('\\')
+    return (['', ''] + parts)[-3:]
+
+
+def folder_key(path):
+    """Casefolded gparent\\parent of a path, the index's folder key."""
+    return '\\'.join(split_key(path)[:2]).casefold()
+
+
+class BackupIndex:
+    """
+    Every file in the backup store, built with one walk of the store and
+    kept current as backups are added, replaced and restored. Entries are
+    grouped per gparent\\parent folder so the scanner can find a converted
+    file's original (whose extension may differ) with a dict lookup instead
+    of searching the whole store for the stem.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._folders = None
+        self._lock = threading.Lock()
+
+    @property
+    def folders(self):
+        """{gparent\\parent: {filename: (gparent\\parent\\filename, size)}}, built on first use."""
+        with self._lock:
+            if self._folders is None:
+                self._folders = self._build()
+            return self._folders
+
+    def _build(self):
+        started = time.perf_counter()
+        folders = {}
+        if not os.path.isdir(self.root):
+            logging.warning(f"Backup folder not found: {self.root}")
+            return folders
+        count = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    self._set(folders, path, os.path.getsize(path))
+                    count += 1
+                except OSError as e:
+                    logging.warning(f"Could not read backup {path}: {e}")
+        logging.info(f"Indexed {count} backups under {self.root} ({time.perf_counter() - started:.1f}s)")
+        return folders
+
+    @staticmethod
+    def _set(folders, path, size):
+        parts = split_key(path)
+        folders.setdefault(folder_key(path), {})[parts[2].casefold()] = ('\\'.join(parts), size)
+
+    def _full_path(self, relative):
+        return os.path.join(self.root, *relative.split('\\'))
+
+    def get(self, backup_path):
+        """Return the size recorded for a backup path, or None."""
+        entry = self.folders.get(folder_key(backup_path), {}).get(split_key(backup_path)[2].casefold())
+        return entry[1] if entry else None
+
+    def find_original(self, filepath):
+        """
+        Return (backup path, size) of the original backed up for a library
+        file: same gparent\\parent folder and same stem, any extension.
+        """
+        stem = os.path.splitext(split_key(filepath)[2])[0].casefold()
+        for name, (relative, size) in self.folders.get(folder_key(filepath), {}).items():
+            if os.path.splitext(name)[0] == stem:
+                return self._full_path(relative), size
+        return None
+
+    def add(self, backup_path, size=None):
+        """Record a new or replaced backup (the size is read from disk if not given)."""
+        if size is None:
+            try:
+                size = os.path.getsize(backup_path)
+            except OSError:
+                return
+        with self._lock:
+            if self._folders is not None:
+                self._set(self._folders, backup_path, size)
+
+    def remove(self, backup_path):
+        """Forget a backup that was moved back into the library."""
+        with self._lock:
+            if self._folders is not None:
+                self._folders.get(folder_key(backup_path), {}).pop(split_key(backup_path)[2].casefold(), None)
+
+    def save(self, index_file=BACKUP_INDEX):
+        """Write the index as {gparent\\parent\\filename: size}, replaced atomically."""
+        entries = dict(entry for files in self.folders.values() for entry in files.values())
+        temp_file = f"{index_file}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'root': self.root, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                       'backups': entries}, f, separators=(',', ':'))
+        os.replace(temp_file, index_file)
+        return len(entries)
+
+    @classmethod
+    def load(cls, index_file=BACKUP_INDEX, root=None):
+        """Load a saved index instead of walking the store."""
+        with open(index_file, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        index = cls(root or saved['root'])
+        index._folders = {}
+        for relative, size in saved['backups'].items():
+            cls._set(index._folders, relative, size)
+        return index
@@ -0,0 +1,145 @@
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from scan_library import CATALOG_COLUMNS
+from media_info import format_duration
+from stub_media import (
+    LIBRARY_DRIVE, BACKUP_BASE_PATH, VIDEO_CODECS, AUDIO_CODECS, RESOLUTIONS, CONTAINERS,
+    CODEC_KBPS_1080P, BITRATE_SPREAD, AUDIO_KBPS, DURATION_MIX, BACKUP_SHARE
+)
+
+#####################################
+##                                 ##
+##  Synthetic Library Generator    ##
+##    Catalogs and placeholder     ##
+##    trees for benchmarks         ##
+##                                 ##
+#####################################
+
+
+def _choose(rng, pairs, size):
+    values = [value for value, _ in pairs]
+    shares = np.array([share for _, share in pairs], dtype=float)
+    return rng.choice(len(values), size=size, p=shares / shares.sum()), values
+
+
+# ==================== CATALOG ====================
+def generate_catalog(rows, seed=0):
+    """Return a synthetic catalog DataFrame with CATALOG_COLUMNS."""
+    rng = np.random.default_rng(seed)
+
+    codec_index, codecs = _choose(rng, VIDEO_CODECS, rows)
+    audio_index, audios = _choose(rng, AUDIO_CODECS, rows)
+    resolution_index, resolutions = _choose(rng, RESOLUTIONS, rows)
+    container_index, containers = _choose(rng, CONTAINERS, rows)
+    duration_index, duration_ranges = _choose(rng, DURATION_MIX, rows)
+
+    video_codec = np.array(codecs, dtype=object)[codec_index]
+    audio_codec = np.array(audios, dtype=object)[audio_index]
+    width = np.array([r[0] for r in resolutions])[resolution_index]
+    height = np.array([r[1] for r in resolutions])[resolution_index]
+    extension = np.array(containers, dtype=object)[container_index]
+
+    low = np.array([r[0] for r in duration_ranges])[duration_index]
+    high = np.array([r[1] for r in duration_ranges])[duration_index]
+    duration = rng.integers(low, high)
+
+    base_kbps = np.array([CODEC_KBPS_1080P[codec] for codec in video_codec], dtype=float)
+    pixel_scale = (width * height / (1920 * 1080)) ** 0.75
+    video_kbps = base_kbps * pixel_scale * rng.lognormal(0, BITRATE_SPREAD, rows)
+    audio_kbps = np.array([AUDIO_KBPS[codec] for codec in audio_codec], dtype=float)
+    kbps = np.round(video_kbps + audio_kbps).astype(int)
+    file_size = (kbps * 1024 / 8 * duration).astype(np.int64)
+
+    ids = np.arange(1, rows + 1)
+    is_episode = duration_index == 0
+    paths = [
+        f"{LIBRARY_DRIVE}\\TV\\Show {i // 200:05d}\\Season {i // 20 % 10 + 1:02d}\\"
+        f"Show {i // 200:05d} - S{i // 20 % 10 + 1:02d}E{i % 20 + 1:02d}.{ext}"
+        if episode else
+        f"{LIBRARY_DRIVE}\\Movies\\Movie {i:07d} ({1950 + i % 75})\\Movie {i:07d} ({1950 + i % 75}).{ext}"
+        for i, ext, episode in zip(ids, extension, is_episode)
+    ]
+
+    df = pd.DataFrame({
+        'id': ids,
+        'filePath': paths,
+        'fileExt': extension,
+        'videoCodecName': video_codec,
+        'audioCodecName': audio_codec,
+        'frameWidth': width,
+        'frameHeight': height,
+        'durationSeconds': duration,
+        'formattedDuration': [format_duration(seconds) for seconds in duration],
+        'fileSize': file_size,
+        'kbps': kbps,
+        'originalFileBackup': '',
+        'originalFileSize': '',
+        'fileMtime': 1_600_000_000_000_000_000 + ids * 1_000_000_000
+    })
+
+    # Some files were converted before and have a backup recorded
+    has_backup = rng.random(rows) < BACKUP_SHARE
+    df.loc[has_backup, 'originalFileBackup'] = [
+        f"{BACKUP_BASE_PATH}\\{os.path.basename(os.path.dirname(path.replace(chr(92), '/')))}\\"
+        f"{os.path.basename(path.replace(chr(92), '/'))}"
+        for path in df.loc[has_backup, 'filePath']
+    ]
+    df.loc[has_backup, 'originalFileSize'] = (df.loc[has_backup, 'fileSize'] * 1.8).round().astype(np.int64).astype(str)
+    return df[CATALOG_COLUMNS]
+
+
+def write_catalog(df, csv_file):
+    """Write a generated catalog the way the scanner does."""
+    df.to_csv(csv_file, index=False)
+    logging.info(f"Wrote {len(df)} synthetic records to {csv_file}")
+
+
+# ==================== PLACEHOLDER TREE ====================
+def generate_tree(root, files, seed=0, file_size=0):
+    """
+    Create `files` placeholder media files under root in a TV/Movies layout.
+    With file_size > 0 each file is extended to that size (sparse where the
+    filesystem supports it). Returns the created paths.
+    """
+    df = generate_catalog(files, seed)
+    created = []
+    for library_path in df['filePath']:
+        relative = library_path[len(LIBRARY_DRIVE) + 1:].replace('\\', os.sep)
+        path = os.path.join(root, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            if file_size:
+                f.truncate(file_size)
+        created.append(path)
+    logging.info(f"Created {len(created)} placeholder files under {root}")
+    return created
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Main entry point for the script."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Generate a synthetic catalog CSV or placeholder library tree',
+        epilog='Example: python benchmarks/generate_library.py 100000 --output fileList.csv'
+    )
+    parser.add_argument('rows', type=int, help='Number of catalog rows / files')
+    parser.add_argument('--output', default='fileList.csv', help='Catalog CSV to write')
+    parser.add_argument('--tree', help='Also create placeholder files under this directory')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (same seed, same library)')
+
+    args = parser.parse_args()
+    write_catalog(generate_catalog(args.rows, args.seed), args.output)
+    if args.tree:
+        generate_tree(args.tree, args.rows, args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+import subprocess
+import contextlib
+import statistics
+import argparse
+import platform
+import tempfile
+import logging
+import shutil
+import json
+import time
+import stat
+import sys
+import io
+import os
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+sys.path.insert(0, REPO_DIR)
+
+import pandas as pd
+import catalog_db
+import scan_library
+import savings_estimator
+import ffmpeg_progress
+import generate_library
+
+#####################################
+##                                 ##
+##  Benchmark Suite                ##
+##    Repeatable timings of each   ##
+##    catalog and conversion stage ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, 'results.jsonl')
+DEFAULT_ROWS = [10000, 100000]
+REPEATS = 3
+SEED = 0
+# Placeholder files for the scan benchmark (probing is per file, so keep it modest)
+SCAN_FILES = 2000
+SCAN_WORKERS = 8
+# Rows journaled and exported per repeat by the update/export benchmarks
+UPDATE_ROWS = 2000
+EXPORT_ROWS = 10000
+PROGRESS_JOBS = 5
+# A median this much slower than the previous version's is flagged
+REGRESSION_THRESHOLD = 0.15
+
+QUERY_WHERE = "WHERE videoCodecName != 'hevc' AND fileSize > 5000000"
+
+
+# ==================== STUB EXECUTABLES ====================
+def make_stub_command(script, work_dir):
+    """
+    Wrap a stub script in something the tools can run as FFPROBE_PATH or
+    FFMPEG_PATH: a .bat file on Windows, a shell script elsewhere.
+    """
+    name = os.path.splitext(os.path.basename(script))[0]
+    if os.name == 'nt':
+        path = os.path.join(work_dir, f"{name}.bat")
+        with open(path, 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        path = os.path.join(work_dir, name)
+        with open(path, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+
+# ==================== TIMING ====================
+def time_benchmark(run, setup=None, repeats=REPEATS):
+    """Time run(state) `repeats` times; setup() builds a fresh state for each repeat."""
+    timings = []
+    for _ in range(repeats):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        run(state)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def get_version():
+    """Return the git commit of the tree being benchmarked."""
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ==================== BENCHMARKS ====================
+def catalog_benchmarks(rows, work_dir, repeats):
+    """Catalog import, load, query, savings estimate, journal updates and command export."""
+    import query_csv_AIRefactored as tool
+
+    csv_file = os.path.join(work_dir, f"catalog_{rows}.csv")
+    generate_library.write_catalog(generate_library.generate_catalog(rows, SEED), csv_file)
+    results = {}
+
+    def fresh_db():
+        db_file = os.path.join(work_dir, f"catalog_{rows}_{time.monotonic_ns()}.db")
+        return catalog_db.connect(db_file)
+
+    def run_import(conn):
+        catalog_db.import_csv(conn, csv_file)
+        conn.close()
+
+    results['catalog_import'] = time_benchmark(run_import, fresh_db, repeats)
+
+    db_file = os.path.join(work_dir, f"catalog_{rows}.db")
+    conn = catalog_db.connect(db_file)
+    catalog_db.import_csv(conn, csv_file)
+    conn.close()
+
+    def run_load(_):
+        conn = catalog_db.open_catalog(db_file, csv_file='', journal_file=os.path.join(work_dir, 'load.journal'))
+        pd.read_sql_query(f"SELECT * FROM {catalog_db.CATALOG_TABLE}", conn)
+        conn.close()
+
+    results['catalog_load'] = time_benchmark(run_load, repeats=repeats)
+
+    conn = catalog_db.open_catalog(db_file, csv_file='', journal_file=os.path.join(work_dir, 'load.journal'))
+    query = f"SELECT * FROM {catalog_db.CATALOG_TABLE} {QUERY_WHERE}"
+    results['query'] = time_benchmark(lambda _: pd.read_sql_query(query, conn), repeats=repeats)
+    result_df = pd.read_sql_query(query, conn)
+
+    def run_estimate(_):
+        estimated = savings_estimator.estimate_savings(result_df, tool.NVENC_MAXRATE, tool.NVENC_CQ)
+        savings_estimator.order_candidates(estimated)
+
+    results['savings_estimate'] = time_benchmark(run_estimate, repeats=repeats)
+
+    # Journal appends for converted files, then compaction into the catalog
+    update_rows = result_df.head(UPDATE_ROWS)
+    tool.UPDATE_JOURNAL = os.path.join(work_dir, 'update.journal')
+
+    def run_updates(_):
+        df = result_df.copy()
+        for row in update_rows.itertuples():
+            tool.update_csv_with_conversion_results(
+                df, row.id, ['fileSize', 'videoCodecName'], [int(row.fileSize) // 2, 'hevc']
+            )
+
+    results['journal_update'] = time_benchmark(run_updates, repeats=repeats)
+
+    def setup_compact():
+        for row in update_rows.itertuples():
+            catalog_db.journal_update(row.id, ['videoCodecName'], ['hevc'], tool.UPDATE_JOURNAL)
+
+    results['journal_compact'] = time_benchmark(
+        lambda _: catalog_db.compact_journal(conn, tool.UPDATE_JOURNAL), setup_compact, repeats
+    )
+
+    # Display-mode command export
+    export_rows = result_df.head(EXPORT_ROWS)
+    tool.COMMAND_EXPORT_FILE = os.path.join(work_dir, 'commandExport.json')
+
+    def run_export(_):
+        for index, row in enumerate(export_rows.itertuples()):
+            command_object, _ = tool.prepare_conversion(row, '-n')
+            tool.append_command_export(command_object, index == 0)
+
+    results['command_export'] = time_benchmark(run_export, repeats=repeats)
+
+    # Vectorized plan for the whole result set
+    tool.query = query
+    plan_file = os.path.join(work_dir, 'conversionPlan.jsonl')
+    results['plan_write'] = time_benchmark(lambda _: tool.write_plan(result_df, plan_file), repeats=repeats)
+
+    try:
+        import catalog_columnar
+    except ImportError:
+        logging.info("pyarrow not installed - skipping the columnar benchmark")
+    else:
+        parquet_file = os.path.join(work_dir, f"catalog_{rows}.parquet")
+        catalog_columnar.export_columnar(conn, parquet_file)
+        results['columnar_query'] = time_benchmark(
+            lambda _: catalog_columnar.query_columnar(QUERY_WHERE, parquet_file=parquet_file), repeats=repeats
+        )
+
+    conn.close()
+    return results
+
+
+def scan_benchmarks(work_dir, ffprobe_path, repeats, files=SCAN_FILES):
+    """Full and incremental scans of a placeholder tree with the stub ffprobe."""
+    root = os.path.join(work_dir, 'library')
+    generate_library.generate_tree(root, files, SEED)
+    scan_library.FFPROBE_PATH = ffprobe_path
+    output_file = os.path.join(work_dir, 'scan.csv')
+    db_file = os.path.join(work_dir, 'scan.db')
+    cache_file = os.path.join(work_dir, 'scanProbes.db')
+    results = {}
+
+    def clean():
+        for path in (output_file, db_file):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def run_scan(incremental, cache=''):
+        # Keep the scanner's progress line out of the benchmark report
+        with contextlib.redirect_stdout(io.StringIO()):
+            scan_library.scan_library([root], [], output_file, SCAN_WORKERS, backup_root='',
+                                      incremental=incremental, db_file=db_file, cache_file=cache)
+
+    # Full scans probe every file; scan_cached repeats them with a warm probe cache
+    results['scan_full'] = time_benchmark(lambda _: run_scan(False), clean, repeats)
+    results['scan_incremental'] = time_benchmark(lambda _: run_scan(True), repeats=repeats)
+    clean()
+    run_scan(False, cache_file)
+    results['scan_cached'] = time_benchmark(lambda _: run_scan(False, cache_file), clean, repeats)
+    return results
+
+
+def progress_benchmarks(work_dir, ffmpeg_path, repeats, jobs=PROGRESS_JOBS):
+    """Parse the -progress stream of stub encodes the way the conversion loop does."""
+    import query_csv_AIRefactored as tool
+
+    root = os.path.join(work_dir, 'encode')
+    sources = generate_library.generate_tree(root, jobs, SEED, file_size=1024 * 1024)
+
+    def run_encodes(_):
+        # Terminal title warnings on non-Windows hosts would swamp the output
+        logging.disable(logging.WARNING)
+        for index, source in enumerate(sources):
+            output_path = os.path.join(work_dir, f"out_{index}.mkv")
+            command = ffmpeg_progress.with_progress([ffmpeg_path, '-y', '-i', source, '-c:v', 'hevc_nvenc', output_path])
+            process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                       text=True, bufsize=1)
+            row = pd.Series({'id': index, 'durationSeconds': 3600})
+            tool.process_conversion_output(process, row, index + 1, jobs, os.path.basename(source), io.StringIO())
+        logging.disable(logging.NOTSET)
+
+    return {'encode_progress': time_benchmark(run_encodes, repeats=repeats)}
+
+
+# ==================== RESULTS ====================
+def load_previous_results(results_file=RESULTS_FILE):
+    """Return the latest recorded result per (benchmark, rows) from other versions."""
+    previous = {}
+    if not os.path.exists(results_file):
+        return previous
+    with open(results_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            previous[(record['benchmark'], record['rows'], record['version'])] = record
+    return previous
+
+
+def record_results(name, rows, timings, version, previous, results_file=RESULTS_FILE):
+    """Append one result and print it next to the last result from another version."""
+    record = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'version': version,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'benchmark': name,
+        'rows': rows,
+        'repeats': len(timings),
+        'best': round(min(timings), 6),
+        'median': round(statistics.median(timings), 6)
+    }
+    with open(results_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+
+    baseline = None
+    for (bench, bench_rows, bench_version), old in previous.items():
+        if bench == name and bench_rows == rows and bench_version != version:
+            if baseline is None or old['time'] > baseline['time']:
+                baseline = old
+
+    line = f"{name:<18} {rows:>9,} rows  best {record['best']:9.4f}s  median {record['median']:9.4f}s"
+    if baseline and baseline['median'] > 0:
+        change = record['median'] / baseline['median'] - 1
+        flag = '  REGRESSION' if change > REGRESSION_THRESHOLD else ''
+        line += f"  ({change:+.0%} vs {baseline['version']}){flag}"
+    print(line)
+    return record
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Main entry point for the script."""
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Benchmark catalog, query, update, export, scan and progress stages on synthetic data',
+        epilog='Example: python benchmarks/run_benchmarks.py --rows 10000 100000 1000000'
+    )
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS,
+                        help=f'Catalog sizes to benchmark (default: {DEFAULT_ROWS})')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help='Timed repeats per benchmark')
+    parser.add_argument('--scan-files', type=int, default=SCAN_FILES, help='Placeholder files for the scan benchmark')
+    parser.add_argument('--skip-scan', action='store_true', help='Skip the scan and progress benchmarks')
+    parser.add_argument('--results', default=RESULTS_FILE, help='Results file (JSON lines)')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary work directory')
+
+    args = parser.parse_args()
+    version = get_version()
+    previous = load_previous_results(args.results)
+    work_dir = tempfile.mkdtemp(prefix='libraryBenchmark_')
+    start_dir = os.getcwd()
+
+    # The conversion tool writes its log and export files to the working directory
+    os.chdir(work_dir)
+    try:
+        for rows in args.rows:
+            for name, timings in catalog_benchmarks(rows, work_dir, args.repeats).items():
+                record_results(name, rows, timings, version, previous, args.results)
+
+        if not args.skip_scan:
+            stubs = os.path.join(work_dir, 'stubs')
+            os.makedirs(stubs)
+            ffprobe_path = make_stub_command(os.path.join(BENCHMARK_DIR, 'stub_ffprobe.py'), stubs)
+            ffmpeg_path = make_stub_command(os.path.join(BENCHMARK_DIR, 'stub_ffmpeg.py'), stubs)
+            for name, timings in scan_benchmarks(work_dir, ffprobe_path, args.repeats, args.scan_files).items():
+                record_results(name, args.scan_files, timings, version, previous, args.results)
+            for name, timings in progress_benchmarks(work_dir, ffmpeg_path, args.repeats).items():
+                record_results(name, PROGRESS_JOBS, timings, version, previous, args.results)
+    finally:
+        os.chdir(start_dir)
+        if args.keep:
+            print(f"Work directory kept: {work_dir}")
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+import time
+import sys
+import os
+
+from stub_media import describe_file
+
+#####################################
+##                                 ##
+##  Stub ffmpeg                    ##
+##    Fake encodes with realistic  ##
+##    log and -progress output     ##
+##                                 ##
+#####################################
+
+# Encode speed in x realtime; the default keeps benchmarks short
+ENCODE_SPEED = float(os.environ.get('STUB_FFMPEG_SPEED', '5000'))
+# Wall-clock seconds between -progress blocks (real ffmpeg uses 0.5)
+PROGRESS_INTERVAL = float(os.environ.get('STUB_FFMPEG_PROGRESS_INTERVAL', '0.01'))
+# Output size as a fraction of the input size
+OUTPUT_RATIO = float(os.environ.get('STUB_FFMPEG_RATIO', '0.5'))
+FRAME_RATE = 23.976
+
+
+def get_option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args[:-1] else default
+
+
+def write_progress(out_seconds, total_size, speed, state):
+    sys.stdout.write(
+        f"frame={int(out_seconds * FRAME_RATE)}\n"
+        f"fps={FRAME_RATE * speed:.2f}\n"
+        f"stream_0_0_q=28.0\n"
+        f"bitrate={total_size * 8 / 1000 / max(out_seconds, 0.001):.1f}kbits/s\n"
+        f"total_size={total_size}\n"
+        f"out_time_us={int(out_seconds * 1_000_000)}\n"
+        f"out_time_ms={int(out_seconds * 1_000_000)}\n"
+        f"out_time={int(out_seconds // 3600):02d}:{int(out_seconds % 3600 // 60):02d}:{out_seconds % 60:09.6f}\n"
+        f"dup_frames=0\n"
+        f"drop_frames=0\n"
+        f"speed={speed:.3g}x\n"
+        f"progress={state}\n"
+    )
+    sys.stdout.flush()
+
+
+def main(args):
+    output_path = args[-1]
+    input_path = get_option(args, '-i')
+    if input_path is None or not os.path.exists(input_path):
+        sys.stderr.write(f"{input_path}: No such file or directory\n")
+        return 1
+    if '-n' in args and os.path.exists(output_path):
+        sys.stderr.write(f"File '{output_path}' already exists. Exiting.\n")
+        return 1
+
+    details = describe_file(input_path)
+    start = float(get_option(args, '-ss', 0))
+    duration = float(get_option(args, '-t', details['duration'] - start))
+    output_size = int(os.path.getsize(input_path) * OUTPUT_RATIO * duration / max(details['duration'], 1))
+
+    sys.stderr.write(
+        f"ffmpeg version stub Copyright (c) 2000-2024 the FFmpeg developers\n"
+        f"Input #0, matroska,webm, from '{input_path}':\n"
+        f"  Duration: {details['duration']:.2f}, start: 0.000000\n"
+        f"  Stream #0:0: Video: {details['videoCodec']}, {details['width']}x{details['height']}\n"
+        f"Output #0, matroska, to '{output_path}':\n"
+        f"Press [q] to stop, [?] for help\n"
+    )
+    sys.stderr.flush()
+
+    show_progress = '-progress' in args
+    wall_seconds = duration / ENCODE_SPEED
+    started = time.monotonic()
+    while True:
+        elapsed = time.monotonic() - started
+        if elapsed >= wall_seconds:
+            break
+        if show_progress:
+            done = duration * elapsed / wall_seconds
+            write_progress(done, int(output_size * done / duration), ENCODE_SPEED, 'continue')
+        time.sleep(min(PROGRESS_INTERVAL, wall_seconds - elapsed))
+
+    with open(output_path, 'wb') as f:
+        f.truncate(output_size)
+    if show_progress:
+        write_progress(duration, output_size, ENCODE_SPEED, 'end')
+    sys.stderr.write(f"video:{output_size // 1024}kB audio:0kB subtitle:0kB muxing overhead: 0.1%\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+import json
+import time
+import sys
+import os
+
+from stub_media import describe_file
+
+#####################################
+##                                 ##
+##  Stub ffprobe                   ##
+##    Answers the probes the tools ##
+##    make without real media      ##
+##                                 ##
+#####################################
+
+# Seconds each probe takes, to simulate slow disks or network shares
+PROBE_DELAY = float(os.environ.get('STUB_FFPROBE_DELAY', '0'))
+KEYFRAME_INTERVAL = float(os.environ.get('STUB_KEYFRAME_INTERVAL', '4'))
+
+
+def stream_info(path):
+    """ffprobe -show_streams/-show_entries format=duration output."""
+    details = describe_file(path)
+    streams = [{
+        'index': 0,
+        'codec_name': details['videoCodec'],
+        'codec_type': 'video',
+        'width': details['width'],
+        'height': details['height']
+    }]
+    if details['audioCodec'] != 'None':
+        streams.append({'index': 1, 'codec_name': details['audioCodec'], 'codec_type': 'audio'})
+    return {'streams': streams, 'format': {'duration': f"{details['duration']:.6f}"}}
+
+
+def packet_lines(path):
+    """ffprobe -show_entries packet=pts_time,flags -of csv=p=0 output."""
+    duration = describe_file(path)['duration']
+    frame_time = 1 / 24
+    keyframe_every = max(int(KEYFRAME_INTERVAL / frame_time), 1)
+    for frame in range(int(duration / frame_time)):
+        flags = 'K__' if frame % keyframe_every == 0 else '___'
+        yield f"{frame * frame_time:.6f},{flags}"
+
+
+def main(args):
+    path = args[-1]
+    if not os.path.exists(path):
+        sys.stderr.write(f"{path}: No such file or directory\n")
+        return 1
+    time.sleep(PROBE_DELAY)
+
+    if any('packet=' in arg for arg in args):
+        sys.stdout.write('\n'.join(packet_lines(path)) + '\n')
+    else:
+        sys.stdout.write(json.dumps(stream_info(path), indent=1) + '\n')
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
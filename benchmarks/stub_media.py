@@ -0,0 +1,68 @@
+import hashlib
+import os
+
+#####################################
+##                                 ##
+##  Synthetic Media Model          ##
+##    Distributions shared by the  ##
+##    generator and the stubs      ##
+##                                 ##
+#####################################
+
+# ==================== DISTRIBUTIONS ====================
+LIBRARY_DRIVE = 'M:\\Public Libraries'
+BACKUP_BASE_PATH = '.\\originalStreams'
+
+# (value, share) pairs, roughly matching a mixed movie/TV library
+VIDEO_CODECS = [
+    ('h264', 0.55), ('hevc', 0.20), ('mpeg4', 0.08), ('mpeg2video', 0.05),
+    ('vc1', 0.04), ('wmv3', 0.03), ('vp9', 0.03), ('msmpeg4v3', 0.02)
+]
+AUDIO_CODECS = [
+    ('aac', 0.45), ('ac3', 0.30), ('eac3', 0.10), ('dts', 0.08), ('truehd', 0.04), ('None', 0.03)
+]
+RESOLUTIONS = [
+    ((1920, 1080), 0.50), ((1280, 720), 0.20), ((720, 480), 0.15),
+    ((3840, 2160), 0.10), ((640, 360), 0.05)
+]
+CONTAINERS = [('mkv', 0.70), ('mp4', 0.20), ('avi', 0.07), ('wmv', 0.03)]
+
+# Median source video bitrate (kbps) at 1080p per codec; spread is log-normal
+CODEC_KBPS_1080P = {
+    'h264': 9000, 'hevc': 3500, 'mpeg4': 2200, 'mpeg2video': 12000,
+    'vc1': 14000, 'wmv3': 6000, 'vp9': 3000, 'msmpeg4v3': 1800
+}
+BITRATE_SPREAD = 0.45
+AUDIO_KBPS = {'aac': 192, 'ac3': 448, 'eac3': 640, 'dts': 1509, 'truehd': 3500, 'None': 0}
+
+# Episodes, movies and trailers (seconds)
+DURATION_MIX = [((1200, 3600), 0.60), ((5000, 9500), 0.35), ((60, 180), 0.05)]
+BACKUP_SHARE = 0.10
+
+
+# ==================== FILE DETAILS ====================
+def describe_file(path):
+    """
+    Deterministic media details for a placeholder file, derived from its
+    name. Used by the stub ffprobe/ffmpeg so repeated runs see the same data.
+    """
+    digest = hashlib.md5(os.path.basename(path).encode('utf-8')).digest()
+    pick = int.from_bytes(digest[:4], 'little') / 2 ** 32
+
+    def weighted(pairs, fraction):
+        total = 0.0
+        for value, share in pairs:
+            total += share
+            if fraction < total:
+                return value
+        return pairs[-1][0]
+
+    (low, high) = weighted(DURATION_MIX, pick)
+    (width, height) = weighted(RESOLUTIONS, digest[4] / 256)
+    return {
+        'videoCodec': weighted(VIDEO_CODECS, digest[5] / 256),
+        'audioCodec': weighted(AUDIO_CODECS, digest[6] / 256),
+        'width': width,
+        'height': height,
+        'duration': round(low + (high - low) * (digest[7] / 256), 3)
+    }
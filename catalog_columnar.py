@@ -0,0 +1,429 @@
+from collections import namedtuple
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow as pa
+import pandas as pd
+import numpy as np
+import argparse
+import logging
+import sys
+import os
+import re
+import catalog_db
+
+#####################################
+##                                 ##
+##  Columnar Catalog Backend       ##
+##    Parquet snapshot of the      ##
+##    catalog for fast queries     ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+CATALOG_PARQUET = 'fileList.parquet'
+# Rows per row group; matching rows are read one row group at a time
+ROW_GROUP_ROWS = 65536
+
+# Low-cardinality strings are stored as categoricals
+CATEGORICAL_COLUMNS = ['fileExt', 'videoCodecName', 'audioCodecName']
+
+# Fixed-width (nullable) integer types for numeric columns
+INTEGER_DTYPES = {
+    'id': 'UInt32',
+    'frameWidth': 'UInt16',
+    'frameHeight': 'UInt16',
+    'durationSeconds': 'UInt32',
+    'fileSize': 'UInt64',
+    'kbps': 'UInt32',
+    'originalFileSize': 'UInt64',
+    'fileMtime': 'Int64',
+    'duplicateOf': 'UInt32'
+}
+
+# Tokens of the WHERE clauses the query scripts write
+SQL_TOKEN = re.compile(r"""\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<string>'(?:[^']|'')*')
+    |(?P<quoted>"(?:[^"]|"")*")
+    |(?P<name>[A-Za-z_]\w*)
+    |(?P<op><>|!=|==|<=|>=|[=<>(),+\-*/])
+)""", re.VERBOSE)
+SQL_KEYWORDS = {'AND', 'OR', 'NOT', 'IS', 'NULL', 'LIKE', 'IN', 'BETWEEN'}
+COMPARISONS = {
+    '=': lambda a, b: a == b, '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b, '<>': lambda a, b: a != b,
+    '<': lambda a, b: a < b, '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b, '>=': lambda a, b: a >= b
+}
+ARITHMETIC = {'+': pc.add_checked, '-': pc.subtract_checked, '*': pc.multiply_checked, '/': pc.divide_checked}
+
+
+# ==================== EXPORT ====================
+def apply_compact_dtypes(df):
+    """Convert catalog columns to categorical and fixed-width integer dtypes."""
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    for column, dtype in INTEGER_DTYPES.items():
+        if column in df.columns:
+            try:
+                df[column] = pd.to_numeric(df[column], errors='coerce').round().astype(dtype)
+            except (TypeError, ValueError, OverflowError) as e:
+                logging.warning(f"Keeping {column} as {df[column].dtype}: {e}")
+    return df
+
+
+def export_columnar(conn, parquet_file=CATALOG_PARQUET):
+    """Write the SQLite catalog to a Parquet snapshot with compact dtypes."""
+    # Checkpoint first so the database file is not written after the snapshot
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    df = pd.read_sql_query(f"SELECT * FROM {catalog_db.CATALOG_TABLE}", conn)
+    apply_compact_dtypes(df).to_parquet(parquet_file, index=False, row_group_size=ROW_GROUP_ROWS)
+    logging.info(f"Exported {len(df)} records to {parquet_file}")
+    return len(df)
+
+
+def is_stale(parquet_file=CATALOG_PARQUET, db_file=catalog_db.CATALOG_DB,
+             journal_file=catalog_db.UPDATE_JOURNAL):
+    """True if the catalog database or its update journal changed after the snapshot was written."""
+    if not os.path.exists(parquet_file):
+        return True
+    snapshot_mtime = os.path.getmtime(parquet_file)
+    # An empty write-ahead log is created by every connection and holds no changes
+    sources = (db_file, f"{db_file}-wal", journal_file, f"{journal_file}.compacting")
+    return any(os.path.exists(path) and os.path.getsize(path) > 0 and os.path.getmtime(path) > snapshot_mtime
+               for path in sources)
+
+
+def refresh_if_stale(conn=None, parquet_file=CATALOG_PARQUET, db_file=catalog_db.CATALOG_DB,
+                     journal_file=catalog_db.UPDATE_JOURNAL):
+    """
+    Re-export the snapshot if it is older than the catalog, so queries never
+    see files as unconverted after their conversion was recorded. Returns
+    True if it was re-exported.
+    """
+    if not os.path.exists(db_file) or not is_stale(parquet_file, db_file, journal_file):
+        return False
+    logging.info(f"{parquet_file} is older than {db_file} - exporting it again")
+    if conn is not None:
+        catalog_db.compact_journal(conn, journal_file)
+        export_columnar(conn, parquet_file)
+        return True
+    conn = catalog_db.open_catalog(db_file, csv_file='', journal_file=journal_file)
+    try:
+        export_columnar(conn, parquet_file)
+    finally:
+        conn.close()
+    return True
+
+
+# ==================== WHERE CLAUSES ====================
+class UnsupportedClause(ValueError):
+    """A WHERE clause the columnar backend cannot evaluate."""
+
+
+# A parsed operand: its expression, whether it is a condition, the column
+# type if it is a bare column, and the value if it is a literal
+Operand = namedtuple('Operand', 'expr is_condition column_type literal')
+
+
+def tokenize(text):
+    """Split a WHERE clause into (kind, value) tokens; keywords are upper-cased."""
+    tokens = []
+    position = 0
+    while text[position:].strip():
+        match = SQL_TOKEN.match(text, position)
+        if not match:
+            raise UnsupportedClause(f"Cannot parse the WHERE clause near: {text[position:].strip()[:20]}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.upper() in SQL_KEYWORDS:
+            kind, value = 'keyword', value.upper()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class WhereClause:
+    """
+    A SQLite WHERE clause translated into a pyarrow compute expression, so
+    the query scripts keep their SQL on the Parquet catalog. Covers what
+    they use: comparisons, AND/OR/NOT, IS [NOT] NULL, [NOT] LIKE, [NOT] IN,
+    [NOT] BETWEEN, + - * /, and instr, lower, upper, length, abs, ifnull
+    and coalesce. Column names match case-insensitively, as in SQLite.
+    """
+
+    def __init__(self, where_clause, schema):
+        self.columns = {name.casefold(): name for name in schema.names}
+        self.types = {field.name: field.type.value_type if pa.types.is_dictionary(field.type) else field.type
+                      for field in schema}
+        self.referenced = []
+        self.tokens = tokenize(where_clause)
+        self.position = 0
+        if self.peek() and self.peek()[0] == 'name' and self.peek()[1].upper() == 'WHERE':
+            self.position += 1
+        self.expression = self.condition(self.parse_or()) if self.tokens[self.position:] else None
+        if self.peek():
+            raise UnsupportedClause(f"Unexpected '{self.peek()[1]}' in the WHERE clause")
+
+    # Token helpers
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def accept(self, kind, value=None):
+        token = self.peek()
+        if token and token[0] == kind and (value is None or token[1] == value):
+            self.position += 1
+            return token
+        return None
+
+    def expect(self, kind, value=None):
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.peek()[1] if self.peek() else 'the end'
+            raise UnsupportedClause(f"Expected {value or kind} in the WHERE clause, found {found}")
+        return token
+
+    # Operands
+    def condition(self, operand):
+        """Use an operand as a condition; numbers are true when not zero, as in SQLite."""
+        return operand.expr if operand.is_condition else operand.expr != 0
+
+    def column(self, name):
+        column = self.columns.get(name.casefold())
+        if column is None:
+            raise UnsupportedClause(f"no such column: {name}")
+        if column not in self.referenced:
+            self.referenced.append(column)
+        return Operand(pc.field(column), False, self.types[column], None)
+
+    def literal(self, value):
+        return Operand(pc.scalar(value), False, None, value)
+
+    def coerce(self, operand, other):
+        """Give a string literal compared with a numeric column that column's type, like SQLite's affinity."""
+        if isinstance(operand.literal, str) and other.column_type is not None and (
+                pa.types.is_integer(other.column_type) or pa.types.is_floating(other.column_type)):
+            try:
+                return self.literal(float(operand.literal) if pa.types.is_floating(other.column_type)
+                                    else int(float(operand.literal)))
+            except ValueError:
+                pass
+        return operand
+
+    # Grammar, lowest precedence first
+    def parse_or(self):
+        left = self.parse_and()
+        while self.accept('keyword', 'OR'):
+            left = Operand(self.condition(left) | self.condition(self.parse_and()), True, None, None)
+        return left
+
+    def parse_and(self):
+        left = self.parse_not()
+        while self.accept('keyword', 'AND'):
+            left = Operand(self.condition(left) & self.condition(self.parse_not()), True, None, None)
+        return left
+
+    def parse_not(self):
+        if self.accept('keyword', 'NOT'):
+            return Operand(~self.condition(self.parse_not()), True, None, None)
+        return self.parse_predicate()
+
+    def parse_predicate(self):
+        left = self.parse_sum()
+        token = self.peek()
+        if token and token[0] == 'op' and token[1] in COMPARISONS:
+            self.position += 1
+            right = self.parse_sum()
+            left, right = self.coerce(left, right), self.coerce(right, left)
+            return Operand(COMPARISONS[token[1]](left.expr, right.expr), True, None, None)
+
+        if self.accept('keyword', 'IS'):
+            negate = self.accept('keyword', 'NOT')
+            self.expect('keyword', 'NULL')
+            return Operand(left.expr.is_valid() if negate else left.expr.is_null(nan_is_null=True),
+                           True, None, None)
+
+        negate = bool(self.peek() == ('keyword', 'NOT') and self.peek(1) in
+                      (('keyword', 'LIKE'), ('keyword', 'IN'), ('keyword', 'BETWEEN')))
+        if negate:
+            self.position += 1
+        if self.accept('keyword', 'LIKE'):
+            pattern = self.parse_sum().literal
+            if not isinstance(pattern, str):
+                raise UnsupportedClause("LIKE needs a string pattern")
+            # SQLite's LIKE ignores the case of ASCII letters
+            result = pc.match_like(left.expr, pattern=pattern, ignore_case=True)
+        elif self.accept('keyword', 'IN'):
+            self.expect('op', '(')
+            values = [self.coerce(self.parse_sum(), left).literal]
+            while self.accept('op', ','):
+                values.append(self.coerce(self.parse_sum(), left).literal)
+            self.expect('op', ')')
+            # NULL IN (...) is NULL in SQL, not false
+            result = pc.if_else(left.expr.is_valid(), pc.is_in(left.expr, value_set=pa.array(values)),
+                                pa.scalar(None, pa.bool_()))
+        elif self.accept('keyword', 'BETWEEN'):
+            low = self.coerce(self.parse_sum(), left)
+            self.expect('keyword', 'AND')
+            high = self.coerce(self.parse_sum(), left)
+            result = (left.expr >= low.expr) & (left.expr <= high.expr)
+        else:
+            if negate:
+                raise UnsupportedClause("Expected LIKE, IN or BETWEEN after NOT")
+            return left
+        return Operand(~result if negate else result, True, None, None)
+
+    def parse_sum(self):
+        left = self.parse_product()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            operator = self.tokens[self.position][1]
+            self.position += 1
+            left = Operand(ARITHMETIC[operator](left.expr, self.parse_product().expr), False, None, None)
+        return left
+
+    def parse_product(self):
+        left = self.parse_unary()
+        while self.peek() in (('op', '*'), ('op', '/')):
+            operator = self.tokens[self.position][1]
+            self.position += 1
+            left = Operand(ARITHMETIC[operator](left.expr, self.parse_unary().expr), False, None, None)
+        return left
+
+    def parse_unary(self):
+        if self.accept('op', '-'):
+            operand = self.parse_unary()
+            if operand.literal is not None:
+                return self.literal(-operand.literal)
+            # 0 - x rather than negate, which has no kernels for the unsigned columns
+            return Operand(pc.subtract_checked(pc.scalar(0), operand.expr), False, None, None)
+        self.accept('op', '+')
+        return self.parse_primary()
+
+    def parse_primary(self):
+        token = self.peek()
+        if token is None:
+            raise UnsupportedClause("The WHERE clause ends early")
+        kind, value = token
+        self.position += 1
+        if kind == 'number':
+            return self.literal(float(value) if any(c in value for c in '.eE') else int(value))
+        if kind == 'string':
+            return self.literal(value[1:-1].replace("''", "'"))
+        if kind == 'keyword' and value == 'NULL':
+            return self.literal(None)
+        if kind == 'quoted':
+            return self.column(value[1:-1].replace('""', '"'))
+        if kind == 'name':
+            if self.accept('op', '('):
+                return self.parse_function(value)
+            return self.column(value)
+        if token == ('op', '('):
+            operand = self.parse_or()
+            self.expect('op', ')')
+            return operand
+        raise UnsupportedClause(f"Unexpected '{value}' in the WHERE clause")
+
+    def parse_function(self, name):
+        arguments = [self.parse_or()]
+        while self.accept('op', ','):
+            arguments.append(self.parse_or())
+        self.expect('op', ')')
+        name = name.casefold()
+
+        if name == 'instr' and len(arguments) == 2 and isinstance(arguments[1].literal, str):
+            # 1-based position, 0 when not found
+            found = pc.find_substring(arguments[0].expr, pattern=arguments[1].literal)
+            return Operand(pc.add(found, 1), False, None, None)
+        if name in ('lower', 'upper', 'length', 'abs') and len(arguments) == 1:
+            function = {'lower': pc.utf8_lower, 'upper': pc.utf8_upper,
+                        'length': pc.utf8_length, 'abs': pc.abs_checked}[name]
+            return Operand(function(arguments[0].expr), False, None, None)
+        if name in ('ifnull', 'coalesce') and len(arguments) >= 2:
+            return Operand(pc.coalesce(*(argument.expr for argument in arguments)), False, None, None)
+        raise UnsupportedClause(f"The columnar backend does not support {name}() with these arguments")
+
+
+# ==================== QUERY ====================
+def get_parquet_columns(parquet_file=CATALOG_PARQUET):
+    """Read the column names from the Parquet schema without loading data."""
+    return pq.read_schema(parquet_file).names
+
+
+def query_columnar(where_clause, columns=None, parquet_file=CATALOG_PARQUET):
+    """
+    Run a WHERE clause against the Parquet catalog, exported again first if
+    the catalog database changed since. Only the columns the clause
+    references are loaded to evaluate it, then the requested output columns
+    are read from the row groups holding the matching rows.
+    """
+    refresh_if_stale(parquet_file=parquet_file)
+    schema = pq.read_schema(parquet_file)
+    output_columns = columns or schema.names
+    clause = WhereClause(where_clause, schema)
+
+    if clause.expression is None:
+        return pd.read_parquet(parquet_file, columns=output_columns)
+
+    # Evaluate the clause as a pyarrow filter over just the referenced columns
+    filter_table = pq.read_table(parquet_file, columns=clause.referenced)
+    # String functions have no kernels for dictionary (categorical) columns
+    for index, name in enumerate(filter_table.column_names):
+        if pa.types.is_dictionary(filter_table.schema.field(index).type):
+            filter_table = filter_table.set_column(index, name, filter_table.column(index).cast(clause.types[name]))
+    filter_table = filter_table.append_column('_row', pa.array(np.arange(filter_table.num_rows)))
+    positions = filter_table.filter(clause.expression).column('_row').to_numpy()
+
+    return read_rows(parquet_file, positions, output_columns)
+
+
+def read_rows(parquet_file, positions, columns):
+    """
+    Load the given rows (in the given order) by reading only the row groups
+    that hold them.
+    """
+    parquet = pq.ParquetFile(parquet_file)
+    group_rows = np.array([parquet.metadata.row_group(index).num_rows
+                           for index in range(parquet.num_row_groups)], dtype=np.int64)
+    group_starts = np.concatenate(([0], np.cumsum(group_rows)))
+    positions = np.asarray(positions, dtype=np.int64)
+    position_groups = np.searchsorted(group_starts, positions, side='right') - 1
+    groups = np.unique(position_groups)
+
+    if not len(groups):
+        return parquet.schema_arrow.empty_table().select(columns).to_pandas()
+    # Offsets of the selected row groups once read back to back
+    read_starts = np.concatenate(([0], np.cumsum(group_rows[groups])))[:-1]
+    offsets = positions - group_starts[position_groups] + read_starts[np.searchsorted(groups, position_groups)]
+    table = parquet.read_row_groups(groups.tolist(), columns=columns)
+    return table.take(offsets).to_pandas()
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Export the catalog database to the columnar format."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Export the SQLite catalog to a columnar Parquet snapshot',
+        epilog='Example: python catalog_columnar.py --db fileList.db'
+    )
+    parser.add_argument('parquet_file', nargs='?', default=CATALOG_PARQUET, help='Parquet file to write')
+    parser.add_argument('--db', default=catalog_db.CATALOG_DB, help='Catalog database file')
+
+    args = parser.parse_args()
+    conn = catalog_db.open_catalog(args.db)
+    try:
+        export_columnar(conn, args.parquet_file)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Columnar export failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,339 @@
+import argparse
+import logging
+import sqlite3
+import json
+import csv
+import sys
+import os
+
+#####################################
+##                                 ##
+##  Emby Library Catalog Store     ##
+##    Indexed SQLite catalog,      ##
+##    CSV is import/export only    ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+CATALOG_DB = 'fileList.db'
+CATALOG_TABLE = 'files'
+CSV_FILE = 'fileList.csv'
+UPDATE_JOURNAL = 'fileList.journal'
+IMPORT_BATCH_SIZE = 5000
+# How long a write waits for another connection's transaction (watcher, compaction)
+BUSY_TIMEOUT_MS = 60000
+
+# Known catalog columns and their SQLite types. NUMERIC affinity keeps
+# integers as integers and lets the query scripts compare numbers directly.
+COLUMN_TYPES = {
+    'id': 'INTEGER PRIMARY KEY',
+    'filePath': 'TEXT',
+    'fileExt': 'TEXT',
+    'videoCodecName': 'TEXT',
+    'audioCodecName': 'TEXT',
+    'frameWidth': 'NUMERIC',
+    'frameHeight': 'NUMERIC',
+    'durationSeconds': 'NUMERIC',
+    'formattedDuration': 'TEXT',
+    'fileSize': 'NUMERIC',
+    'kbps': 'NUMERIC',
+    'originalFileBackup': 'TEXT',
+    'originalFileSize': 'NUMERIC',
+    'fileMtime': 'NUMERIC'
+}
+
+INDEXED_COLUMNS = ['videoCodecName', 'fileSize', 'kbps', 'filePath', 'originalFileBackup']
+
+
+# ==================== SCHEMA ====================
+def quote(identifier):
+    """Quote a column name for use in SQL."""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def ensure_schema(conn):
+    """Create the catalog table and its indexes if they do not exist."""
+    columns = ", ".join(f"{quote(name)} {sql_type}" for name, sql_type in COLUMN_TYPES.items())
+    conn.execute(f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} ({columns})")
+    for column in INDEXED_COLUMNS:
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{CATALOG_TABLE}_{column} "
+                     f"ON {CATALOG_TABLE} ({quote(column)})")
+    conn.commit()
+
+
+def get_columns(conn):
+    """Return the catalog column names in table order."""
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({CATALOG_TABLE})")]
+
+
+def add_columns(conn, columns):
+    """Add any columns the catalog does not have yet (untyped)."""
+    existing = set(get_columns(conn))
+    for column in columns:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {CATALOG_TABLE} ADD COLUMN {quote(column)}")
+            existing.add(column)
+    conn.commit()
+
+
+def connect(db_file=CATALOG_DB):
+    """Open the catalog database, creating the schema on first use."""
+    conn = sqlite3.connect(db_file)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode=WAL")
+    ensure_schema(conn)
+    return conn
+
+
+def open_catalog(db_file=CATALOG_DB, csv_file=CSV_FILE, journal_file=UPDATE_JOURNAL):
+    """
+    Open the catalog with any pending journal entries applied. If the
+    database does not exist yet but a catalog CSV does, the CSV is imported
+    once so existing setups keep working.
+    """
+    is_new = not os.path.exists(db_file)
+    conn = connect(db_file)
+    if is_new and os.path.exists(csv_file):
+        logging.info(f"Creating {db_file} from {csv_file}")
+        import_csv(conn, csv_file, journal_file)
+    compact_journal(conn, journal_file)
+    return conn
+
+
+# ==================== READ / WRITE ====================
+def _from_csv(value):
+    """Empty CSV cells become NULL, matching how pandas read the catalog."""
+    return None if value in ('', None) else value
+
+
+def import_csv(conn, csv_file=CSV_FILE, journal_file=UPDATE_JOURNAL):
+    """
+    Replace the catalog contents with the rows of a catalog CSV. A full scan
+    numbers ids afresh, so pending journal entries (e.g. conversions that
+    finished during the scan) are applied afterwards to the new row with
+    the path their id had before the import.
+    """
+    paths = dict(conn.execute(f"SELECT id, filePath FROM {CATALOG_TABLE}"))
+    count = 0
+    with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+        if 'id' not in columns:
+            raise ValueError(f"{csv_file} has no 'id' column")
+        add_columns(conn, columns)
+
+        sql = (f"INSERT INTO {CATALOG_TABLE} ({', '.join(quote(c) for c in columns)}) "
+               f"VALUES ({', '.join('?' for _ in columns)})")
+        with conn:
+            conn.execute(f"DELETE FROM {CATALOG_TABLE}")
+            batch = []
+            for row in reader:
+                row['id'] = int(float(row['id']))
+                batch.append([_from_csv(row[c]) for c in columns])
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    conn.executemany(sql, batch)
+                    count += len(batch)
+                    batch.clear()
+            conn.executemany(sql, batch)
+            count += len(batch)
+
+    logging.info(f"Imported {count} records from {csv_file}")
+    compact_journal(conn, journal_file, paths)
+    return count
+
+
+def export_csv(conn, csv_file=CSV_FILE, where_clause=''):
+    """Write the catalog (optionally filtered) to CSV."""
+    cursor = conn.execute(f"SELECT * FROM {CATALOG_TABLE} {where_clause}")
+    columns = [d[0] for d in cursor.description]
+    count = 0
+    temp_file = f"{csv_file}.tmp"
+    with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for row in cursor:
+            writer.writerow(['' if value is None else value for value in row])
+            count += 1
+    os.replace(temp_file, csv_file)
+    logging.info(f"Exported {count} records to {csv_file}")
+    return count
+
+
+def iter_rows(conn, where_clause='', params=()):
+    """Yield catalog rows as dicts."""
+    cursor = conn.execute(f"SELECT * FROM {CATALOG_TABLE} {where_clause}", params)
+    columns = [d[0] for d in cursor.description]
+    for row in cursor:
+        yield dict(zip(columns, row))
+
+
+def update_row(conn, file_id, fields, values):
+    """Update selected columns of one catalog row."""
+    assignments = ", ".join(f"{quote(field)} = ?" for field in fields)
+    with conn:
+        conn.execute(f"UPDATE {CATALOG_TABLE} SET {assignments} WHERE id = ?",
+                     [*values, int(file_id)])
+
+
+def upsert_row(conn, row):
+    """Insert a catalog row, replacing the row with the same id (new columns are added)."""
+    columns = list(row)
+    add_columns(conn, columns)
+    with conn:
+        conn.execute(f"INSERT OR REPLACE INTO {CATALOG_TABLE} ({', '.join(quote(c) for c in columns)}) "
+                     f"VALUES ({', '.join('?' for _ in columns)})",
+                     [_from_csv(row[c]) for c in columns])
+
+
+def delete_paths(conn, path, prefix=False):
+    """Delete the row of a file, or with prefix the rows of every file under a folder."""
+    with conn:
+        if prefix:
+            cursor = conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE substr(filePath, 1, ?) = ?",
+                                  (len(path), path))
+        else:
+            cursor = conn.execute(f"DELETE FROM {CATALOG_TABLE} WHERE filePath = ?", (path,))
+    return cursor.rowcount
+
+
+def next_id(conn):
+    """Return the next unused id so that existing ids stay stable."""
+    return conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {CATALOG_TABLE}").fetchone()[0]
+
+
+# ==================== UPDATE JOURNAL ====================
+def _json_default(value):
+    """Convert numpy scalars (from DataFrame rows) to plain Python values."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def append_journal_entry(entry, journal_file):
+    """Append one JSON entry to a journal file and fsync it."""
+    entry = json.dumps(entry, separators=(',', ':'), default=_json_default)
+    with open(journal_file, 'a+b') as f:
+        # Start on a fresh line if a previous write was torn by a crash
+        if f.seek(0, os.SEEK_END) > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                entry = '\n' + entry
+        f.write((entry + '\n').encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def journal_update(file_id, fields, values, journal_file=UPDATE_JOURNAL):
+    """
+    Append one row update to the journal and fsync it. The cost does not
+    depend on the size of the catalog.
+    """
+    append_journal_entry({'id': int(file_id), 'fields': list(fields), 'values': list(values)}, journal_file)
+
+
+def read_journal(journal_file=UPDATE_JOURNAL):
+    """Read journal entries in order, skipping a torn final line."""
+    entries = []
+    if not os.path.exists(journal_file):
+        return entries
+    with open(journal_file, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                logging.warning(f"Ignoring incomplete journal entry at {journal_file}:{line_number}")
+    return entries
+
+
+def _remap_entry(conn, entry, paths):
+    """
+    Find the current id of a journaled row from the path its id had (or
+    the path the entry moves it to); None if the file is not in the catalog.
+    """
+    fields = entry['fields']
+    new_path = entry['values'][fields.index('filePath')] if 'filePath' in fields else None
+    for path in (paths.get(entry['id']), new_path):
+        row = path and conn.execute(f"SELECT id FROM {CATALOG_TABLE} WHERE filePath = ?", (path,)).fetchone()
+        if row:
+            if new_path:
+                paths[entry['id']] = new_path
+            return row[0]
+    return None
+
+
+def compact_journal(conn, journal_file=UPDATE_JOURNAL, paths=None):
+    """
+    Apply journaled updates to the catalog and remove the journal. The
+    journal is renamed first so concurrent writers start a fresh file. If
+    it cannot be renamed (still open elsewhere) the entries are applied in
+    place; updates set absolute values, so applying them twice is harmless.
+
+    After a re-import, paths maps the ids the entries were written with to
+    their file paths, and entries are applied to the rows now holding them.
+    """
+    compacting_file = f"{journal_file}.compacting"
+    if os.path.exists(journal_file) and not os.path.exists(compacting_file):
+        try:
+            os.replace(journal_file, compacting_file)
+        except OSError as e:
+            logging.warning(f"Could not rotate {journal_file}, applying in place: {e}")
+
+    applied = 0
+    for path in (compacting_file, journal_file):
+        entries = read_journal(path)
+        if entries:
+            with conn:
+                for entry in entries:
+                    file_id = entry['id'] if paths is None else _remap_entry(conn, entry, paths)
+                    if file_id is None:
+                        logging.warning(f"Journaled update of file {entry['id']} matches no catalog row")
+                        continue
+                    assignments = ", ".join(f"{quote(field)} = ?" for field in entry['fields'])
+                    conn.execute(f"UPDATE {CATALOG_TABLE} SET {assignments} WHERE id = ?",
+                                 [*entry['values'], file_id])
+                    applied += 1
+        if path == compacting_file and os.path.exists(compacting_file):
+            os.remove(compacting_file)
+
+    if applied:
+        logging.info(f"Applied {applied} journaled catalog updates")
+    return applied
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Import, export or compact the catalog from the command line."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Manage the SQLite media catalog',
+        epilog='Example: python catalog_db.py import fileList.csv'
+    )
+    parser.add_argument('action', choices=['import', 'export', 'compact'],
+                        help='Import or export CSV, or apply the update journal')
+    parser.add_argument('csv_file', nargs='?', default=CSV_FILE, help='Catalog CSV file')
+    parser.add_argument('--db', default=CATALOG_DB, help='Catalog database file')
+    parser.add_argument('--where', default='', help='WHERE clause to filter an export')
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+    try:
+        if args.action == 'import':
+            import_csv(conn, args.csv_file)
+        elif args.action == 'export':
+            compact_journal(conn)
+            export_csv(conn, args.csv_file, args.where)
+        else:
+            compact_journal(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Catalog operation failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,265 @@
+import subprocess
+import logging
+import shutil
+import json
+import os
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+import preflight
+
+#####################################
+##                                 ##
+##  Chunked Parallel Encoding      ##
+##    Keyframe-aligned chunks,     ##
+##    lossless concat, resumable   ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+FFPROBE_PATH = 'H:\\ffmpeg\\ffprobe'
+CHUNK_MIN_DURATION = 3600
+CHUNK_SECONDS = 600
+CHUNK_PARALLEL = 2
+CHUNK_WORK_DIR = 'chunkWork'
+# How often a running chunk checks for a cancel
+CANCEL_POLL_SECONDS = 0.5
+
+PLAN_FILE = 'plan.json'
+CONCAT_LIST_FILE = 'concat.txt'
+
+# ffmpeg's default stream selection ranks a stream flagged default above any channel count
+DEFAULT_DISPOSITION_SCORE = 100000000
+
+
+def should_chunk(duration, min_duration=CHUNK_MIN_DURATION):
+    """Return True if a file is long enough to be encoded in chunks."""
+    try:
+        return float(duration) >= min_duration
+    except (TypeError, ValueError):
+        return False
+
+
+# ==================== SPLIT POINTS ====================
+def get_keyframe_times(source_path):
+    """List video keyframe timestamps from packet flags (no decoding needed)."""
+    command = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        source_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    times = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                times.append(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(times)
+
+
+def choose_split_points(keyframes, duration, chunk_seconds=CHUNK_SECONDS):
+    """
+    Pick the keyframe nearest each multiple of chunk_seconds. Returns chunk
+    boundaries starting at 0 and ending at the duration.
+    """
+    points = [0.0]
+    target = chunk_seconds
+    index = 0
+    while target < duration - chunk_seconds / 2 and keyframes:
+        while index + 1 < len(keyframes) and abs(keyframes[index + 1] - target) <= abs(keyframes[index] - target):
+            index += 1
+        if keyframes[index] > points[-1]:
+            points.append(keyframes[index])
+        target += chunk_seconds
+    points.append(float(duration))
+    return points
+
+
+def load_or_create_plan(work_dir, source_path, duration, chunk_seconds):
+    """
+    Load the chunk plan of an interrupted run, or probe keyframes and save
+    a new one. Reusing the saved plan keeps finished chunks valid.
+    """
+    plan_path = os.path.join(work_dir, PLAN_FILE)
+    if os.path.exists(plan_path):
+        with open(plan_path, 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        if plan.get('source') == source_path:
+            return plan
+        logging.warning(f"Discarding chunk plan for a different source in {work_dir}")
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    os.makedirs(work_dir, exist_ok=True)
+    points = choose_split_points(get_keyframe_times(source_path), duration, chunk_seconds)
+    plan = {'source': source_path, 'points': points}
+    with open(plan_path, 'w', encoding='utf-8') as f:
+        json.dump(plan, f)
+    return plan
+
+
+# ==================== ENCODING ====================
+def chunk_path(work_dir, index):
+    return os.path.join(work_dir, f"chunk_{index:04d}.mkv")
+
+
+def build_chunk_command(encode_command, source_path, start, length, output_path):
+    """Video-only version of the full encode command for one chunk."""
+    command = preflight.build_sample_command(encode_command, source_path, start, length, output_path)
+    if '-c:a' in command:
+        index = command.index('-c:a')
+        command[index:index + 2] = ['-an']
+    return command
+
+
+def encode_chunk(encode_command, source_path, work_dir, index, start, end, slots=None, should_cancel=None):
+    """
+    Encode one chunk to a temporary name and rename it when complete.
+    should_cancel is checked while the chunk encodes; a cancelled chunk is
+    stopped and its partial output removed. Returns True, False, or None
+    if cancelled.
+    """
+    final_path = chunk_path(work_dir, index)
+    partial_path = final_path.replace('.mkv', '.part.mkv')
+    command = build_chunk_command(encode_command, source_path, start, end - start, partial_path)
+
+    with open(os.path.join(work_dir, f"chunk_{index:04d}.log"), 'w',
+              encoding='utf-8', errors='replace') as log:
+        with slots.command_slot(command) if slots else nullcontext():
+            process = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+            while True:
+                try:
+                    returncode = process.wait(timeout=CANCEL_POLL_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    if should_cancel and should_cancel():
+                        process.terminate()
+                        process.wait()
+                        if os.path.exists(partial_path):
+                            os.remove(partial_path)
+                        return None
+
+    if returncode != 0 or not os.path.exists(partial_path):
+        logging.error(f"Chunk {index} failed (exit code {returncode}) - see {work_dir}")
+        return False
+    os.replace(partial_path, final_path)
+    return True
+
+
+def default_stream_maps(source_path, input_index=1):
+    """
+    Map the non-video streams ffmpeg's default selection takes from the
+    source, as in the single-pass encode: the audio stream with the most
+    channels (one flagged default first) and the first subtitle stream.
+    """
+    command = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-show_entries', 'stream=index,codec_type,channels:stream_disposition=default',
+        '-of', 'json',
+        source_path
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    streams = json.loads(result.stdout).get('streams', [])
+
+    maps = []
+    audio = [stream for stream in streams if stream.get('codec_type') == 'audio']
+    if audio:
+        # max() keeps the first of equal scores, like ffmpeg
+        best = max(audio, key=lambda stream: (stream.get('channels') or 0)
+                   + DEFAULT_DISPOSITION_SCORE * (stream.get('disposition') or {}).get('default', 0))
+        maps += ['-map', f"{input_index}:{best['index']}"]
+    subtitles = [stream for stream in streams if stream.get('codec_type') == 'subtitle']
+    if subtitles:
+        maps += ['-map', f"{input_index}:{subtitles[0]['index']}"]
+    return maps
+
+
+def concat_chunks(ffmpeg_path, work_dir, chunk_count, source_path, output_path, audio_codec='copy'):
+    """
+    Join the encoded chunks without re-encoding. Audio, subtitles, metadata
+    and chapters come from the source, selected and encoded as in the
+    single-pass encode so both produce the same layout.
+    """
+    list_path = os.path.join(work_dir, CONCAT_LIST_FILE)
+    with open(list_path, 'w', encoding='utf-8') as f:
+        for index in range(chunk_count):
+            path = os.path.abspath(chunk_path(work_dir, index)).replace('\\', '/').replace("'", "'\\''")
+            f.write(f"file '{path}'\n")
+
+    try:
+        source_maps = default_stream_maps(source_path)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.error(f"Could not probe the streams of {source_path}: {e}")
+        return False
+
+    command = [
+        ffmpeg_path, '-y',
+        '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-i', source_path,
+        '-map', '0:v', *source_maps,
+        '-map_metadata', '1', '-map_chapters', '1',
+        '-c:v', 'copy', '-c:a', audio_codec,
+        output_path
+    ]
+    with open(os.path.join(work_dir, 'concat.log'), 'w', encoding='utf-8', errors='replace') as log:
+        result = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT)
+    return result.returncode == 0 and os.path.exists(output_path)
+
+
+def encode_chunked(command_object, duration, chunk_seconds=CHUNK_SECONDS, max_parallel=CHUNK_PARALLEL,
+                   slots=None, should_cancel=None, work_root=CHUNK_WORK_DIR):
+    """
+    Encode the backed-up source of a command object in keyframe-aligned
+    chunks, several at a time, then concatenate them into newFilePath.
+    Finished chunks survive a cancel or failure so a later run resumes
+    from them. Returns 'done', 'failed' or 'cancelled'.
+    """
+    encode_command = preflight.get_encode_command(command_object)
+    source_path = encode_command[encode_command.index('-i') + 1]
+    output_path = command_object['newFilePath']
+    work_dir = os.path.join(work_root, str(command_object['fileId']))
+
+    try:
+        plan = load_or_create_plan(work_dir, source_path, float(duration), chunk_seconds)
+    except (OSError, subprocess.CalledProcessError, ValueError) as e:
+        logging.error(f"Could not plan chunks for {source_path}: {e}")
+        return 'failed'
+
+    points = plan['points']
+    chunk_count = len(points) - 1
+    pending = [index for index in range(chunk_count) if not os.path.exists(chunk_path(work_dir, index))]
+    if len(pending) < chunk_count:
+        logging.info(f"Resuming {source_path}: {chunk_count - len(pending)} of {chunk_count} chunks done")
+    else:
+        logging.info(f"Encoding {source_path} in {chunk_count} chunks")
+
+    def run_chunk(index):
+        if should_cancel and should_cancel():
+            return None
+        ok = encode_chunk(encode_command, source_path, work_dir, index, points[index], points[index + 1],
+                          slots, should_cancel)
+        if ok:
+            logging.info(f"Chunk {index + 1} of {chunk_count} done: {os.path.basename(output_path)}")
+        return ok
+
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel)) as pool:
+        outcomes = list(pool.map(run_chunk, pending))
+
+    if None in outcomes:
+        logging.info(f"Chunked encode cancelled - finished chunks kept in {work_dir}")
+        return 'cancelled'
+    if not all(outcomes):
+        return 'failed'
+
+    audio_codec = encode_command[encode_command.index('-c:a') + 1] if '-c:a' in encode_command else 'copy'
+    if not concat_chunks(encode_command[0], work_dir, chunk_count, source_path, output_path, audio_codec):
+        logging.error(f"Concatenating chunks failed - see {work_dir}")
+        return 'failed'
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return 'done'
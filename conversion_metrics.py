@@ -0,0 +1,193 @@
+import threading
+import logging
+import json
+import time
+import os
+from contextlib import contextmanager
+
+#####################################
+##                                 ##
+##  Conversion Run Metrics         ##
+##    Per-file stage timings as    ##
+##    JSON lines and a Prometheus  ##
+##    textfile                     ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+METRICS_LOG = 'conversionMetrics.jsonl'
+# Point this at the node exporter's --collector.textfile.directory to scrape it
+METRICS_TEXTFILE = 'conversion.prom'
+
+BACKUP_STAGE = 'backup'
+ENCODE_STAGE = 'encode'
+PROBE_STAGE = 'probe'
+CATALOG_STAGE = 'catalog'
+REVERT_STAGE = 'revert'
+VERIFY_STAGE = 'verify'
+COMPACT_STAGE = 'compact'
+
+
+def _format_value(value):
+    """Exposition value: integers in full, floats rounded to microseconds."""
+    return str(value) if isinstance(value, int) else f"{value:.6f}"
+
+
+class FileMetrics:
+    """Stage timings and byte counts of one file's conversion."""
+
+    def __init__(self, file_id, file_path=''):
+        self.file_id = file_id
+        self.file_path = file_path
+        self.stages = {}
+        self.fields = {}
+        self.started = time.time()
+
+    def add_stage(self, stage, seconds, bytes_read=0, bytes_written=0):
+        entry = self.stages.setdefault(stage, {'seconds': 0.0, 'bytesRead': 0, 'bytesWritten': 0})
+        entry['seconds'] += seconds
+        entry['bytesRead'] += int(bytes_read or 0)
+        entry['bytesWritten'] += int(bytes_written or 0)
+        return entry
+
+    @contextmanager
+    def stage(self, stage, bytes_read=0, bytes_written=0):
+        """Time a block as one run of a stage. Byte counts can be set on the yielded dict."""
+        counts = {'bytesRead': bytes_read, 'bytesWritten': bytes_written}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add_stage(stage, time.perf_counter() - start, counts['bytesRead'], counts['bytesWritten'])
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def to_record(self, outcome):
+        record = {
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'fileId': int(self.file_id),
+            'filePath': self.file_path,
+            'outcome': outcome,
+            'wallSeconds': round(time.time() - self.started, 3),
+            'stages': {name: dict(entry, seconds=round(entry['seconds'], 3))
+                       for name, entry in self.stages.items()}
+        }
+        record.update(self.fields)
+        return record
+
+
+class RunMetrics:
+    """Collects file metrics of a run and exports them (thread-safe)."""
+
+    def __init__(self, log_file=METRICS_LOG, textfile=METRICS_TEXTFILE):
+        self.log_file = log_file
+        self.textfile = textfile
+        self.started = time.time()
+        self.files = {}
+        self.outcomes = {}
+        self.stage_totals = {}
+        self.saved_bytes = 0
+        self.last_fields = {}
+        self._lock = threading.Lock()
+
+    def file(self, file_id, file_path=''):
+        """Return the metrics of a file, creating them on first use."""
+        key = int(file_id)
+        with self._lock:
+            if key not in self.files:
+                self.files[key] = FileMetrics(key, file_path)
+            elif file_path and not self.files[key].file_path:
+                self.files[key].file_path = file_path
+            return self.files[key]
+
+    def _add_totals(self, stage, entry, runs=1):
+        totals = self.stage_totals.setdefault(stage, {'runs': 0, 'seconds': 0.0, 'bytesRead': 0, 'bytesWritten': 0})
+        totals['runs'] += runs
+        totals['seconds'] += entry['seconds']
+        totals['bytesRead'] += entry['bytesRead']
+        totals['bytesWritten'] += entry['bytesWritten']
+
+    @contextmanager
+    def run_stage(self, stage):
+        """Time a run-level stage that belongs to no single file (e.g. journal compaction)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._add_totals(stage, {'seconds': time.perf_counter() - start, 'bytesRead': 0, 'bytesWritten': 0})
+            self.write_textfile()
+
+    def finish(self, file_id, outcome, **fields):
+        """Write the record of a finished file and refresh the textfile."""
+        with self._lock:
+            metrics = self.files.pop(int(file_id), None) or FileMetrics(file_id)
+            metrics.set(**fields)
+            record = metrics.to_record(outcome)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.saved_bytes += int(fields.get('savedBytes') or 0)
+            for stage, entry in metrics.stages.items():
+                self._add_totals(stage, entry)
+            self.last_fields.update({key: value for key, value in metrics.fields.items()
+                                     if key in ('encodeFps', 'encodeSpeed', 'savingsRatio')})
+
+        try:
+            with open(self.log_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record) + '\n')
+        except OSError as e:
+            logging.warning(f"Could not write metrics log: {e}")
+        self.write_textfile()
+        return record
+
+    def render_textfile(self):
+        """Render the run totals in the Prometheus text exposition format."""
+        with self._lock:
+            outcomes = dict(self.outcomes)
+            stages = {stage: dict(totals) for stage, totals in self.stage_totals.items()}
+            saved_bytes = self.saved_bytes
+            last_fields = dict(self.last_fields)
+
+        lines = [
+            '# HELP conversion_run_start_time_seconds Start time of the conversion run.',
+            '# TYPE conversion_run_start_time_seconds gauge',
+            f'conversion_run_start_time_seconds {self.started:.0f}',
+            '# HELP conversion_files_total Files finished by outcome.',
+            '# TYPE conversion_files_total counter'
+        ]
+        lines += [f'conversion_files_total{{outcome="{outcome}"}} {count}' for outcome, count in sorted(outcomes.items())]
+
+        for name, key, help_text in (
+            ('conversion_stage_runs_total', 'runs', 'Stage executions.'),
+            ('conversion_stage_seconds_total', 'seconds', 'Wall time spent in each stage.'),
+            ('conversion_stage_read_bytes_total', 'bytesRead', 'Bytes read by each stage.'),
+            ('conversion_stage_written_bytes_total', 'bytesWritten', 'Bytes written by each stage.')
+        ):
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+            lines += [f'{name}{{stage="{stage}"}} {_format_value(totals[key])}' for stage, totals in sorted(stages.items())]
+
+        lines += [
+            '# HELP conversion_saved_bytes_total Bytes saved by kept conversions.',
+            '# TYPE conversion_saved_bytes_total counter',
+            f'conversion_saved_bytes_total {saved_bytes}'
+        ]
+        for name, key, help_text in (
+            ('conversion_last_encode_fps', 'encodeFps', 'Average fps of the last encode.'),
+            ('conversion_last_encode_speed', 'encodeSpeed', 'Speed (x realtime) of the last encode.'),
+            ('conversion_last_savings_ratio', 'savingsRatio', 'Savings ratio of the last converted file.')
+        ):
+            if last_fields.get(key) is not None:
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {_format_value(last_fields[key])}']
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self):
+        """Replace the textfile atomically so the exporter never reads a partial file."""
+        if not self.textfile:
+            return
+        temp_file = self.textfile + '.tmp'
+        try:
+            with open(temp_file, 'w', encoding='utf-8', newline='\n') as f:
+                f.write(self.render_textfile())
+            os.replace(temp_file, self.textfile)
+        except OSError as e:
+            logging.warning(f"Could not write metrics textfile: {e}")
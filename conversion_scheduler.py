@@ -0,0 +1,129 @@
+import threading
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+#####################################
+##                                 ##
+##  Conversion Scheduler           ##
+##    Runs several files at once   ##
+##    with per-stage slot limits   ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+COPY_STAGE = 'copy'
+DEFAULT_STAGE = 'default'
+DEFAULT_SLOTS = 1
+
+ENCODER_OPTIONS = ('-c:v', '-vcodec', '-codec:v')
+
+
+# ==================== SLOT LIMITS ====================
+def get_encoder_backend(command):
+    """Return the video encoder named in an ffmpeg command (e.g. hevc_nvenc)."""
+    for index, arg in enumerate(command[:-1]):
+        if arg in ENCODER_OPTIONS:
+            return command[index + 1]
+    return DEFAULT_STAGE
+
+
+def get_command_stage(command):
+    """Map a command to the slot it needs: the copy stage or its encoder."""
+    if "robocopy" in str(command[0]).lower():
+        return COPY_STAGE
+    return get_encoder_backend(command)
+
+
+def parse_slot_limits(spec):
+    """Parse "hevc_nvenc=3,libx265=2" into {'hevc_nvenc': 3, 'libx265': 2}."""
+    limits = {}
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        name, _, count = part.partition('=')
+        try:
+            limits[name.strip()] = max(1, int(count))
+        except ValueError:
+            raise ValueError(f"Invalid slot limit '{part}' - expected name=count")
+    return limits
+
+
+class SlotLimits:
+    """Named counting semaphores: one per encoder backend plus the copy stage."""
+
+    def __init__(self, encoder_slots=None, copy_slots=DEFAULT_SLOTS, default_slots=DEFAULT_SLOTS):
+        self.limits = dict(encoder_slots or {})
+        self.limits[COPY_STAGE] = copy_slots
+        self.default_slots = default_slots
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, stage):
+        with self._lock:
+            if stage not in self._semaphores:
+                limit = self.limits.get(stage, self.default_slots)
+                self._semaphores[stage] = threading.BoundedSemaphore(limit)
+            return self._semaphores[stage]
+
+    @contextmanager
+    def slot(self, stage):
+        """Hold one slot of the given stage for the duration of the block."""
+        semaphore = self._semaphore(stage)
+        semaphore.acquire()
+        try:
+            yield
+        finally:
+            semaphore.release()
+
+    @contextmanager
+    def command_slot(self, command):
+        """Hold the slot a command needs (copy stage or its encoder)."""
+        with self.slot(get_command_stage(command)):
+            yield
+
+
+# ==================== JOB RUNNER ====================
+def run_jobs(items, job, max_jobs, should_cancel=None, on_done=None):
+    """
+    Run job(item) for each item with at most max_jobs in flight. New jobs
+    stop being started once should_cancel() returns True; running jobs are
+    allowed to finish. on_done(item, result) is called from the scheduling
+    thread as each job completes. Returns True if the run was cancelled.
+    A None item (from a live queue with nothing ready yet) only collects
+    the jobs that have finished.
+    """
+    cancelled = False
+
+    def finish(future, running):
+        item = running.pop(future)
+        try:
+            result = future.result()
+        except Exception as e:
+            logging.error(f"Job failed: {e}", exc_info=True)
+            result = None
+        if on_done:
+            on_done(item, result)
+
+    with ThreadPoolExecutor(max_workers=max_jobs) as pool:
+        running = {}
+        for item in items:
+            if should_cancel and should_cancel():
+                cancelled = True
+                break
+            if item is None:
+                for future in [future for future in running if future.done()]:
+                    finish(future, running)
+                continue
+            while len(running) >= max_jobs:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future, running)
+            running[pool.submit(job, item)] = item
+
+        while running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future, running)
+
+    return cancelled
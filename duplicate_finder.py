@@ -0,0 +1,180 @@
+import pandas as pd
+import argparse
+import hashlib
+import logging
+import mmap
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import catalog_db
+
+#####################################
+##                                 ##
+##  Duplicate Media Finder         ##
+##    Size/duration buckets, then  ##
+##    sampled and full hashes      ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+DUPLICATE_COLUMN = 'duplicateOf'
+# Blocks hashed per file, spread evenly from the first to the last byte
+SAMPLE_COUNT = 16
+SAMPLE_BYTES = 64 * 1024
+FULL_HASH_CHUNK = 8 * 1024 * 1024
+HASH_WORKERS = 4
+
+
+# ==================== HASHING ====================
+def sample_offsets(file_size, count=SAMPLE_COUNT, block=SAMPLE_BYTES):
+    """Evenly spaced block offsets including the first and last block."""
+    last = file_size - block
+    if last <= 0:
+        return [0]
+    return sorted({last * i // (count - 1) for i in range(count)})
+
+
+def _hash_mapped(path, read_blocks):
+    """Hash a file through a read-only memory map (empty files cannot be mapped)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return digest.hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start, end in read_blocks(len(mapped)):
+                digest.update(mapped[start:end])
+    return digest.hexdigest()
+
+
+def sample_hash(path):
+    """Hash SAMPLE_COUNT blocks of the file; files below that size are hashed whole."""
+    return _hash_mapped(path, lambda size: [(offset, offset + SAMPLE_BYTES)
+                                            for offset in sample_offsets(size)])
+
+
+def full_hash(path):
+    """Hash the whole file."""
+    return _hash_mapped(path, lambda size: [(offset, offset + FULL_HASH_CHUNK)
+                                            for offset in range(0, size, FULL_HASH_CHUNK)])
+
+
+def _hash_all(paths, hash_function, pool):
+    """Return {path: digest}, leaving out files that cannot be read."""
+    def safe_hash(path):
+        try:
+            return hash_function(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Could not hash {path}: {e}")
+            return None
+    return {path: digest for path, digest in zip(paths, pool.map(safe_hash, paths)) if digest}
+
+
+def _collisions(digests):
+    """Group paths by digest, keeping only digests shared by several paths."""
+    groups = {}
+    for path, digest in digests.items():
+        groups.setdefault(digest, []).append(path)
+    return [paths for paths in groups.values() if len(paths) > 1]
+
+
+# ==================== DETECTION ====================
+def candidate_buckets(df):
+    """
+    Bucket rows by fileSize and whole-second durationSeconds (missing
+    durations share one bucket per size) and keep buckets with several files.
+    """
+    sizes = pd.to_numeric(df['fileSize'], errors='coerce')
+    durations = pd.to_numeric(df['durationSeconds'], errors='coerce').round().fillna(-1)
+    keyed = df.assign(_size=sizes, _duration=durations)[sizes > 0]
+    counts = keyed.groupby(['_size', '_duration'])['id'].transform('size')
+    return [group['filePath'].tolist()
+            for _, group in keyed[counts > 1].groupby(['_size', '_duration'])]
+
+
+def find_duplicates(df, workers=HASH_WORKERS):
+    """
+    Return lists of catalog paths whose contents are identical. Only files
+    in a shared size/duration bucket are sampled, and only files whose
+    samples collide are read in full.
+    """
+    buckets = candidate_buckets(df)
+    sampled = [path for bucket in buckets for path in bucket]
+    logging.info(f"{len(sampled)} files in {len(buckets)} size/duration buckets")
+
+    duplicates = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        sample_digests = _hash_all(sampled, sample_hash, pool)
+        for bucket in buckets:
+            digests = {path: sample_digests[path] for path in bucket if path in sample_digests}
+            for colliding in _collisions(digests):
+                full_digests = _hash_all(colliding, full_hash, pool)
+                duplicates.extend(_collisions(full_digests))
+    return duplicates
+
+
+def assign_originals(df, duplicates):
+    """
+    Map each duplicate's id to the id of the copy that is kept: one that was
+    already converted if any, otherwise the lowest id.
+    """
+    rows = df.set_index('filePath')
+    assignments = {}
+    for paths in duplicates:
+        group = rows.loc[paths]
+        converted = group['originalFileBackup'].notna() & (group['originalFileBackup'] != '')
+        kept = group.assign(_converted=converted).sort_values(['_converted', 'id'],
+                                                              ascending=[False, True])
+        original_id = int(kept['id'].iloc[0])
+        for file_id in kept['id'].iloc[1:]:
+            assignments[int(file_id)] = original_id
+    return assignments
+
+
+def record_duplicates(conn, assignments, where_clause=''):
+    """Clear duplicateOf on the scanned rows, then set it on the duplicates found."""
+    catalog_db.add_columns(conn, [DUPLICATE_COLUMN])
+    column = catalog_db.quote(DUPLICATE_COLUMN)
+    with conn:
+        conn.execute(f"UPDATE {catalog_db.CATALOG_TABLE} SET {column} = NULL {where_clause}")
+        conn.executemany(f"UPDATE {catalog_db.CATALOG_TABLE} SET {column} = ? WHERE id = ?",
+                         [(original_id, file_id) for file_id, original_id in assignments.items()])
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Main entry point for the script."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Find identical media files in the catalog and mark them with duplicateOf',
+        epilog='Example: python duplicate_finder.py --where "WHERE filePath LIKE \'%\\Movies\\%\'"'
+    )
+    parser.add_argument('--db', default=catalog_db.CATALOG_DB, help='Catalog database file')
+    parser.add_argument('--where', default='', help='WHERE clause limiting the files compared')
+    parser.add_argument('--workers', type=int, default=HASH_WORKERS, help='Concurrent file hashes')
+    parser.add_argument('--dry-run', action='store_true', help='List duplicates without updating the catalog')
+
+    args = parser.parse_args()
+    conn = catalog_db.open_catalog(args.db)
+    try:
+        df = pd.read_sql_query(
+            f"SELECT id, filePath, fileSize, durationSeconds, originalFileBackup "
+            f"FROM {catalog_db.CATALOG_TABLE} {args.where}", conn
+        )
+        duplicates = find_duplicates(df, max(1, args.workers))
+        assignments = assign_originals(df, duplicates)
+        for paths in duplicates:
+            logging.info(f"Identical: {' | '.join(paths)}")
+        logging.info(f"{len(assignments)} duplicates in {len(duplicates)} groups")
+        if not args.dry_run:
+            record_duplicates(conn, assignments, args.where)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        logging.error(f"Duplicate search failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,220 @@
+import pandas as pd
+import subprocess
+import threading
+import argparse
+import logging
+import ctypes
+import ntpath
+import json
+import time
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+import catalog_db
+import conversion_scheduler
+
+#####################################
+##                                 ##
+##  Emby Prod Delta Sync           ##
+##    Pushes only files converted  ##
+##    since the last push          ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+SOURCE_PREFIX = 'H:\\HTPC\\embyServer'
+DEST_PREFIX = 'W:'
+PUSH_MANIFEST = 'pushManifest.json'
+SYNC_LOG = 'copyNewFilesToEmby.txt'
+# Concurrent robocopy commands per destination volume
+COPY_WORKERS_PER_VOLUME = 2
+# robocopy exit codes from 8 up mean at least one copy failed
+ROBOCOPY_FAILURE = 8
+
+PUSH_CONDITIONS = "WHERE originalFileBackup IS NOT NULL AND NOT instr(filePath, '-trailer.')"
+PUSH_COLUMNS = ['filePath', 'fileSize', 'originalFileBackup']
+
+
+def set_terminal_title_windows(title):
+    """Set the Windows terminal title."""
+    try:
+        ctypes.windll.kernel32.SetConsoleTitleW(title)
+    except Exception:
+        pass
+
+
+# ==================== MANIFEST ====================
+def load_manifest(manifest_file=PUSH_MANIFEST):
+    """Return {filePath: fileSize} of everything pushed so far."""
+    if not os.path.exists(manifest_file):
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+
+def save_manifest(pushed, manifest_file=PUSH_MANIFEST):
+    """Write the manifest atomically so an interrupted push never corrupts it."""
+    temp_file = f"{manifest_file}.tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump({'lastPush': time.strftime('%Y-%m-%d %H:%M:%S'), 'files': pushed},
+                  f, separators=(',', ':'))
+    os.replace(temp_file, manifest_file)
+
+
+# ==================== PLANNING ====================
+def load_push_candidates(backend='sqlite'):
+    """Converted files from the catalog (trailers excluded), as in the old full push."""
+    if backend == 'columnar':
+        import catalog_columnar
+        return catalog_columnar.query_columnar(PUSH_CONDITIONS, columns=PUSH_COLUMNS)
+    conn = catalog_db.open_catalog()
+    try:
+        return pd.read_sql_query(
+            f"SELECT {', '.join(PUSH_COLUMNS)} FROM {catalog_db.CATALOG_TABLE} {PUSH_CONDITIONS}", conn
+        )
+    finally:
+        conn.close()
+
+
+def plan_push(df, pushed, source_prefix=SOURCE_PREFIX, dest_prefix=DEST_PREFIX):
+    """
+    Select the files whose path or size differ from the manifest and group
+    them by directory. Returns a DataFrame with one row per directory:
+    sourceDir, destDir, volume, files (names to copy), replaced (old names
+    to delete at the destination) and paths/sizes for the manifest.
+    """
+    sizes = pd.to_numeric(df['fileSize'], errors='coerce').fillna(-1).astype('int64')
+    previous = df['filePath'].map(pushed)
+    changed = df[previous.isna() | (previous != sizes)].copy()
+    if changed.empty:
+        return changed
+
+    split = changed['filePath'].str.rsplit('\\', n=1, expand=True)
+    changed['sourceDir'] = split[0]
+    changed['fileName'] = split[1]
+    changed['destDir'] = changed['sourceDir'].str.replace(source_prefix, dest_prefix, n=1, regex=False)
+    changed['volume'] = changed['destDir'].map(lambda path: ntpath.splitdrive(path)[0].upper() or path)
+    changed['fileSize'] = sizes[changed.index]
+    # A conversion that changed the extension leaves the old name at the destination
+    original_name = changed['originalFileBackup'].astype(str).str.rsplit('\\', n=1).str[-1]
+    changed['replaced'] = original_name.where(original_name != changed['fileName'], '')
+
+    return changed.groupby(['sourceDir', 'destDir', 'volume'], sort=False).agg(
+        files=('fileName', list),
+        replaced=('replaced', lambda names: [name for name in names if name]),
+        paths=('filePath', list),
+        sizes=('fileSize', list)
+    ).reset_index()
+
+
+# ==================== COPYING ====================
+def build_copy_command(source_dir, dest_dir, files):
+    """robocopy of just the named files (no /E or /PURGE walk of the directory)."""
+    return ["robocopy", source_dir, dest_dir, *files, "/XO", "/NP", "/R:2", "/W:5"]
+
+
+def remove_replaced(dest_dir, names):
+    """Delete destination files superseded by a conversion to a new extension."""
+    for name in names:
+        path = f"{dest_dir}\\{name}"
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+                logging.info(f"Removed superseded {path}")
+        except OSError as e:
+            logging.warning(f"Could not remove {path}: {e}")
+
+
+def push_files(plan, pushed, workers_per_volume=COPY_WORKERS_PER_VOLUME,
+               manifest_file=PUSH_MANIFEST, log_file=SYNC_LOG):
+    """
+    Run one robocopy per planned directory, at most workers_per_volume at a
+    time on each destination volume. Successful directories are added to
+    the manifest, which is saved even if the push is interrupted.
+    Returns (directories copied, directories failed).
+    """
+    slots = conversion_scheduler.SlotLimits(default_slots=workers_per_volume)
+    lock = threading.Lock()
+    totals = {'copied': 0, 'failed': 0}
+    volume_count = plan['volume'].nunique()
+
+    def copy_directory(group):
+        command = build_copy_command(group.sourceDir, group.destDir, group.files)
+        with slots.slot(group.volume):
+            result = subprocess.run(command, capture_output=True, text=True, errors='replace')
+
+        with lock:
+            with open(log_file, 'a', encoding='utf-8', errors='replace') as f:
+                f.write(result.stdout)
+            if result.returncode >= ROBOCOPY_FAILURE:
+                totals['failed'] += 1
+                logging.error(f"robocopy failed ({result.returncode}) for {group.sourceDir}")
+                return
+            totals['copied'] += 1
+            pushed.update(zip(group.paths, group.sizes))
+            set_terminal_title_windows(f"Pushed {totals['copied']} of {len(plan)}: {group.destDir}")
+        remove_replaced(group.destDir, group.replaced)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, volume_count * workers_per_volume)) as pool:
+            list(pool.map(copy_directory, plan.itertuples(index=False)))
+    finally:
+        save_manifest(pushed, manifest_file)
+    return totals['copied'], totals['failed']
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Main entry point for the script."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Push files converted since the last push to the production Emby share',
+        epilog='Example: python emby_sync.py --workers-per-volume 2'
+    )
+    parser.add_argument('backend', nargs='?', choices=['sqlite', 'columnar'], default='sqlite',
+                        help='Catalog to read converted files from')
+    parser.add_argument('--workers-per-volume', type=int, default=COPY_WORKERS_PER_VOLUME,
+                        help='Concurrent copies per destination volume')
+    parser.add_argument('--dry-run', action='store_true', help='Show the plan without copying')
+    parser.add_argument('--init', action='store_true',
+                        help='Record every converted file as pushed without copying (after a full sync)')
+    parser.add_argument('--manifest', default=PUSH_MANIFEST, help='Push manifest file')
+
+    args = parser.parse_args()
+    started = time.perf_counter()
+    candidates = load_push_candidates(args.backend)
+    pushed = load_manifest(args.manifest)
+
+    if args.init:
+        sizes = pd.to_numeric(candidates['fileSize'], errors='coerce').fillna(-1).astype('int64')
+        pushed.update(zip(candidates['filePath'], sizes.tolist()))
+        save_manifest(pushed, args.manifest)
+        logging.info(f"Recorded {len(candidates)} files as pushed in {args.manifest}")
+        return 0
+
+    plan = plan_push(candidates, pushed)
+    file_count = sum(len(files) for files in plan['files']) if len(plan) else 0
+    logging.info(f"Planned {file_count} changed files in {len(plan)} directories out of "
+                 f"{len(candidates)} converted files ({time.perf_counter() - started:.1f}s)")
+    if plan.empty:
+        return 0
+
+    if args.dry_run:
+        for group in plan.itertuples(index=False):
+            print(' '.join(build_copy_command(group.sourceDir, group.destDir, group.files)))
+        return 0
+
+    copied, failed = push_files(plan, pushed, max(1, args.workers_per_volume), args.manifest)
+    logging.info(f"Pushed {copied} directories, {failed} failed - see {SYNC_LOG}")
+    if os.name == 'nt':
+        os.startfile(SYNC_LOG)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except Exception as e:
+        logging.error(f"Push failed: {e}", exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,219 @@
+import threading
+import time
+
+#####################################
+##                                 ##
+##  FFmpeg Progress Tracking       ##
+##    Parses the -progress stream, ##
+##    per-job and aggregate ETA    ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+# Progress goes to stdout as key=value blocks; -nostats drops the frame= lines
+PROGRESS_ARGS = ['-progress', 'pipe:1', '-nostats']
+RENDER_INTERVAL = 1.0
+
+PROGRESS_KEYS = {
+    'frame', 'fps', 'bitrate', 'total_size', 'out_time_us', 'out_time_ms',
+    'out_time', 'dup_frames', 'drop_frames', 'speed', 'progress'
+}
+
+
+def with_progress(command):
+    """Return an ffmpeg command that writes the machine-readable progress stream."""
+    if '-progress' in command:
+        return list(command)
+    return [command[0]] + PROGRESS_ARGS + list(command[1:])
+
+
+def parse_clock(text):
+    """Convert [-]HH:MM:SS[.ffffff] to seconds. Hours may have any number of digits."""
+    text = text.strip()
+    sign = -1 if text.startswith('-') else 1
+    parts = text.lstrip('-').split(':')
+    if len(parts) != 3:
+        raise ValueError(f"Expected HH:MM:SS format, got: {text}")
+    hours, minutes, seconds = int(parts[0]), int(parts[1]), float(parts[2])
+    return sign * (hours * 3600 + minutes * 60 + seconds)
+
+
+def parse_progress_line(line):
+    """Return (key, value) for a -progress line, or None for any other output."""
+    key, sep, value = line.strip().partition('=')
+    if not sep or key not in PROGRESS_KEYS and not key.startswith('stream_'):
+        return None
+    return key, value.strip()
+
+
+def _to_float(value, suffix=''):
+    try:
+        return float(value[:-len(suffix)] if suffix and value.endswith(suffix) else value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_eta(seconds):
+    """Format a number of seconds as H:MM:SS, or --:--:-- when unknown."""
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(max(seconds, 0))
+    return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def format_size(num_bytes):
+    """Format a byte count as MiB/GiB."""
+    if num_bytes >= 1024 ** 3:
+        return f"{num_bytes / 1024 ** 3:.2f} GiB"
+    return f"{num_bytes / 1024 ** 2:.1f} MiB"
+
+
+# ==================== PROGRESS STATE ====================
+class Throttle:
+    """Lets an action through at most once per interval (thread-safe)."""
+
+    def __init__(self, interval=RENDER_INTERVAL):
+        self.interval = interval
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def ready(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last < self.interval:
+                return False
+            self._last = now
+            return True
+
+
+class JobProgress:
+    """Progress of one ffmpeg process, updated from its -progress blocks."""
+
+    def __init__(self, name, duration):
+        self.name = name
+        self.duration = _to_float(duration) or 0.0
+        self.started = time.monotonic()
+        self.seconds_done = 0.0
+        self.fps = None
+        self.speed = None
+        self.total_size = 0
+        self.finished = False
+
+    def update(self, key, value):
+        """Apply one key=value pair. Returns True when a progress block is complete."""
+        if key == 'out_time_us':
+            micros = _to_float(value)
+            if micros is not None:
+                self.seconds_done = max(micros / 1_000_000, 0.0)
+        elif key == 'out_time' and not self.seconds_done:
+            try:
+                self.seconds_done = max(parse_clock(value), 0.0)
+            except ValueError:
+                pass
+        elif key == 'fps':
+            self.fps = _to_float(value)
+        elif key == 'speed':
+            self.speed = _to_float(value, 'x')
+        elif key == 'total_size':
+            size = _to_float(value)
+            self.total_size = int(size) if size is not None else self.total_size
+        elif key == 'progress':
+            self.finished = value == 'end'
+            return True
+        return False
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def percent(self):
+        if self.duration <= 0:
+            return 0.0
+        return min(self.seconds_done / self.duration * 100, 100.0)
+
+    @property
+    def rate(self):
+        """Media seconds encoded per wall-clock second."""
+        if self.speed:
+            return self.speed
+        elapsed = self.elapsed
+        return self.seconds_done / elapsed if elapsed > 0 and self.seconds_done else None
+
+    @property
+    def remaining_seconds(self):
+        return max(self.duration - self.seconds_done, 0.0)
+
+    @property
+    def eta_seconds(self):
+        rate = self.rate
+        if not rate or self.duration <= 0:
+            return None
+        return self.remaining_seconds / rate
+
+    @property
+    def bytes_per_second(self):
+        elapsed = self.elapsed
+        return self.total_size / elapsed if elapsed > 0 else 0.0
+
+    def format_status(self):
+        speed = f"{self.rate:.2f}x" if self.rate else '?x'
+        fps = f"{self.fps:.0f} fps" if self.fps else '? fps'
+        return (f"{self.percent:5.1f}% {speed} {fps} ETA {format_eta(self.eta_seconds)} "
+                f"{format_size(self.total_size)} ({format_size(self.bytes_per_second)}/s)")
+
+
+class ProgressBoard:
+    """All running jobs of a session, for aggregate throughput and ETA."""
+
+    def __init__(self):
+        self.planned_seconds = 0.0
+        self.completed_seconds = 0.0
+        self.jobs = []
+        self.title_throttle = Throttle()
+        self._lock = threading.Lock()
+
+    def plan(self, total_seconds):
+        """Set the media duration the whole session is expected to encode."""
+        with self._lock:
+            self.planned_seconds = float(total_seconds)
+            self.completed_seconds = 0.0
+
+    def extend_plan(self, seconds):
+        """Add the duration of a file queued after the session started (watch mode)."""
+        with self._lock:
+            self.planned_seconds += float(seconds)
+
+    def start_job(self, name, duration):
+        job = JobProgress(name, duration)
+        with self._lock:
+            self.jobs.append(job)
+        return job
+
+    def finish_job(self, job):
+        with self._lock:
+            if job in self.jobs:
+                self.jobs.remove(job)
+                self.completed_seconds += job.duration
+
+    def aggregate(self):
+        """Return combined speed, output throughput and ETA of the session."""
+        with self._lock:
+            jobs = list(self.jobs)
+            completed = self.completed_seconds
+            planned = self.planned_seconds
+        rate = sum(job.rate or 0.0 for job in jobs)
+        in_flight = sum(min(job.seconds_done, job.duration) for job in jobs)
+        remaining = max(planned - completed - in_flight, 0.0)
+        return {
+            'jobs': len(jobs),
+            'rate': rate,
+            'bytes_per_second': sum(job.bytes_per_second for job in jobs),
+            'remaining_seconds': remaining,
+            'eta_seconds': remaining / rate if rate else None
+        }
+
+    def format_status(self):
+        totals = self.aggregate()
+        return (f"{totals['jobs']} jobs {totals['rate']:.2f}x "
+                f"{format_size(totals['bytes_per_second'])}/s ETA {format_eta(totals['eta_seconds'])}")
@@ -0,0 +1,448 @@
+import logging
+import struct
+import os
+
+#####################################
+##                                 ##
+##  Container Header Probe         ##
+##    Reads Matroska and MP4/MOV   ##
+##    headers without ffprobe      ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+MATROSKA_EXTENSIONS = ('.mkv', '.webm')
+ISOBMFF_EXTENSIONS = ('.mp4', '.m4v', '.mov')
+# Header elements larger than this are not parsed in memory
+MAX_HEADER_BYTES = 16 * 1024 * 1024
+
+
+class UnsupportedMedia(ValueError):
+    """The file cannot be probed from its headers; ffprobe has to be used."""
+
+
+# ==================== CODEC NAMES ====================
+# Matroska CodecID -> ffprobe codec_name
+MATROSKA_CODECS = {
+    'V_MPEG4/ISO/AVC': 'h264',
+    'V_MPEGH/ISO/HEVC': 'hevc',
+    'V_AV1': 'av1',
+    'V_VP8': 'vp8',
+    'V_VP9': 'vp9',
+    'V_MPEG1': 'mpeg1video',
+    'V_MPEG2': 'mpeg2video',
+    'V_MPEG4/ISO/ASP': 'mpeg4',
+    'V_MPEG4/ISO/SP': 'mpeg4',
+    'V_MPEG4/ISO/AP': 'mpeg4',
+    'V_MPEG4/MS/V3': 'msmpeg4v3',
+    'V_THEORA': 'theora',
+    'A_AAC': 'aac',
+    'A_AC3': 'ac3',
+    'A_EAC3': 'eac3',
+    'A_DTS': 'dts',
+    'A_DTS/EXPRESS': 'dts',
+    'A_DTS/LOSSLESS': 'dts',
+    'A_TRUEHD': 'truehd',
+    'A_MPEG/L2': 'mp2',
+    'A_MPEG/L3': 'mp3',
+    'A_VORBIS': 'vorbis',
+    'A_OPUS': 'opus',
+    'A_FLAC': 'flac',
+    'A_ALAC': 'alac',
+    'S_TEXT/UTF8': 'subrip',
+    'S_TEXT/SSA': 'ass',
+    'S_TEXT/ASS': 'ass',
+    'S_TEXT/WEBVTT': 'webvtt',
+    'S_HDMV/PGS': 'hdmv_pgs_subtitle',
+    'S_VOBSUB': 'dvd_subtitle',
+    'S_DVBSUB': 'dvb_subtitle'
+}
+
+# BITMAPINFOHEADER compression of V_MS/VFW/FOURCC tracks
+FOURCC_CODECS = {
+    'XVID': 'mpeg4', 'DIVX': 'mpeg4', 'DX50': 'mpeg4', 'FMP4': 'mpeg4', 'MP4V': 'mpeg4',
+    'DIV3': 'msmpeg4v3', 'MP43': 'msmpeg4v3', 'MP42': 'msmpeg4v2',
+    'WMV3': 'wmv3', 'WVC1': 'vc1', 'MJPG': 'mjpeg',
+    'H264': 'h264', 'X264': 'h264', 'AVC1': 'h264'
+}
+
+# WAVEFORMATEX format tag of A_MS/ACM tracks
+FORMAT_TAG_CODECS = {0x0050: 'mp2', 0x0055: 'mp3', 0x00FF: 'aac', 0x0161: 'wmav2',
+                     0x2000: 'ac3', 0x2001: 'dts'}
+
+# ISO BMFF sample entry type -> ffprobe codec_name
+ISOBMFF_CODECS = {
+    b'avc1': 'h264', b'avc3': 'h264',
+    b'hvc1': 'hevc', b'hev1': 'hevc',
+    b'av01': 'av1', b'vp09': 'vp9', b'vp08': 'vp8',
+    b'mp4v': 'mpeg4', b'jpeg': 'mjpeg',
+    b'mp4a': 'aac', b'ac-3': 'ac3', b'ec-3': 'eac3',
+    b'Opus': 'opus', b'fLaC': 'flac', b'alac': 'alac', b'.mp3': 'mp3',
+    b'tx3g': 'mov_text'
+}
+
+# MPEG-4 objectTypeIndication of mp4v/mp4a tracks, for codecs other than the default
+OBJECT_TYPE_CODECS = {
+    0x60: 'mpeg2video', 0x61: 'mpeg2video', 0x62: 'mpeg2video', 0x63: 'mpeg2video',
+    0x64: 'mpeg2video', 0x65: 'mpeg2video', 0x6A: 'mpeg1video', 0x6C: 'mjpeg',
+    0x69: 'mp3', 0x6B: 'mp3', 0xA5: 'ac3', 0xA6: 'eac3'
+}
+
+ISOBMFF_HANDLERS = {b'vide': 'video', b'soun': 'audio', b'subt': 'subtitle',
+                    b'sbtl': 'subtitle', b'text': 'subtitle'}
+MATROSKA_TRACK_TYPES = {1: 'video', 2: 'audio', 17: 'subtitle'}
+
+
+def _pcm_codec(bits, float_samples=False, big_endian=False):
+    if float_samples:
+        return {32: 'pcm_f32le', 64: 'pcm_f64le'}.get(bits)
+    if bits == 8:
+        return 'pcm_u8'
+    if bits in (16, 24, 32):
+        return f"pcm_s{bits}{'be' if big_endian else 'le'}"
+    return None
+
+
+def _stream(codec_type, codec_name, width=None, height=None):
+    """One stream in the shape ffprobe's JSON output uses."""
+    if not codec_name:
+        raise UnsupportedMedia(f"Unknown {codec_type} codec")
+    stream = {'codec_type': codec_type, 'codec_name': codec_name}
+    if codec_type == 'video':
+        stream.update(width=width or 0, height=height or 0)
+    return stream
+
+
+def _info(streams, duration):
+    if not duration or duration <= 0:
+        raise UnsupportedMedia("No duration in the headers")
+    for index, stream in enumerate(streams):
+        stream['index'] = index
+    return {'streams': streams, 'format': {'duration': f"{duration:.6f}"}}
+
+
+# ==================== MATROSKA ====================
+EBML_HEADER = 0x1A45DFA3
+SEGMENT = 0x18538067
+SEEK_HEAD = 0x114D9B74
+SEEK = 0x4DBB
+SEEK_ID = 0x53AB
+SEEK_POSITION = 0x53AC
+INFO = 0x1549A966
+TIMECODE_SCALE = 0x2AD7B1
+DURATION = 0x4489
+TRACKS = 0x1654AE6B
+TRACK_ENTRY = 0xAE
+TRACK_TYPE = 0x83
+CODEC_ID = 0x86
+CODEC_PRIVATE = 0x63A2
+VIDEO = 0xE0
+PIXEL_WIDTH = 0xB0
+PIXEL_HEIGHT = 0xBA
+AUDIO = 0xE1
+BIT_DEPTH = 0x6264
+CLUSTER = 0x1F43B675
+DOC_TYPE = 0x4282
+
+
+def _vint(data, position, keep_marker=False):
+    """Decode an EBML variable-length integer; returns (value, next position). None means unknown size."""
+    first = data[position]
+    length = 9 - first.bit_length()
+    if length > 8:
+        raise UnsupportedMedia("Invalid EBML integer")
+    value = first if keep_marker else first & ((1 << (8 - length)) - 1)
+    for byte in data[position + 1:position + length]:
+        value = (value << 8) | byte
+    if not keep_marker and value == (1 << (7 * length)) - 1:
+        value = None
+    return value, position + length
+
+
+def _elements(data):
+    """Yield (id, payload) for the EBML elements in a buffer."""
+    position = 0
+    while position < len(data):
+        element_id, position = _vint(data, position, keep_marker=True)
+        size, position = _vint(data, position)
+        if size is None:
+            size = len(data) - position
+        yield element_id, data[position:position + size]
+        position += size
+
+
+def _uint(payload):
+    return int.from_bytes(payload, 'big') if payload else 0
+
+
+def _read_element_header(f):
+    """Read an element ID and size from the file; returns (id, size, header length)."""
+    header = f.read(12)
+    if len(header) < 2:
+        return None, None, 0
+    element_id, position = _vint(header, 0, keep_marker=True)
+    size, position = _vint(header, position)
+    f.seek(position - len(header), os.SEEK_CUR)
+    return element_id, size, position
+
+
+def _read_payload(f, size):
+    if size is None or size > MAX_HEADER_BYTES:
+        raise UnsupportedMedia("Header element too large")
+    return f.read(size)
+
+
+def _parse_matroska_info(payload):
+    scale = 1000000
+    duration = None
+    for element_id, value in _elements(payload):
+        if element_id == TIMECODE_SCALE:
+            scale = _uint(value)
+        elif element_id == DURATION:
+            duration = struct.unpack('>f' if len(value) == 4 else '>d', value)[0]
+    return duration * scale / 1e9 if duration else None
+
+
+def _parse_matroska_track(payload):
+    track = {}
+    for element_id, value in _elements(payload):
+        if element_id == TRACK_TYPE:
+            track['type'] = _uint(value)
+        elif element_id == CODEC_ID:
+            track['codec'] = value.rstrip(b'\0').decode('ascii', 'replace')
+        elif element_id == CODEC_PRIVATE:
+            track['private'] = value
+        elif element_id in (VIDEO, AUDIO):
+            for child_id, child in _elements(value):
+                if child_id == PIXEL_WIDTH:
+                    track['width'] = _uint(child)
+                elif child_id == PIXEL_HEIGHT:
+                    track['height'] = _uint(child)
+                elif child_id == BIT_DEPTH:
+                    track['bits'] = _uint(child)
+
+    codec_type = MATROSKA_TRACK_TYPES.get(track.get('type'))
+    if codec_type is None:
+        return None
+    codec = track.get('codec', '')
+    private = track.get('private', b'')
+    if codec == 'V_MS/VFW/FOURCC' and len(private) >= 20:
+        codec_name = FOURCC_CODECS.get(private[16:20].decode('ascii', 'replace').upper())
+    elif codec == 'A_MS/ACM' and len(private) >= 2:
+        format_tag = struct.unpack('<H', private[:2])[0]
+        if format_tag == 1 and len(private) >= 16:
+            codec_name = _pcm_codec(struct.unpack('<H', private[14:16])[0])
+        else:
+            codec_name = FORMAT_TAG_CODECS.get(format_tag)
+    elif codec.startswith('A_PCM/'):
+        codec_name = _pcm_codec(track.get('bits'), codec == 'A_PCM/FLOAT/IEEE', codec == 'A_PCM/INT/BIG')
+    else:
+        # A_AAC also comes with the profile appended, e.g. A_AAC/MPEG4/LC
+        codec_name = MATROSKA_CODECS.get(codec) or ('aac' if codec.startswith('A_AAC') else None)
+    return _stream(codec_type, codec_name, track.get('width'), track.get('height'))
+
+
+def probe_matroska(f):
+    """Read segment info and tracks from a Matroska/WebM file."""
+    element_id, size, _ = _read_element_header(f)
+    if element_id != EBML_HEADER:
+        raise UnsupportedMedia("Not an EBML file")
+    doc_type = dict(_elements(_read_payload(f, size))).get(DOC_TYPE, b'')
+    if doc_type not in (b'matroska', b'webm'):
+        raise UnsupportedMedia(f"Unsupported EBML document type {doc_type!r}")
+
+    element_id, size, _ = _read_element_header(f)
+    if element_id != SEGMENT:
+        raise UnsupportedMedia("No Matroska segment")
+    segment_start = f.tell()
+    segment_end = segment_start + size if size is not None else os.fstat(f.fileno()).st_size
+
+    found = {}
+    positions = {}
+    position = segment_start
+    while position < segment_end and not (INFO in found and TRACKS in found):
+        f.seek(position)
+        element_id, size, header_length = _read_element_header(f)
+        if element_id is None or element_id == CLUSTER or size is None:
+            break
+        if element_id in (INFO, TRACKS):
+            found[element_id] = _read_payload(f, size)
+        elif element_id == SEEK_HEAD:
+            for seek_id, seek in _elements(_read_payload(f, size)):
+                if seek_id == SEEK:
+                    entry = dict(_elements(seek))
+                    positions.setdefault(_uint(entry.get(SEEK_ID)), _uint(entry.get(SEEK_POSITION)))
+        position += header_length + size
+
+    # Info or Tracks written after the clusters are found through the SeekHead
+    for element_id in (INFO, TRACKS):
+        if element_id not in found and element_id in positions:
+            f.seek(segment_start + positions[element_id])
+            seek_id, size, _ = _read_element_header(f)
+            if seek_id == element_id:
+                found[element_id] = _read_payload(f, size)
+    if INFO not in found or TRACKS not in found:
+        raise UnsupportedMedia("Segment info or tracks not found")
+
+    streams = []
+    for element_id, payload in _elements(found[TRACKS]):
+        if element_id == TRACK_ENTRY:
+            stream = _parse_matroska_track(payload)
+            if stream:
+                streams.append(stream)
+    return _info(streams, _parse_matroska_info(found[INFO]))
+
+
+# ==================== ISO BMFF (MP4/MOV) ====================
+ISOBMFF_CONTAINERS = (b'trak', b'mdia', b'minf', b'stbl')
+
+
+def _boxes(f, start, end):
+    """Yield (type, payload start, box end) for the boxes between two file offsets."""
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header_length = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_length = 16
+        elif size == 0:
+            size = end - position
+        if size < header_length:
+            raise UnsupportedMedia("Invalid box size")
+        yield box_type, position + header_length, position + size
+        position += size
+
+
+def _read_box(f, start, end):
+    if end - start > MAX_HEADER_BYTES:
+        raise UnsupportedMedia("Header box too large")
+    f.seek(start)
+    return f.read(end - start)
+
+
+def _time_header_duration(payload):
+    """Duration in seconds from an mvhd or mdhd payload."""
+    if payload[0] == 1:
+        timescale, duration = struct.unpack('>IQ', payload[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', payload[12:20])
+    return duration / timescale if timescale else 0
+
+
+def _object_type(entry):
+    """objectTypeIndication from the esds box of an mp4v/mp4a sample entry, or None."""
+    position = entry.find(b'esds')
+    if position < 0:
+        return None
+    data = entry[position + 8:]
+    index = 0
+    while index < len(data):
+        tag = data[index]
+        index += 1
+        length = 0
+        for _ in range(4):
+            byte = data[index]
+            index += 1
+            length = (length << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        if tag == 3:
+            # ES_ID, flags, then the optional dependsOn_ES_ID, URL and OCR_ES_Id
+            flags = data[index + 2]
+            index += 5 if flags & 0x80 else 3
+            if flags & 0x40:
+                index += 1 + data[index]
+            if flags & 0x20:
+                index += 2
+        elif tag == 4:
+            return data[index]
+        else:
+            index += length
+    return None
+
+
+def _parse_track(f, start, end):
+    handler = None
+    duration = 0
+    entry = None
+    stack = [(start, end)]
+    while stack:
+        for box_type, box_start, box_end in _boxes(f, *stack.pop()):
+            if box_type in ISOBMFF_CONTAINERS:
+                stack.append((box_start, box_end))
+            elif box_type == b'hdlr':
+                handler = _read_box(f, box_start, box_end)[8:12]
+            elif box_type == b'mdhd':
+                duration = _time_header_duration(_read_box(f, box_start, box_end))
+            elif box_type == b'stsd':
+                entry = _read_box(f, box_start, box_end)[8:]
+
+    codec_type = ISOBMFF_HANDLERS.get(handler)
+    if codec_type is None or entry is None or len(entry) < 8:
+        return None, duration
+    sample_type = entry[4:8]
+    codec_name = ISOBMFF_CODECS.get(sample_type)
+    if sample_type in (b'mp4v', b'mp4a'):
+        codec_name = OBJECT_TYPE_CODECS.get(_object_type(entry), codec_name)
+    width = height = None
+    if codec_type == 'video' and len(entry) >= 36:
+        width, height = struct.unpack('>HH', entry[32:36])
+    return _stream(codec_type, codec_name, width, height), duration
+
+
+def probe_isobmff(f):
+    """Read the movie and track headers of an MP4/MOV file."""
+    file_size = os.fstat(f.fileno()).st_size
+    moov = next(((start, end) for box_type, start, end in _boxes(f, 0, file_size)
+                 if box_type == b'moov'), None)
+    if moov is None:
+        raise UnsupportedMedia("No moov box")
+
+    duration = 0
+    track_durations = [0]
+    streams = []
+    for box_type, start, end in _boxes(f, *moov):
+        if box_type == b'mvhd':
+            duration = _time_header_duration(_read_box(f, start, end))
+        elif box_type == b'trak':
+            stream, track_duration = _parse_track(f, start, end)
+            track_durations.append(track_duration)
+            if stream:
+                streams.append(stream)
+    return _info(streams, duration or max(track_durations))
+
+
+# ==================== PROBE ====================
+def probe_headers(filepath):
+    """
+    Probe a Matroska or MP4/MOV file from its container headers. Returns
+    ffprobe-shaped JSON (streams with codec_type/codec_name/width/height
+    and format duration) for normalize_media_info. Raises UnsupportedMedia
+    for other containers, codecs it cannot name and unreadable headers.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension in MATROSKA_EXTENSIONS:
+        parser = probe_matroska
+    elif extension in ISOBMFF_EXTENSIONS:
+        parser = probe_isobmff
+    else:
+        raise UnsupportedMedia(f"No header parser for {extension or 'files without an extension'}")
+
+    try:
+        with open(filepath, 'rb') as f:
+            return parser(f)
+    except UnsupportedMedia:
+        raise
+    except (OSError, struct.error, IndexError, KeyError, ValueError, ZeroDivisionError) as e:
+        raise UnsupportedMedia(f"Could not parse headers: {e}")
+
+
+def probe_with_fallback(filepath, ffprobe):
+    """Probe from the headers, or with ffprobe(filepath) when that is not possible."""
+    try:
+        return probe_headers(filepath)
+    except UnsupportedMedia as e:
+        logging.debug(f"Using ffprobe for {filepath}: {e}")
+        return ffprobe(filepath)
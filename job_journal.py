@@ -0,0 +1,103 @@
+import threading
+import logging
+import time
+import os
+import catalog_db
+
+#####################################
+##                                 ##
+##  Conversion Job Journal         ##
+##    Append-only state log per    ##
+##    file for crash-safe resume   ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+JOB_JOURNAL = 'jobJournal.jsonl'
+
+PLANNED = 'planned'
+BACKED_UP = 'backed-up'
+ENCODING = 'encoding'
+PROBED = 'probed'
+COMMITTED = 'committed'
+REVERTED = 'reverted'
+SKIPPED = 'skipped'
+FAILED = 'failed'
+
+# States after which there is nothing left to do for a file
+TERMINAL_STATES = (COMMITTED, REVERTED, SKIPPED)
+
+
+class JobJournal:
+    """
+    Records each file's state transitions, fsynced, so a run interrupted by
+    a crash, sleep or suspend can be resumed from the step each file was on.
+    The planned entry carries the command object; the probed entry carries
+    the catalog update.
+    """
+
+    def __init__(self, journal_file=JOB_JOURNAL):
+        self.journal_file = journal_file
+        self.run_id = time.strftime('%Y%m%d-%H%M%S')
+        self._lock = threading.Lock()
+
+    def record(self, file_id, state, **data):
+        entry = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'run': self.run_id,
+                 'fileId': int(file_id), 'state': state}
+        entry.update(data)
+        with self._lock:
+            catalog_db.append_journal_entry(entry, self.journal_file)
+
+    def load(self):
+        """
+        Return {fileId: job} for every file in the journal, where job holds
+        the latest state, the command object and the last probe results.
+        """
+        jobs = {}
+        for entry in catalog_db.read_journal(self.journal_file):
+            job = jobs.setdefault(entry['fileId'], {})
+            if entry['state'] == PLANNED:
+                job.clear()
+                job['command'] = entry.get('command')
+            if 'results' in entry:
+                job['results'] = entry['results']
+            job['state'] = entry['state']
+            job['run'] = entry.get('run')
+        return jobs
+
+    def unfinished(self):
+        """Jobs whose last state is not terminal, in journal order."""
+        return {file_id: job for file_id, job in self.load().items()
+                if job['state'] not in TERMINAL_STATES and job.get('command')}
+
+    def reset_if_finished(self):
+        """Start a new journal when every recorded job is finished."""
+        if os.path.exists(self.journal_file) and not self.unfinished():
+            with self._lock:
+                os.remove(self.journal_file)
+
+
+def resume_step(job, original_path):
+    """
+    Decide where an unfinished job continues, checking the files on disk
+    since the journal may be one step behind them:
+      'commit' - probe results are journaled, only the catalog update is missing
+      'encode' - the original is in the backup folder; (re)encode from it
+      'convert' - the backup move never completed; run the whole conversion
+      None - the original is in neither place, leave it for manual checks
+    """
+    command_object = job['command']
+    if job['state'] == PROBED and job.get('results'):
+        return 'commit'
+    # Before the backup move finished the original is authoritative (robocopy
+    # /MOV only deletes it after a complete copy); afterwards anything at the
+    # library path is a partial encode
+    if job['state'] == PLANNED and os.path.exists(original_path):
+        return 'convert'
+    if os.path.exists(command_object['originalFileBackup']):
+        return 'encode'
+    if os.path.exists(original_path):
+        return 'convert'
+    logging.error(f"Cannot resume file {command_object['fileId']}: neither {original_path} "
+                  f"nor {command_object['originalFileBackup']} exists")
+    return None
@@ -1,13 +1,85 @@
-import pandas as pd
+import argparse
 import json
+import csv
+import sys
+import os
+from scan_library import CATALOG_COLUMNS
 
-with open('fileList.json', 'r', encoding='ANSI') as f:
-    json_data = json.load(f)
+JSON_FILE = 'fileList.json'
+CSV_FILE = 'fileList.csv'
+CHUNK_SIZE = 1000
 
-# Create a pandas DataFrame
-df = pd.DataFrame(json_data)
 
-# Export to CSV
-df.to_csv('fileList.csv', index=False)
+def iter_json_records(f):
+    """
+    Stream records from the scanner's fileList.json one line at a time.
+    Yields (line_number, record, error); error is set for malformed lines.
+    """
+    for line_number, line in enumerate(f, start=1):
+        text = line.strip()
+        if text in ('', '[', ']'):
+            continue
+        if text.startswith(','):
+            text = text[1:]
 
-print("JSON data successfully converted to fileList.csv")
+        try:
+            record = json.loads(text)
+        except json.JSONDecodeError as e:
+            yield line_number, None, str(e)
+            continue
+
+        if not isinstance(record, dict):
+            yield line_number, None, "record is not a JSON object"
+            continue
+        yield line_number, record, None
+
+
+def convert_json_to_csv(json_file=JSON_FILE, csv_file=CSV_FILE, chunk_size=CHUNK_SIZE):
+    """
+    Convert fileList.json to CSV in fixed-size chunks so memory use depends
+    on the chunk size, not the library size. Malformed records are reported
+    with their line number and skipped.
+    """
+    written = 0
+    malformed = []
+    temp_file = f"{csv_file}.tmp"
+
+    with open(json_file, 'r', encoding='ANSI') as src, \
+            open(temp_file, 'w', newline='', encoding='utf-8') as dest:
+        writer = csv.DictWriter(dest, fieldnames=CATALOG_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        chunk = []
+
+        for line_number, record, error in iter_json_records(src):
+            if error:
+                malformed.append(line_number)
+                print(f"Skipping malformed record at line {line_number}: {error}", file=sys.stderr)
+                continue
+
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                writer.writerows(chunk)
+                written += len(chunk)
+                chunk.clear()
+
+        writer.writerows(chunk)
+        written += len(chunk)
+
+    os.replace(temp_file, csv_file)
+    return written, malformed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Convert fileList.json to fileList.csv')
+    parser.add_argument('json_file', nargs='?', default=JSON_FILE, help='Scanner JSON output')
+    parser.add_argument('csv_file', nargs='?', default=CSV_FILE, help='Catalog CSV to write')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help='Records to buffer before each write')
+    args = parser.parse_args()
+
+    written, malformed = convert_json_to_csv(args.json_file, args.csv_file, max(1, args.chunk_size))
+
+    print(f"JSON data successfully converted to {args.csv_file} ({written} records)")
+    if malformed:
+        print(f"{len(malformed)} malformed records skipped at lines: "
+              f"{', '.join(map(str, malformed[:20]))}{' ...' if len(malformed) > 20 else ''}")
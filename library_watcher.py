@@ -0,0 +1,517 @@
+import ctypes.util
+import threading
+import argparse
+import logging
+import select
+import struct
+import ctypes
+import errno
+import time
+import sys
+import os
+import catalog_db
+import backup_index
+import probe_cache
+import scan_library
+
+#####################################
+##                                 ##
+##  Library Watcher                ##
+##    Keeps the catalog current    ##
+##    as media lands or changes    ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+# A changed file is probed once its size and mtime have held for this long
+SETTLE_SECONDS = 30
+# Library walk interval where inotify is not available (Windows, network shares)
+POLL_INTERVAL = 300
+# Longest wait for events, so stop() and settled files are noticed promptly
+WAIT_SECONDS = 1.0
+INOTIFY_READ_SIZE = 64 * 1024
+
+# Change kinds
+CHANGED = 'changed'
+REMOVED = 'removed'
+FOLDER_REMOVED = 'folder removed'
+RESCAN = 'rescan'
+
+# inotify(7) event flags
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+# struct inotify_event: wd, mask, cookie, len, then len bytes of name
+EVENT_HEADER = struct.Struct('iIII')
+
+
+def is_media(name):
+    """True for a file name with one of the scanner's media extensions."""
+    return name.lower().endswith(scan_library.MEDIA_EXTENSIONS)
+
+
+def snapshot_library(roots, excludes):
+    """{path: (size, mtime_ns)} of every media file under the roots."""
+    return {path: (size, mtime) for path, size, mtime in scan_library.iter_media_files(roots, excludes)}
+
+
+# ==================== INOTIFY ====================
+def load_inotify():
+    """libc with the inotify calls bound, or None where there is no inotify."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    """
+    One inotify watch per library folder. Folders created or moved in are
+    watched as they appear and their media files reported; an overflowed
+    event queue is reported as RESCAN.
+    """
+
+    def __init__(self, libc, roots, excludes):
+        self.libc = libc
+        self.excludes = excludes
+        self.folders = {}
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        for root in roots:
+            self.watch_tree(root)
+        logging.info(f"Watching {len(self.folders)} folders with inotify")
+
+    def watch_tree(self, top):
+        """
+        Watch a folder and its subfolders, returning the media files in them.
+        Each folder is listed after its watch is added, so files created in
+        between are not missed.
+        """
+        files = []
+        stack = [top]
+        while stack:
+            folder = stack.pop()
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                hint = ' - raise fs.inotify.max_user_watches' if error == errno.ENOSPC else ''
+                logging.warning(f"Could not watch {folder}: {os.strerror(error)}{hint}")
+            else:
+                self.folders[wd] = folder
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not scan_library.is_excluded(entry.path, self.excludes):
+                                stack.append(entry.path)
+                        elif is_media(entry.name):
+                            files.append(entry.path)
+            except OSError as e:
+                logging.warning(f"Could not scan directory {folder}: {e}")
+        return files
+
+    def unwatch_tree(self, top):
+        """Stop watching a folder that was moved away, and its subfolders."""
+        prefix = os.path.join(top, '')
+        for wd, folder in list(self.folders.items()):
+            if folder == top or folder.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.folders[wd]
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds for events; returns [(path, kind)]."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+        try:
+            data = os.read(self.fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        changes = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                logging.warning("inotify event queue overflowed - reconciling the library")
+                changes.append((None, RESCAN))
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            folder = self.folders.get(wd)
+            if folder is None or not name:
+                continue
+
+            path = os.path.join(folder, name)
+            if mask & IN_ISDIR:
+                if scan_library.is_excluded(path, self.excludes):
+                    continue
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changes += [(file, CHANGED) for file in self.watch_tree(path)]
+                elif mask & (IN_MOVED_FROM | IN_DELETE):
+                    self.unwatch_tree(path)
+                    changes.append((path, FOLDER_REMOVED))
+            elif is_media(name):
+                changes.append((path, REMOVED if mask & (IN_MOVED_FROM | IN_DELETE) else CHANGED))
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+# ==================== POLLING ====================
+class PollingWatcher:
+    """Walks the library every interval and reports what changed since the last walk."""
+
+    def __init__(self, roots, excludes, interval=POLL_INTERVAL, snapshot=None):
+        self.roots = roots
+        self.excludes = excludes
+        self.interval = interval
+        self.snapshot = snapshot if snapshot is not None else snapshot_library(roots, excludes)
+        self.next_poll = time.monotonic() + interval
+        logging.info(f"Polling the library every {interval}s")
+
+    def changes(self, timeout):
+        """Wait up to timeout seconds for the next walk; returns [(path, kind)]."""
+        wait = self.next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(0.0, wait))
+
+        snapshot = snapshot_library(self.roots, self.excludes)
+        self.next_poll = time.monotonic() + self.interval
+        changes = [(path, CHANGED) for path, stat in snapshot.items() if self.snapshot.get(path) != stat]
+        changes += [(path, REMOVED) for path in self.snapshot if path not in snapshot]
+        self.snapshot = snapshot
+        return changes
+
+    def close(self):
+        pass
+
+
+# ==================== DEBOUNCE ====================
+class Debouncer:
+    """
+    Holds changed files until their size and mtime have stayed the same for
+    settle seconds, so files still being copied or downloaded are not
+    probed half-written.
+    """
+
+    def __init__(self, settle=SETTLE_SECONDS):
+        self.settle = settle
+        self.pending = {}
+
+    @staticmethod
+    def _stat(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_size, stat.st_mtime_ns
+
+    def touch(self, path):
+        """Start (or restart) the settle time of a changed file."""
+        self.pending[path] = (self._stat(path), time.monotonic())
+
+    def discard(self, path):
+        self.pending.pop(path, None)
+
+    def discard_folder(self, folder):
+        prefix = os.path.join(folder, '')
+        for path in [path for path in self.pending if path.startswith(prefix)]:
+            del self.pending[path]
+
+    def next_due(self):
+        """Seconds until the next pending file may have settled, or None."""
+        if not self.pending:
+            return None
+        since = min(since for _, since in self.pending.values())
+        return max(0.0, since + self.settle - time.monotonic())
+
+    def ready(self):
+        """Return [(path, size, mtime_ns)] of the files that have settled."""
+        now = time.monotonic()
+        settled = []
+        for path, (stat, since) in list(self.pending.items()):
+            if now - since < self.settle:
+                continue
+            current = self._stat(path)
+            if current is None:
+                # Gone again; its removal is reported separately
+                del self.pending[path]
+            elif current != stat:
+                self.pending[path] = (current, now)
+            else:
+                del self.pending[path]
+                settled.append((path, *current))
+        return settled
+
+
+# ==================== CATALOG UPDATES ====================
+class LibraryWatcher:
+    """
+    Long-running watch of the library roots that keeps the catalog rows of
+    new, changed and removed files current. Changes made while the watcher
+    was not running are found by reconciling the library with the catalog
+    at start-up. on_row(conn, row) is called from the watcher's thread with
+    each row written for a new or changed file.
+
+    Paths a conversion is working on can be held, so its backup moves and
+    encode output are not catalogued as new media; holds last for the
+    settle time after they are released.
+    """
+
+    def __init__(self, roots=None, excludes=None, db_file=catalog_db.CATALOG_DB, backups=None,
+                 cache=None, use_headers=True, settle=SETTLE_SECONDS, poll_interval=POLL_INTERVAL,
+                 polling=False, on_row=None):
+        self.roots = roots or [scan_library.LIBRARY_ROOT]
+        self.excludes = scan_library.parse_excludes(None) if excludes is None else excludes
+        self.db_file = db_file
+        self.backups = backups or backup_index.BackupIndex(scan_library.BACKUP_ROOT)
+        self.cache = cache
+        self.use_headers = use_headers
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.polling = polling
+        self.on_row = on_row
+        self.debouncer = Debouncer(settle)
+        self._held = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def hold(self, paths):
+        """Ignore changes to these paths until they are released."""
+        with self._lock:
+            for path in paths:
+                self._held[os.path.normcase(path)] = float('inf')
+
+    def release(self, paths):
+        with self._lock:
+            until = time.monotonic() + self.settle
+            for path in paths:
+                self._held[os.path.normcase(path)] = until
+
+    def is_held(self, path):
+        with self._lock:
+            now = time.monotonic()
+            for held in [held for held, until in self._held.items() if until <= now]:
+                del self._held[held]
+            return os.path.normcase(path) in self._held
+
+    def stop(self):
+        """Ask run() to return."""
+        self._stop.set()
+
+    def _under_roots(self, path):
+        return any(path.startswith(root) for root in self.roots)
+
+    def reconcile(self, conn):
+        """
+        Compare the library with the catalog: new files and files whose size
+        or mtime changed are queued for probing, and rows of files that are
+        gone are removed. Returns the library snapshot.
+        """
+        snapshot = snapshot_library(self.roots, self.excludes)
+        library = {os.path.normcase(path): path for path in snapshot}
+        queued = removed = 0
+        cursor = conn.execute(f"SELECT filePath, fileSize, fileMtime, videoCodecName "
+                              f"FROM {catalog_db.CATALOG_TABLE} WHERE filePath IS NOT NULL")
+        for row in [dict(zip(('filePath', 'fileSize', 'fileMtime', 'videoCodecName'), values))
+                    for values in cursor]:
+            path = library.pop(os.path.normcase(row['filePath']), None)
+            if path is None:
+                if (self._under_roots(row['filePath'])
+                        and not scan_library.is_excluded(os.path.dirname(row['filePath']), self.excludes)):
+                    removed += self.remove(conn, row['filePath'])
+            elif not scan_library.is_unchanged(row, *snapshot[path]):
+                self.debouncer.touch(path)
+                queued += 1
+        for path in library.values():
+            self.debouncer.touch(path)
+            queued += 1
+        logging.info(f"Reconciled {len(snapshot)} library files with {self.db_file}: "
+                     f"{queued} new or changed, {removed} removed")
+        return snapshot
+
+    def remove(self, conn, path, folder=False):
+        """Delete the catalog row of a file (or every file under a folder) that is gone."""
+        if self.is_held(path) or os.path.exists(path):
+            return 0
+        if folder:
+            self.debouncer.discard_folder(path)
+            count = catalog_db.delete_paths(conn, os.path.join(path, ''), prefix=True)
+        else:
+            self.debouncer.discard(path)
+            count = catalog_db.delete_paths(conn, path)
+        if count:
+            logging.info(f"Removed {count} catalog rows for {path}")
+        return count
+
+    def update(self, conn, path, size, mtime_ns):
+        """
+        Probe a settled file and write its catalog row, keeping the id of an
+        existing row. Returns the row, or None if the catalog was current.
+        """
+        previous = next(catalog_db.iter_rows(conn, "WHERE filePath = ?", (path,)), None)
+        if previous and scan_library.is_unchanged(previous, size, mtime_ns):
+            return None
+        file_id = previous['id'] if previous else catalog_db.next_id(conn)
+        row = scan_library.scan_file(file_id, path, size, mtime_ns, self.backups, previous,
+                                     self.use_headers, self.cache)
+        catalog_db.upsert_row(conn, row)
+        logging.info(f"{'Updated' if previous else 'Added'} {path}: {row.get('videoCodecName') or 'probe failed'}")
+        if self.on_row and row.get('videoCodecName'):
+            self.on_row(conn, row)
+        return row
+
+    def _open_watcher(self):
+        libc = None if self.polling else load_inotify()
+        if libc is None:
+            return None
+        try:
+            return InotifyWatcher(libc, self.roots, self.excludes)
+        except OSError as e:
+            logging.warning(f"inotify is not available ({e}) - polling instead")
+            return None
+
+    def run(self):
+        """Watch the library until stop() is called."""
+        conn = catalog_db.connect(self.db_file)
+        # inotify starts before the reconcile walk so nothing in between is missed
+        watcher = self._open_watcher()
+        try:
+            snapshot = self.reconcile(conn)
+            if watcher is None:
+                watcher = PollingWatcher(self.roots, self.excludes, self.poll_interval, snapshot)
+
+            while not self._stop.is_set():
+                due = self.debouncer.next_due()
+                for path, kind in watcher.changes(WAIT_SECONDS if due is None else min(due, WAIT_SECONDS)):
+                    if kind == RESCAN:
+                        self.reconcile(conn)
+                    elif self.is_held(path):
+                        continue
+                    elif kind == CHANGED:
+                        self.debouncer.touch(path)
+                    else:
+                        self.remove(conn, path, folder=kind == FOLDER_REMOVED)
+
+                settled = self.debouncer.ready()
+                for path, size, mtime_ns in settled:
+                    if self.is_held(path):
+                        continue
+                    try:
+                        self.update(conn, path, size, mtime_ns)
+                    except Exception as e:
+                        logging.error(f"Could not catalog {path}: {e}", exc_info=True)
+        finally:
+            if watcher is not None:
+                watcher.close()
+            conn.close()
+
+
+# ==================== MAIN EXECUTION ====================
+def main():
+    """Watch the library and keep the catalog current until interrupted."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('watch.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    parser = argparse.ArgumentParser(
+        description='Watch the media library and keep the catalog current',
+        epilog='Example: python library_watcher.py "\\Home Videos,\\Christmas" --settle 60'
+    )
+    parser.add_argument(
+        'excludes',
+        nargs='?',
+        default=scan_library.DEFAULT_EXCLUDES,
+        help='Comma separated path substrings to skip ("0" for none)'
+    )
+    parser.add_argument(
+        '--root',
+        action='append',
+        help=f'Library root to watch (repeatable, default: {scan_library.LIBRARY_ROOT})'
+    )
+    parser.add_argument(
+        '--db',
+        default=catalog_db.CATALOG_DB,
+        help='Catalog database to update'
+    )
+    parser.add_argument(
+        '--settle',
+        type=float,
+        default=SETTLE_SECONDS,
+        help='Seconds a new or changed file must stay unchanged before it is probed'
+    )
+    parser.add_argument(
+        '--poll',
+        nargs='?',
+        type=float,
+        const=POLL_INTERVAL,
+        metavar='SECONDS',
+        help=f'Walk the library every SECONDS instead of using inotify (default {POLL_INTERVAL})'
+    )
+    parser.add_argument(
+        '--ffprobe-only',
+        action='store_true',
+        help='Probe every file with ffprobe instead of reading Matroska/MP4 headers directly'
+    )
+    parser.add_argument(
+        '--probe-cache',
+        default=probe_cache.PROBE_CACHE,
+        help='Probe result cache ("" to probe every file)'
+    )
+    parser.add_argument(
+        '--backup-index',
+        help=f'Use the backup index saved by a conversion run (e.g. {backup_index.BACKUP_INDEX}) '
+             f'instead of walking {scan_library.BACKUP_ROOT}'
+    )
+
+    args = parser.parse_args()
+    excludes = scan_library.parse_excludes(args.excludes)
+    if args.backup_index:
+        backups = backup_index.BackupIndex.load(args.backup_index, root=scan_library.BACKUP_ROOT)
+    else:
+        backups = backup_index.BackupIndex(scan_library.BACKUP_ROOT)
+    cache = probe_cache.ProbeCache(args.probe_cache) if args.probe_cache else None
+
+    watcher = LibraryWatcher(args.root, excludes, args.db, backups, cache, not args.ffprobe_only,
+                             args.settle, args.poll or POLL_INTERVAL, polling=args.poll is not None)
+    try:
+        watcher.run()
+    finally:
+        if cache:
+            cache.close()
+            logging.info(cache.stats())
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logging.info("\nWatch stopped by user")
+        sys.exit(0)
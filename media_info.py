@@ -0,0 +1,84 @@
+import logging
+
+#####################################
+##                                 ##
+##  ffprobe Result Normalizer      ##
+##    Shared by the scanner and    ##
+##    post-conversion probing      ##
+##                                 ##
+#####################################
+
+# Catalog fields produced by normalize_media_info, in catalog column order
+MEDIA_FIELDS = [
+    'videoCodecName', 'audioCodecName', 'frameWidth', 'frameHeight',
+    'durationSeconds', 'formattedDuration', 'fileSize', 'kbps'
+]
+
+# Value the catalog has always used when a file has no audio stream
+NO_AUDIO_CODEC = 'None'
+
+
+def format_duration(seconds):
+    """Format seconds as HH:MM:SS without wrapping at 24 hours."""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}"
+
+
+def pick_stream(streams, codec_type):
+    """Return the first stream of the given codec_type, or None."""
+    for stream in streams:
+        if stream.get('codec_type') == codec_type:
+            return stream
+    return None
+
+
+def _to_int(value, default=0):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_media_info(info, file_size):
+    """
+    Turn raw ffprobe JSON into typed catalog fields in a single pass.
+    Streams are chosen by codec_type rather than position. Raises ValueError
+    when the probe result has no video stream.
+    """
+    streams = (info or {}).get('streams') or []
+    video = pick_stream(streams, 'video')
+    if video is None:
+        raise ValueError("No video stream found in ffprobe output")
+    audio = pick_stream(streams, 'audio')
+
+    duration = _to_int((info.get('format') or {}).get('duration'))
+    if not duration:
+        duration = _to_int(video.get('duration'))
+    file_size = _to_int(file_size)
+
+    return {
+        'videoCodecName': video.get('codec_name', ''),
+        'audioCodecName': audio.get('codec_name', '') if audio else NO_AUDIO_CODEC,
+        'frameWidth': _to_int(video.get('width')),
+        'frameHeight': _to_int(video.get('height')),
+        'durationSeconds': duration,
+        'formattedDuration': format_duration(duration),
+        'fileSize': file_size,
+        'kbps': round(file_size * 8 / 1024 / duration) if duration else 0
+    }
+
+
+def normalize_media_info_batch(items):
+    """
+    Normalize an iterable of (info, file_size) pairs. Entries that cannot be
+    normalized come back as None so results line up with the input.
+    """
+    results = []
+    for position, (info, file_size) in enumerate(items):
+        try:
+            results.append(normalize_media_info(info, file_size))
+        except (ValueError, AttributeError) as e:
+            logging.warning(f"Could not normalize probe result #{position}: {e}")
+            results.append(None)
+    return results
@@ -2,47 +2,50 @@
 import json
 import sys
 import os
-import time
+from media_info import MEDIA_FIELDS, normalize_media_info_batch
 
+
+def load_probe(json_input):
+    """Read ffprobe JSON from a .json file path or a JSON string."""
+    # Check if the input is a file path
+    if json_input.endswith(".json") and os.path.exists(json_input):
+        with open(json_input, 'r') as f:
+            return json.load(f)
+    # Assume it's a JSON string
+    return json.loads(json_input)
+
+
+# Kept for get-library-details-json.bat. scan_library.py and
+# query_csv_AIRefactored.py call media_info.normalize_media_info in-process.
+# Several <json> <file_size> pairs are normalized in one process, one
+# output line per pair.
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python parse_json.py <json_string_or_filepath>")
+    if len(sys.argv) < 3 or len(sys.argv) % 2 == 0:
+        print("Usage: python parse_json.py <json_string_or_filepath> <file_size> [<json> <file_size> ...]")
         sys.exit(1)
 
-    json_input = sys.argv[1]
-    size_input = sys.argv[2]
-
+    json_input = None
     try:
-        # Check if the input is a file path
-        if json_input.endswith(".json") and os.path.exists(json_input):
-            with open(json_input, 'r') as f:
-                data = json.load(f)
-        else:
-            # Assume it's a JSON string
-            data = json.loads(json_input)
-
-		# print(f"{data}")
-		# Example: Accessing a value
-        if "streams" in data:
-            
-            size_input_fmt = size_input 
-            data['format']['fileSize'] = size_input
-            data['format']['fileSize_fmt'] = size_input_fmt
-            data['format']['kbps'] = round(int(size_input)/1024*8/int(float(data['format']['duration'])),0)
-            print(f"\"videoCodecName\": \"{data['streams'][0]['codec_name']}\"" 
-                 f", \"audioCodecName\": \"{data['streams'][1]['codec_name'] if len(data['streams']) > 1 else 'None'}\"" 
-                 f", \"frameWidth\": \"{data['streams'][0]['width']}\""
-                 f", \"frameHeight\": \"{data['streams'][0]['height']}\""
-                 f", \"durationSeconds\": \"{int(float(data['format']['duration']))}\""
-                 f", \"formattedDuration\": \"{time.strftime('%H:%M:%S', time.gmtime(int(float(data['format']['duration']))))}\""
-                 f", \"fileSize\": \"{data['format']['fileSize']}\""
-                 f", \"kbps\": \"{data['format']['kbps']}\""
-				 )
-        else:
-            print("No 'streams' key found.")
+        items = []
+        for json_input, size_input in zip(sys.argv[1::2], sys.argv[2::2]):
+            items.append((load_probe(json_input), size_input))
 
-        # You can add more parsing logic here
-        # For example, iterate through keys, extract specific values, etc.
+        media_list = iter(normalize_media_info_batch(
+            (data, size_input) for data, size_input in items if "streams" in data
+        ))
+        failed = False
+        for data, _ in items:
+            if "streams" not in data:
+                print("No 'streams' key found.")
+                continue
+            media = next(media_list)
+            if media is None:
+                print("Could not normalize the probe result.")
+                failed = True
+            else:
+                print(", ".join(f"\"{field}\": \"{media[field]}\"" for field in MEDIA_FIELDS))
+        if failed:
+            sys.exit(1)
 
     except json.JSONDecodeError as e:
         print(f"Error decoding JSON: {e}")
@@ -52,4 +55,4 @@ if __name__ == "__main__":
         sys.exit(1)
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,134 @@
+import subprocess
+import logging
+import shutil
+import json
+import time
+import os
+from contextlib import nullcontext
+
+#####################################
+##                                 ##
+##  Sample-Encode Preflight        ##
+##    Predicts the final size from ##
+##    a few short sample encodes   ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+PREFLIGHT_SAMPLES = 4
+PREFLIGHT_SAMPLE_SECONDS = 20
+PREFLIGHT_MIN_SAVINGS_RATIO = 0.05
+PREFLIGHT_DIR = 'preflightSamples'
+PREFLIGHT_LOG = 'preflightLog.jsonl'
+
+
+# ==================== SAMPLE ENCODES ====================
+def sample_windows(duration, count=PREFLIGHT_SAMPLES, seconds=PREFLIGHT_SAMPLE_SECONDS):
+    """Return start times of `count` evenly spaced windows, or [] if the file is too short."""
+    if duration <= count * seconds * 2:
+        return []
+    return [duration * (index + 0.5) / count - seconds / 2 for index in range(count)]
+
+
+def get_encode_command(command_object):
+    """Return the ffmpeg command from a command object."""
+    for command in command_object['commands']:
+        if '-i' in command:
+            return command
+    raise ValueError("Command object has no ffmpeg command")
+
+
+def build_sample_command(encode_command, source_path, start, seconds, output_path):
+    """
+    Turn the full encode command into one that encodes a single window of
+    the source with the same settings.
+    """
+    command = ['-y' if arg == '-n' else arg for arg in encode_command]
+    input_index = command.index('-i')
+    command[input_index + 1] = source_path
+    command[-1] = output_path
+    command[input_index + 2:input_index + 2] = ['-t', str(seconds)]
+    command[input_index:input_index] = ['-ss', f"{start:.3f}"]
+    return command
+
+
+def predict_output_size(command_object, source_path, duration, work_dir,
+                        count=PREFLIGHT_SAMPLES, seconds=PREFLIGHT_SAMPLE_SECONDS, slots=None):
+    """
+    Encode evenly spaced sample windows and extrapolate the full output size.
+    Returns None when the file is too short to sample or a sample fails.
+    """
+    starts = sample_windows(duration, count, seconds)
+    if not starts:
+        return None
+
+    encode_command = get_encode_command(command_object)
+    os.makedirs(work_dir, exist_ok=True)
+    sampled_bytes = 0
+    try:
+        for index, start in enumerate(starts):
+            output_path = os.path.join(work_dir, f"sample_{index}.mkv")
+            command = build_sample_command(encode_command, source_path, start, seconds, output_path)
+            with slots.command_slot(command) if slots else nullcontext():
+                result = subprocess.run(command, capture_output=True, text=True)
+            if result.returncode != 0 or not os.path.exists(output_path):
+                logging.warning(f"Preflight sample {index} failed for {source_path}")
+                return None
+            sampled_bytes += os.path.getsize(output_path)
+    except (OSError, subprocess.SubprocessError) as e:
+        logging.warning(f"Preflight failed for {source_path}: {e}")
+        return None
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return int(sampled_bytes * duration / (len(starts) * seconds))
+
+
+def should_skip(original_size, predicted_size, min_savings_ratio=PREFLIGHT_MIN_SAVINGS_RATIO):
+    """Decide from the prediction whether a full encode is worth it. Returns (skip, reason)."""
+    if predicted_size is None:
+        return False, ''
+    original_size = int(float(original_size))
+    if predicted_size >= original_size:
+        return True, 'predicted larger than original'
+    if (original_size - predicted_size) / original_size < min_savings_ratio:
+        return True, f'predicted savings below {min_savings_ratio:.0%}'
+    return False, ''
+
+
+def run_preflight(command_object, source_path, duration, min_savings_ratio=PREFLIGHT_MIN_SAVINGS_RATIO,
+                  slots=None, log_file=PREFLIGHT_LOG):
+    """
+    Predict the output size of one file and decide whether to encode it.
+    The prediction is stored on the command object; skipped files are
+    logged straight away. Returns True if the file should be skipped.
+    """
+    work_dir = os.path.join(PREFLIGHT_DIR, str(command_object['fileId']))
+    predicted_size = predict_output_size(command_object, source_path, duration, work_dir, slots=slots)
+    skip, reason = should_skip(command_object['originalFileSize'], predicted_size, min_savings_ratio)
+
+    if predicted_size is not None:
+        command_object['predictedFileSize'] = predicted_size
+        logging.info(f"Preflight predicts {predicted_size:,} bytes (original "
+                     f"{int(float(command_object['originalFileSize'])):,}) for {source_path}")
+    if skip:
+        logging.info(f"Skipping {source_path}: {reason}")
+        record_prediction(command_object, source_path, skipped=True, reason=reason, log_file=log_file)
+    return skip
+
+
+def record_prediction(command_object, file_path, actual_size=None, skipped=False,
+                      reason='', log_file=PREFLIGHT_LOG):
+    """Append predicted and actual sizes to the preflight log for accuracy checks."""
+    entry = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'fileId': int(command_object['fileId']),
+        'filePath': file_path,
+        'originalSize': int(float(command_object['originalFileSize'])),
+        'predictedSize': command_object.get('predictedFileSize'),
+        'actualSize': actual_size,
+        'skipped': skipped,
+        'reason': reason
+    }
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
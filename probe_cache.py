@@ -0,0 +1,167 @@
+import threading
+import logging
+import sqlite3
+import json
+import time
+import os
+
+#####################################
+##                                 ##
+##  Probe Result Cache             ##
+##    Probe results keyed by path, ##
+##    size and mtime, LRU bounded  ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+PROBE_CACHE = 'probeCache.db'
+# Budget; the least recently used entries are evicted beyond either limit
+MAX_ENTRIES = 500000
+MAX_BYTES = 128 * 1024 * 1024
+# Scans, the watcher and conversions share the cache; wait this long for
+# another process's write instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = 10000
+
+# The parts of a probe result the catalog and verification use
+STREAM_KEYS = ('index', 'codec_type', 'codec_name', 'width', 'height', 'duration')
+
+
+def compact_info(info):
+    """Keep only the stream fields and duration from a probe result."""
+    return {
+        'streams': [{key: stream[key] for key in STREAM_KEYS if key in stream}
+                    for stream in info.get('streams') or []],
+        'format': {'duration': (info.get('format') or {}).get('duration')}
+    }
+
+
+class ProbeCache:
+    """
+    Probe results in SQLite, valid while a file's size and mtime_ns are
+    unchanged. Entries are evicted least recently used first once the
+    entry or byte budget is exceeded. Safe to share between threads and
+    processes: every call commits its own writes, and a cache that cannot
+    be read or written is treated as a miss by get_or_probe.
+    """
+
+    def __init__(self, cache_file=PROBE_CACHE, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = 0
+        self._bytes = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.cache_file, check_same_thread=False)
+            self._conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes (path TEXT PRIMARY KEY, size INTEGER, "
+                "mtime_ns INTEGER, info TEXT, bytes INTEGER, last_used REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_probes_last_used ON probes (last_used)")
+            self._conn.commit()
+            self._entries, self._bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM probes").fetchone()
+        return self._conn
+
+    def get(self, path, size, mtime_ns):
+        """Return the cached result for this version of the file, or None."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT size, mtime_ns, info FROM probes WHERE path = ?", (path,)).fetchone()
+            if row is None or row[0] != size or row[1] != mtime_ns:
+                self.misses += 1
+                return None
+            with conn:
+                conn.execute("UPDATE probes SET last_used = ? WHERE path = ?", (time.time(), path))
+            self.hits += 1
+            return json.loads(row[2])
+
+    def put(self, path, size, mtime_ns, info):
+        """Store a probe result, evicting old entries beyond the budget."""
+        data = json.dumps(compact_info(info), separators=(',', ':'))
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._remove(path)
+                conn.execute("INSERT INTO probes VALUES (?, ?, ?, ?, ?, ?)",
+                             (path, size, mtime_ns, data, len(data), time.time()))
+                self._entries += 1
+                self._bytes += len(data)
+                self._evict()
+
+    def _remove(self, path):
+        row = self._conn.execute("SELECT bytes FROM probes WHERE path = ?", (path,)).fetchone()
+        if row:
+            self._conn.execute("DELETE FROM probes WHERE path = ?", (path,))
+            self._entries -= 1
+            self._bytes -= row[0]
+
+    def _evict(self):
+        while self._entries > self.max_entries or self._bytes > self.max_bytes:
+            # Evict in batches of about 1% to keep eviction cheap
+            batch = max(1, self._entries // 100)
+            rows = self._conn.execute(
+                "SELECT path, bytes FROM probes ORDER BY last_used LIMIT ?", (batch,)).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM probes WHERE path = ?", [(path,) for path, _ in rows])
+            self._entries -= len(rows)
+            self._bytes -= sum(size for _, size in rows)
+            self.evictions += len(rows)
+
+    def invalidate(self, path):
+        """Drop the entry of a path that was rewritten (encode output, revert, restore)."""
+        with self._lock:
+            try:
+                with self._connect():
+                    self._remove(path)
+            except sqlite3.Error as e:
+                # A stale entry is harmless: the rewritten file has a new mtime
+                logging.warning(f"Could not drop {path} from the probe cache: {e}")
+
+    def get_or_probe(self, path, probe, size=None, mtime_ns=None):
+        """
+        Return the cached result for path, or probe(path) and cache it.
+        Failed probes (None or an exception) are not cached.
+        """
+        if size is None or mtime_ns is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return probe(path)
+            size, mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        try:
+            info = self.get(path, size, mtime_ns)
+        except sqlite3.Error as e:
+            logging.warning(f"Probe cache unavailable for {path}: {e}")
+            info = None
+        if info is None:
+            info = probe(path)
+            if info:
+                try:
+                    self.put(path, size, mtime_ns, info)
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not cache the probe of {path}: {e}")
+        return info
+
+    def stats(self):
+        """Counters for the log."""
+        return (f"probe cache: {self.hits} hits, {self.misses} misses, {self.evictions} evicted, "
+                f"{self._entries} entries")
+
+    def close(self):
+        """Close the store."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
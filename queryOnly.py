@@ -1,28 +1,27 @@
 import pandas as pd
-import subprocess
-import ctypes
-import json
-import time
 import sys
 import os
-
-df = pd.read_csv('fileList.csv')
+import catalog_db
 
 queryConditions = sys.argv[1]
 skipTrailer     = sys.argv[2]
+catalogBackend  = sys.argv[3] if len(sys.argv) > 3 else 'sqlite'
 
 if skipTrailer=='-trailer':
     queryConditions = queryConditions.replace("WHERE", "WHERE NOT instr(filePath,'-trailer.') AND")
 elif skipTrailer=='+trailer':
     queryConditions = queryConditions.replace("WHERE", "WHERE instr(filePath,'-trailer.') AND")
 
-from pandasql import sqldf
-
-query = "SELECT * FROM df " + queryConditions
+query = f"SELECT * FROM {catalog_db.CATALOG_TABLE} " + queryConditions
 
 print(query)
 
-result_df = sqldf(query, globals())
+if catalogBackend=='columnar':
+    import catalog_columnar
+    result_df = catalog_columnar.query_columnar(queryConditions)
+else:
+    conn = catalog_db.open_catalog()
+    result_df = pd.read_sql_query(query, conn)
 recordCount=len(result_df)
 
 if recordCount==0:
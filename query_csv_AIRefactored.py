@@ -1,14 +1,37 @@
 import pandas as pd
 import subprocess
+import threading
+import sqlite3
 import ctypes
+import queue
 import json
 import time
+import re
 import sys
 import os
 import logging
+import shutil
 import argparse
 from pathlib import Path
-from pandasql import sqldf
+from types import SimpleNamespace
+from contextlib import nullcontext
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from media_info import normalize_media_info
+import catalog_db
+import conversion_scheduler
+import savings_estimator
+import preflight
+import chunked_encode
+import ffmpeg_progress
+import conversion_metrics
+import job_journal
+import backup_index
+import skip_list
+import verify_quality
+import header_probe
+import probe_cache
+import library_watcher
 
 #####################################
 ##                                 ##
@@ -22,11 +45,53 @@ from pandasql import sqldf
 FFPROBE_PATH = 'H:\\ffmpeg\\ffprobe'
 FFMPEG_PATH = 'ffmpeg.exe'
 CSV_FILE = 'fileList.csv'
+CATALOG_DB = 'fileList.db'
+UPDATE_JOURNAL = 'fileList.journal'
+CATALOG_BACKEND = 'sqlite'
 QUERY_RESULTS_FILE = 'queriedFileList.csv'
 COMMAND_EXPORT_FILE = 'commandExport.json'
+INCOMPLETE_EXPORT_FILE = 'commandExport.incomplete.json'
+JOB_JOURNAL = 'jobJournal.jsonl'
+PLAN_FILE = 'conversionPlan.jsonl'
 BACKUP_BASE_PATH = '.\\originalStreams'
+BACKUP_INDEX = 'backupIndex.json'
+SKIP_LIST = 'skipList.jsonl'
+PROBE_CACHE = 'probeCache.db'
+WATCH_FILTER = 'watchFilter.json'
 DEFAULT_FILESIZE_THRESHOLD = 5000000
 CANCEL_MARKER = 'cancel'
+JOB_LOG_DIR = 'jobLogs'
+
+# Console and title progress updates per second are limited to this interval
+RENDER_INTERVAL = 1.0
+
+# Concurrent conversion settings (--jobs 1 keeps the sequential loop)
+MAX_JOBS = 1
+ENCODER_SLOTS = {'hevc_nvenc': 2}
+COPY_SLOTS = 1
+
+# Pipelined mode: number of upcoming files to back up while one encodes
+PREFETCH_DEPTH = 0
+MAX_PREFETCH_DEPTH = 2
+
+# Job ordering by estimated savings (see savings_estimator.py)
+JOB_ORDER = 'rate'
+MIN_EXPECTED_SAVINGS = 0
+MAX_GROW_PROBABILITY = 1.0
+
+# Sample-encode preflight (see preflight.py); None disables it
+PREFLIGHT_MIN_SAVINGS_RATIO = None
+
+# Chunked encoding of long files (see chunked_encode.py); None disables it
+CHUNK_SECONDS = None
+
+# Sampled quality verification before commit (see verify_quality.py); None disables
+# it, otherwise the minimum scores, e.g. verify_quality.DEFAULT_THRESHOLDS
+VERIFY_THRESHOLDS = None
+
+# Watch mode: seconds the conversion queue waits for new files before
+# collecting finished jobs and checking for the cancel marker
+WATCH_IDLE_SECONDS = 1.0
 
 # NVENC encoding settings
 NVENC_PRESET = 'p6'
@@ -37,7 +102,12 @@ NVENC_BUFSIZE = '20M'
 NVENC_LOOKAHEAD = '20'
 NVENC_BFRAMES = '3'
 
-# Required CSV columns
+# Reverted files are only tried again once any of these settings change
+ENCODER_PROFILE = (f"hevc_nvenc preset={NVENC_PRESET} tune={NVENC_TUNE} cq={NVENC_CQ} "
+                   f"maxrate={NVENC_MAXRATE} bufsize={NVENC_BUFSIZE} "
+                   f"lookahead={NVENC_LOOKAHEAD} bf={NVENC_BFRAMES}")
+
+# Required catalog columns
 REQUIRED_COLUMNS = ['id', 'filePath', 'fileSize', 'videoCodecName', 'durationSeconds']
 
 # ==================== LOGGING SETUP ====================
@@ -50,6 +120,27 @@ logging.basicConfig(
     ]
 )
 
+# Shared by all running jobs for aggregate throughput and ETA
+PROGRESS_BOARD = ffmpeg_progress.ProgressBoard()
+
+# Per-file stage timings, exported as JSON lines and a Prometheus textfile
+RUN_METRICS = conversion_metrics.RunMetrics()
+
+# Per-file state transitions, used by --resume after a crash or suspend
+JOBS = job_journal.JobJournal(JOB_JOURNAL)
+
+# Contents of the backup store, walked once on first use and saved for the scanner
+BACKUPS = backup_index.BackupIndex(BACKUP_BASE_PATH)
+
+# Files whose conversion was reverted, left out of later queries with the same profile
+SKIPS = skip_list.SkipList(SKIP_LIST)
+
+# Probe results of unchanged files, shared with the scanner
+PROBES = probe_cache.ProbeCache(PROBE_CACHE)
+
+# Conversion results by query-results index label, applied when processing finishes
+RESULT_UPDATES = {}
+
 
 # ==================== UTILITY FUNCTIONS ====================
 def set_terminal_title_windows(title):
@@ -73,13 +164,9 @@ def get_yes_no_input(prompt):
 
 
 def hhmmss_to_seconds(time_str):
-    """Convert HH:MM:SS format to seconds."""
+    """Convert HH:MM:SS[.ffffff] format to seconds (hours may exceed 99)."""
     try:
-        parts = time_str.split(':')
-        if len(parts) != 3:
-            raise ValueError(f"Expected HH:MM:SS format, got: {time_str}")
-        h, m, s = map(int, parts)
-        return (h * 3600) + (m * 60) + s
+        return ffmpeg_progress.parse_clock(time_str)
     except ValueError as e:
         logging.error(f"Error parsing time string: {e}")
         return 0
@@ -104,14 +191,24 @@ def validate_dataframe(df):
     """Validate that the DataFrame has all required columns."""
     missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
     if missing_columns:
-        logging.error(f"CSV missing required columns: {missing_columns}")
+        logging.error(f"Catalog missing required columns: {missing_columns}")
         return False
     return True
 
 
 # ==================== MEDIA PROCESSING FUNCTIONS ====================
 def get_media_info(filepath):
-    """Get media information using ffprobe."""
+    """Get media information, from the probe cache while the file is unchanged."""
+    return PROBES.get_or_probe(filepath, probe_media_info)
+
+
+def probe_media_info(filepath):
+    """Get media information from the container headers, or using ffprobe."""
+    return header_probe.probe_with_fallback(filepath, run_ffprobe)
+
+
+def run_ffprobe(filepath):
+    """Get media information using ffprobe; None if it fails."""
     command = [
         FFPROBE_PATH,
         '-v', 'error',
@@ -142,6 +239,9 @@ def build_conversion_command(row, gparent_dir, parent_dir, filename,
                             file_stem, directory_path, overwrite_flag):
     """Build the ffmpeg conversion command object."""
     backup_path = f"{BACKUP_BASE_PATH}\\{gparent_dir}\\{parent_dir}"
+    # robocopy /XC /XN /XO will not replace a backup that is already there
+    if BACKUPS.get(f"{backup_path}\\{filename}") is not None:
+        logging.warning(f"A backup of {filename} already exists in {backup_path}")
     
     return {
         "fileId": row.id,
@@ -196,8 +296,8 @@ def revert_conversion(new_file_path, backup_path):
         if os.path.exists(new_file_path):
             os.remove(new_file_path)
         os.rename(backup_path, new_file_path)
-        # Create a marker file to prevent reprocessing
-        os.system(f'echo DO NOT PROCESS> "{backup_path}"')
+        PROBES.invalidate(new_file_path)
+        BACKUPS.remove(backup_path)
         logging.info(f"Reverted conversion: {new_file_path}")
         return True
     except FileNotFoundError:
@@ -208,41 +308,87 @@ def revert_conversion(new_file_path, backup_path):
         return False
 
 
-def update_csv_with_conversion_results(df, result_df, file_id, fields, values):
-    """Update both CSV files with conversion results."""
-    df.loc[df['id'] == file_id, fields] = values
-    df.to_csv(CSV_FILE, index=False)
-    
-    result_df.loc[result_df['id'] == file_id, fields] = values
-    result_df.to_csv(QUERY_RESULTS_FILE, index=False)
+def update_csv_with_conversion_results(row_index, file_id, fields, values):
+    """
+    Journal the catalog update and keep it for the in-memory query results,
+    which get all updates in one pass when processing finishes. The journal
+    is compacted into the catalog at the same time.
+    """
+    with RUN_METRICS.file(file_id).stage(conversion_metrics.CATALOG_STAGE):
+        catalog_db.journal_update(file_id, fields, values, UPDATE_JOURNAL)
+        RESULT_UPDATES[row_index] = dict(zip(fields, values))
+
+
+def apply_result_updates(result_df):
+    """Apply the kept conversion results to the query results, column by column."""
+    if not RESULT_UPDATES:
+        return result_df
+    updates = pd.DataFrame.from_dict(RESULT_UPDATES, orient='index')
+    updates = updates[updates.index.isin(result_df.index)]
+    for column in updates.columns:
+        if column in result_df.columns:
+            merged = result_df[column].astype(object)
+        else:
+            merged = pd.Series(None, index=result_df.index, dtype=object)
+        merged.loc[updates.index] = updates[column]
+        result_df[column] = merged.infer_objects()
+    RESULT_UPDATES.clear()
+    return result_df
 
 
-def process_conversion_output(process, row, row_index, row_count, filename):
-    """Process and display ffmpeg output with progress tracking."""
+def process_conversion_output(process, row, row_index, row_count, filename, output=None):
+    """
+    Process ffmpeg output with progress tracking. Progress comes from the
+    -progress key=value stream; the status line and terminal title are
+    redrawn at most once per RENDER_INTERVAL. When an output stream is
+    given (concurrent jobs) log lines and status lines go there and the
+    title shows the aggregate of all jobs.
+    """
     error_flag = False
+    console = output is None
+    output = output or sys.stdout
+    job = None
+    throttle = ffmpeg_progress.Throttle(RENDER_INTERVAL)
+    status_shown = False
     
-    for line in process.stdout:
-        str_line = str(line)
-        line_prefix = str_line[:5]
-        
-        # Track progress from ffmpeg frame output
-        if line_prefix == 'frame':
-            time_index = str_line.find('time=')
-            if time_index != -1:
-                time_index += 5
-                time_str = line[time_index:time_index+8]
-                current_seconds = hhmmss_to_seconds(time_str)
-                
-                if row.durationSeconds > 0:
-                    pct_done = int(current_seconds / row.durationSeconds * 100)
-                    set_terminal_title_windows(
-                        f"File {row_index} of {row_count} ({pct_done}%): {filename}"
-                    )
+    try:
+        for line in process.stdout:
+            progress = ffmpeg_progress.parse_progress_line(line)
+            if progress is None:
+                # Plain log output (ffmpeg messages, robocopy)
+                output.write(f"\n{line}" if status_shown else line)
+                status_shown = False
+                continue
+            
+            # Only ffmpeg writes the progress stream, so robocopy never registers a job
+            if job is None:
+                job = PROGRESS_BOARD.start_job(filename, row.durationSeconds)
+            if not job.update(*progress) or not (throttle.ready() or job.finished):
+                continue
+            
+            status = job.format_status()
+            if console:
+                output.write(f"\r{status}  ")
+                output.flush()
+                status_shown = True
+                set_terminal_title_windows(
+                    f"File {row_index} of {row_count} ({job.percent:.0f}%, "
+                    f"ETA {ffmpeg_progress.format_eta(job.eta_seconds)}): {filename}"
+                )
+            else:
+                output.write(f"{status}\n")
+                if PROGRESS_BOARD.title_throttle.ready():
+                    set_terminal_title_windows(PROGRESS_BOARD.format_status())
         
-        sys.stdout.write(line)
-        sys.stdout.flush()
+        process.wait()
+    finally:
+        if job is not None:
+            PROGRESS_BOARD.finish_job(job)
+            RUN_METRICS.file(row.id).set(encodeFps=job.fps, encodeSpeed=job.rate)
     
-    process.wait()
+    if status_shown:
+        output.write("\n")
+    output.flush()
     
     # Check for errors (but ignore robocopy exit codes)
     if process.returncode != 0:
@@ -253,25 +399,55 @@ def process_conversion_output(process, row, row_index, row_count, filename):
     return error_flag
 
 
-def execute_commands(command_object, row, row_index, row_count, filename):
-    """Execute the conversion commands and handle errors."""
+def get_written_bytes(command_object, is_robocopy):
+    """Bytes written by a finished backup move or encode."""
+    path = command_object['originalFileBackup'] if is_robocopy else command_object['newFilePath']
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def execute_commands(command_object, row, row_index, row_count, filename,
+                     slots=None, output=None):
+    """
+    Execute the conversion commands and handle errors. With slot limits,
+    each command waits for a free copy or encoder slot before it starts.
+    """
     error_flag = False
+    metrics = RUN_METRICS.file(command_object['fileId'], row.filePath)
     
     for command in command_object['commands']:
         # Skip robocopy errors in final error determination
         is_robocopy = "robocopy" in str(command).lower()
+        if is_robocopy:
+            stage = conversion_metrics.BACKUP_STAGE
+        else:
+            stage = conversion_metrics.ENCODE_STAGE
+            command = ffmpeg_progress.with_progress(command)
+            JOBS.record(command_object['fileId'], job_journal.ENCODING)
+            PROBES.invalidate(command_object['newFilePath'])
         
         try:
-            process = subprocess.Popen(
-                command,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
+            with slots.command_slot(command) if slots else nullcontext(), \
+                    metrics.stage(stage, bytes_read=row.fileSize) as counts:
+                process = subprocess.Popen(
+                    command,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    text=True,
+                    bufsize=1,
+                    universal_newlines=True
+                )
+                
+                cmd_error = process_conversion_output(
+                    process, row, row_index, row_count, filename, output
+                )
+                counts['bytesWritten'] = get_written_bytes(command_object, is_robocopy)
             
-            cmd_error = process_conversion_output(process, row, row_index, row_count, filename)
+            if is_robocopy and os.path.exists(command_object['originalFileBackup']):
+                JOBS.record(command_object['fileId'], job_journal.BACKED_UP)
+                BACKUPS.add(command_object['originalFileBackup'])
             
             # Only set error flag for non-robocopy commands
             if cmd_error and not is_robocopy:
@@ -287,11 +463,30 @@ def execute_commands(command_object, row, row_index, row_count, filename):
     return error_flag
 
 
+def verify_conversion(command_object, output_path, output_info, thresholds):
+    """Verify an encode against the original in the backup folder."""
+    original_path = command_object['originalFileBackup']
+    original_info = get_media_info(original_path)
+    if not original_info:
+        return verify_quality.BROKEN
+    outcome, _ = verify_quality.verify_conversion(
+        FFMPEG_PATH, original_path, output_path, original_info, output_info,
+        thresholds, command_object['fileId']
+    )
+    return outcome
+
+
 def handle_conversion_results(command_object, directory_path, file_stem, 
-                             row, original_video_codec, file_extension):
-    """Handle post-conversion validation and CSV updates."""
+                             row, original_video_codec, file_extension, verify=None):
+    """
+    Handle post-conversion validation and CSV updates. With verify
+    thresholds, a broken encode restores the original and fails the file,
+    and an encode scoring below a threshold is reverted.
+    """
     file_to_probe = f"{directory_path}\\{file_stem}.mkv"
-    info = get_media_info(file_to_probe)
+    metrics = RUN_METRICS.file(command_object['fileId'])
+    with metrics.stage(conversion_metrics.PROBE_STAGE):
+        info = get_media_info(file_to_probe)
     
     if not info:
         logging.error(f"Could not get media info for {file_to_probe}")
@@ -300,28 +495,56 @@ def handle_conversion_results(command_object, directory_path, file_stem,
     # Extract new file information
     new_filesize = os.path.getsize(file_to_probe)
     _, new_file_ext = os.path.splitext(file_to_probe)
-    new_video_codec = info['streams'][0]['codec_name']
-    new_audio_codec = info['streams'][1]['codec_name']
-    new_width = info['streams'][0]['width']
-    new_height = info['streams'][0]['height']
-    new_duration = int(float(info['format']['duration']))
-    new_formatted_duration = time.strftime('%H:%M:%S', time.gmtime(new_duration))
-    new_kbps = int(new_filesize * 8 / 1024 / new_duration)
+    try:
+        media = normalize_media_info(info, new_filesize)
+    except ValueError as e:
+        logging.error(f"Could not read media info for {file_to_probe}: {e}")
+        return None
+    new_video_codec = media['videoCodecName']
+    new_audio_codec = media['audioCodecName']
+    new_width = media['frameWidth']
+    new_height = media['frameHeight']
+    new_duration = media['durationSeconds']
+    new_formatted_duration = media['formattedDuration']
+    new_kbps = media['kbps']
     
     original_backup = command_object['originalFileBackup']
     original_size = command_object['originalFileSize']
+    encoded_size = new_filesize
+    reverted = False
+    revert_reason = None
+    
+    if verify is not None:
+        with metrics.stage(conversion_metrics.VERIFY_STAGE):
+            outcome = verify_conversion(command_object, file_to_probe, info, verify)
+        if outcome == verify_quality.BROKEN:
+            logging.error(f"Encode of {file_to_probe} is broken - restoring original")
+            with metrics.stage(conversion_metrics.REVERT_STAGE):
+                restore_backup(command_object, {'directory_path': directory_path,
+                                                'filename': os.path.basename(original_backup)},
+                               remove_output=True)
+            return None
+        if outcome == verify_quality.LOW_QUALITY:
+            logging.warning(f"Reverting conversion - quality below thresholds")
+            revert_reason = skip_list.LOW_QUALITY
     
     # Check if conversion made file larger and should be reverted
-    if should_revert_conversion(original_size, new_filesize, original_backup):
+    if revert_reason is None and should_revert_conversion(original_size, new_filesize, original_backup):
         logging.warning(f"Reverting conversion - new file larger than original")
         logging.info(f"Original: {original_size} bytes, New: {new_filesize} bytes")
-        
-        if revert_conversion(file_to_probe, original_backup):
+        revert_reason = skip_list.REVERTED
+    
+    if revert_reason:
+        with metrics.stage(conversion_metrics.REVERT_STAGE):
+            reverted = revert_conversion(file_to_probe, original_backup)
+        if reverted:
+            SKIPS.record(file_to_probe, row.fileSize, revert_reason, ENCODER_PROFILE,
+                         original_size, encoded_size, original_backup, command_object['fileId'])
             # Use original file stats
             new_file_ext = file_extension
             new_video_codec = original_video_codec
             new_filesize = row.fileSize
-            original_size = 16  # Marker value
+            original_size = skip_list.MARKER_ORIGINAL_SIZE  # Marker value
             space_saved = 0
         else:
             return None
@@ -353,11 +576,15 @@ def handle_conversion_results(command_object, directory_path, file_stem,
         float(original_size)
     ]
     
-    return {
+    results = {
         'fields': fields_array,
         'values': values_array,
-        'space_saved': space_saved
+        'space_saved': space_saved,
+        'encoded_size': encoded_size,
+        'reverted': reverted
     }
+    JOBS.record(command_object['fileId'], job_journal.PROBED, results=results)
+    return results
 
 
 def check_for_cancel():
@@ -381,15 +608,356 @@ def handle_cancellation(shutdown_when_finished):
 
 
 # ==================== MAIN PROCESSING LOOP ====================
-def process_files(result_df, df, process_files_flag, shutdown_when_finished):
+def prepare_conversion(row, overwrite_flag):
+    """
+    Derive the path parts of a row and build its conversion command. Rows
+    loaded from a plan file carry their planned command, which is used as is.
+    """
+    # Extract path information using pathlib
+    full_path = Path(row.filePath)
+    paths = {
+        'filename': full_path.name,
+        'directory_path': str(full_path.parent),
+        'parent_directory': full_path.parent.name,
+        'gparent_directory': full_path.parent.parent.name,
+        'file_stem': full_path.stem,
+        'file_extension': full_path.suffix
+    }
+    
+    plan_command = getattr(row, 'planCommand', None)
+    if isinstance(plan_command, str):
+        return json.loads(plan_command), paths
+    
+    command_object = build_conversion_command(
+        row, paths['gparent_directory'], paths['parent_directory'], paths['filename'],
+        paths['file_stem'], paths['directory_path'], overwrite_flag
+    )
+    return command_object, paths
+
+
+# ==================== PLANNING ====================
+# Splits a library path the way prepare_conversion does with pathlib
+PATH_PATTERN = (r'^(?P<directory_path>(?:.*\\)?(?P<gparent_directory>[^\\]*)\\(?P<parent_directory>[^\\]*))'
+                r'\\(?P<filename>[^\\]+)$')
+NAME_PATTERN = r'^(?P<file_stem>.*?)(?P<file_extension>\.[^.]*)?$'
+# Stand-ins for the per-file values when a command is built once as a template
+TEMPLATE_FIELD = re.compile(r'@@(\w+)@@')
+
+
+def derive_paths(file_paths):
+    """
+    Split a whole column of library paths into the path parts used by
+    build_conversion_command. Paths without a parent and grandparent
+    folder come back as NaN.
+    """
+    normalized = file_paths.astype(str).str.replace('/', '\\', regex=False)
+    parts = normalized.str.extract(PATH_PATTERN)
+    parts = parts.join(parts['filename'].str.extract(NAME_PATTERN))
+    parts['file_extension'] = parts['file_extension'].fillna('')
+    # A drive letter is not a folder name (Path('H:\\x').parent.name is '')
+    parts.loc[parts['gparent_directory'].str.endswith(':', na=False), 'gparent_directory'] = ''
+    return parts
+
+
+def json_escape(values):
+    """Escape a column of strings for use inside JSON string literals."""
+    escaped = values.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False)
+    control = r'[\x00-\x1f]'
+    if escaped.str.contains(control, regex=True).any():
+        escaped = escaped.str.replace(control, lambda m: f"\\u{ord(m.group()):04x}", regex=True)
+    return escaped
+
+
+def command_template(overwrite_flag):
+    """
+    Split the JSON of a command object into its fixed text and the names of
+    the per-file values between, by building one from stand-ins.
+    """
+    row = SimpleNamespace(id='@@id@@', fileSize='@@fileSize@@')
+    command_object = build_conversion_command(
+        row, '@@gparent_directory@@', '@@parent_directory@@', '@@filename@@',
+        '@@file_stem@@', '@@directory_path@@', overwrite_flag
+    )
+    text = json.dumps(command_object).replace('"@@id@@"', '@@id@@')
+    pieces = TEMPLATE_FIELD.split(text)
+    return pieces[0::2], pieces[1::2]
+
+
+def build_plan_commands(result_df, parts, overwrite_flag='-n'):
+    """
+    The command object of every row as JSON text, built by concatenating
+    whole columns into the command template. Rows whose path has no parent
+    and grandparent folder go through prepare_conversion one at a time.
+    """
+    values = {name: json_escape(parts[name].fillna(''))
+              for name in ('gparent_directory', 'parent_directory', 'filename', 'file_stem', 'directory_path')}
+    values['id'] = pd.to_numeric(result_df['id']).astype('Int64').astype(str)
+    values['fileSize'] = json_escape(result_df['fileSize'].astype(str))
+    
+    texts, fields = command_template(overwrite_flag)
+    commands = pd.Series(texts[0], index=result_df.index)
+    for field, text in zip(fields, texts[1:]):
+        commands = commands + values[field] + text
+    
+    # Same warning as build_conversion_command, for the whole column at once
+    existing = {relative.casefold() for files in BACKUPS.folders.values() for relative, _ in files.values()}
+    keys = (parts['gparent_directory'] + '\\' + parts['parent_directory'] + '\\' + parts['filename']).str.casefold()
+    for key in keys[keys.isin(existing)]:
+        logging.warning(f"A backup of {key} already exists in {BACKUP_BASE_PATH}")
+    
+    unsplit = parts['filename'].isna()
+    for row in result_df[unsplit].itertuples():
+        commands[row.Index] = json.dumps(prepare_conversion(row, overwrite_flag)[0])
+    return commands
+
+
+def write_plan(result_df, plan_file=PLAN_FILE, overwrite_flag='-n'):
+    """
+    Write the conversion plan for a result set: a header line, then one
+    line per file holding its catalog row and its command object as JSON
+    text in planCommand. Paths and commands are built for whole columns,
+    and the rows are written by to_json in one pass.
+    """
+    parts = derive_paths(result_df['filePath'])
+    plan_df = result_df.drop(columns=['planCommand'], errors='ignore')
+    plan_df = plan_df.assign(planCommand=build_plan_commands(result_df, parts, overwrite_flag))
+    temp_file = f"{plan_file}.tmp"
+    
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'query': query, 'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+                            'count': len(plan_df)}) + '\n')
+        if len(plan_df):
+            plan_df.to_json(f, orient='records', lines=True, double_precision=15, date_format='iso')
+    
+    os.replace(temp_file, plan_file)
+    logging.info(f"Wrote conversion plan for {len(plan_df)} files to {plan_file}")
+    return len(plan_df)
+
+
+def read_plan(plan_file=PLAN_FILE):
+    """
+    Load a plan file. Returns (query, rows); each row keeps its planned
+    command as JSON in the planCommand column.
+    """
+    with open(plan_file, 'r', encoding='utf-8') as f:
+        header = json.loads(f.readline())
+        if header.get('count'):
+            rows = pd.read_json(f, orient='records', lines=True, dtype=False, convert_dates=False)
+        else:
+            rows = pd.DataFrame()
+    
+    logging.info(f"Loaded plan for {len(rows)} files from {plan_file} (created {header.get('created')})")
+    return header.get('query', ''), rows
+
+
+def run_file_preflight(row, command_object, paths, preflight_ratio, slots=None):
+    """Run the sample-encode preflight on the original; True means skip the file."""
+    if preflight_ratio is None:
+        return False
+    source_path = f"{paths['directory_path']}\\{paths['filename']}"
+    return preflight.run_preflight(
+        command_object, source_path, row.durationSeconds, preflight_ratio, slots
+    )
+
+
+def execute_encode(command_object, row, row_index, row_count, filename,
+                   slots=None, output=None, chunk_seconds=None):
+    """
+    Run the encode command of a command object whose backup is in place.
+    Long files are encoded in parallel chunks when chunk_seconds is set.
+    Returns True on error.
+    """
+    if chunk_seconds and chunked_encode.should_chunk(row.durationSeconds):
+        max_parallel = max((slots.limits if slots else ENCODER_SLOTS).get(
+            conversion_scheduler.get_encoder_backend(preflight.get_encode_command(command_object)), 1
+        ), 1)
+        JOBS.record(command_object['fileId'], job_journal.ENCODING)
+        PROBES.invalidate(command_object['newFilePath'])
+        metrics = RUN_METRICS.file(command_object['fileId'], row.filePath)
+        with metrics.stage(conversion_metrics.ENCODE_STAGE, bytes_read=row.fileSize) as counts:
+            status = chunked_encode.encode_chunked(
+                command_object, row.durationSeconds, chunk_seconds, max_parallel,
+                slots, should_cancel=check_for_cancel
+            )
+            counts['bytesWritten'] = get_written_bytes(command_object, False)
+        return status != 'done'
+    
+    encode_only = dict(command_object, commands=command_object['commands'][1:])
+    return execute_commands(encode_only, row, row_index, row_count, filename, slots, output)
+
+
+def convert_file(row, row_count, command_object, paths, slots=None, output=None,
+                 preflight_ratio=None, chunk_seconds=None, verify=None):
+    """
+    Run one file's commands and check the result. Returns (error_flag,
+    results); results is None for files the preflight skipped.
+    """
+    JOBS.record(command_object['fileId'], job_journal.PLANNED, command=command_object)
+    if run_file_preflight(row, command_object, paths, preflight_ratio, slots):
+        return False, None
+    
+    if chunk_seconds:
+        backup_only = dict(command_object, commands=command_object['commands'][:1])
+        error_flag = execute_commands(
+            backup_only, row, row.Index + 1, row_count, paths['filename'], slots, output
+        ) or execute_encode(
+            command_object, row, row.Index + 1, row_count, paths['filename'], slots, output, chunk_seconds
+        )
+    else:
+        error_flag = execute_commands(
+            command_object, row, row.Index + 1, row_count, paths['filename'], slots, output
+        )
+    if error_flag:
+        return True, None
+    
+    results = handle_conversion_results(
+        command_object, paths['directory_path'], paths['file_stem'],
+        row, row.videoCodecName, paths['file_extension'], verify
+    )
+    return False, results
+
+
+def start_command_export():
+    """
+    Start a new command export. An export left unterminated by a crash or
+    suspend is closed and kept as INCOMPLETE_EXPORT_FILE first.
+    """
+    if os.path.exists(COMMAND_EXPORT_FILE):
+        with open(COMMAND_EXPORT_FILE, 'r') as f:
+            content = f.read().rstrip()
+        if content and not content.endswith(']}'):
+            with open(INCOMPLETE_EXPORT_FILE, 'w') as f:
+                f.write(content + "\n]}")
+            logging.warning(f"Previous command export was incomplete - saved as {INCOMPLETE_EXPORT_FILE}")
+    
+    with open(COMMAND_EXPORT_FILE, "w") as f:
+        f.write('{"query": "' + query + '", "commandList": [')
+
+
+def append_command_export(command_object, first_entry, indent=None):
+    """Append one command object to the command export file."""
+    with open(COMMAND_EXPORT_FILE, "a") as f:
+        prefix = "\n" if first_entry else "\n,"
+        f.write(f"{prefix}{json.dumps(command_object, indent=indent)}")
+
+
+def record_conversion_results(row_index, command_object, results, first_entry):
+    """Journal a finished conversion and add it to the command export."""
+    update_csv_with_conversion_results(
+        row_index, command_object['fileId'],
+        results['fields'], results['values']
+    )
+    
+    command_object['fields_array'] = results['fields']
+    command_object['values_array'] = results['values']
+    append_command_export(command_object, first_entry, indent=4)
+    JOBS.record(command_object['fileId'],
+                job_journal.REVERTED if results['reverted'] else job_journal.COMMITTED)
+    if not results['reverted']:
+        SKIPS.clear(command_object['newFilePath'])
+    
+    if 'predictedFileSize' in command_object:
+        preflight.record_prediction(
+            command_object, command_object['newFilePath'], actual_size=results['encoded_size']
+        )
+
+
+def record_file_metrics(row, error_flag, results, outcome=None):
+    """Write the metrics record of a file once it is finished with."""
+    if outcome is None:
+        if error_flag:
+            outcome = 'failed'
+        elif results:
+            outcome = 'reverted' if results['reverted'] else 'converted'
+        elif conversion_metrics.ENCODE_STAGE in RUN_METRICS.file(row.id).stages:
+            outcome = 'failed'
+        else:
+            outcome = 'skipped'
+    
+    if outcome in (job_journal.SKIPPED, job_journal.FAILED):
+        JOBS.record(row.id, outcome)
+    
+    original_size = int(float(row.fileSize))
+    fields = {'originalSize': original_size}
+    if results:
+        fields['encodedSize'] = int(results['encoded_size'])
+        fields['savedBytes'] = int(results['space_saved'])
+        fields['savingsRatio'] = round(results['space_saved'] / original_size, 4) if original_size else 0.0
+    RUN_METRICS.file(row.id, row.filePath)
+    RUN_METRICS.finish(row.id, outcome, **fields)
+
+
+def restore_backup(command_object, paths, remove_output=False):
+    """
+    Move an original that was staged into the backup folder back to its
+    library location. With remove_output, a partial encode at the new path
+    is deleted first (only while the backup still exists).
+    """
+    backup_path = command_object['originalFileBackup']
+    original_path = f"{paths['directory_path']}\\{paths['filename']}"
+    if not os.path.exists(backup_path):
+        return False
+    
+    try:
+        if remove_output and os.path.exists(command_object['newFilePath']):
+            os.remove(command_object['newFilePath'])
+            PROBES.invalidate(command_object['newFilePath'])
+        if not os.path.exists(original_path):
+            shutil.move(backup_path, original_path)
+            BACKUPS.remove(backup_path)
+            PROBES.invalidate(original_path)
+            logging.info(f"Restored staged original: {original_path}")
+        return True
+    except OSError as e:
+        logging.error(f"Could not restore {backup_path}: {e}")
+        return False
+
+
+def finish_processing(conn, result_df, process_files_flag):
+    """Close the command export and apply the journal to the catalog."""
+    with open(COMMAND_EXPORT_FILE, "a") as f:
+        f.write("\n]}")
+    
+    # Apply journaled updates to the catalog and save the query results once
+    if process_files_flag:
+        if conn is None:
+            logging.info(f"No catalog here - carry {UPDATE_JOURNAL} to the catalog host and run "
+                         f"'python catalog_db.py compact'")
+        else:
+            with RUN_METRICS.run_stage(conversion_metrics.COMPACT_STAGE):
+                catalog_db.compact_journal(conn, UPDATE_JOURNAL)
+        apply_result_updates(result_df).to_csv(QUERY_RESULTS_FILE, index=False)
+        logging.info(f"Saved {BACKUPS.save(BACKUP_INDEX)} backups to {BACKUP_INDEX}")
+        PROBES.close()
+        logging.info(PROBES.stats())
+
+
+def process_files(result_df, conn, process_files_flag, shutdown_when_finished,
+                  max_jobs=MAX_JOBS, slots=None, prefetch_depth=PREFETCH_DEPTH,
+                  preflight_ratio=PREFLIGHT_MIN_SAVINGS_RATIO, chunk_seconds=CHUNK_SECONDS,
+                  verify=VERIFY_THRESHOLDS):
     """Main processing loop for file conversions."""
+    # Display-only mode writes the plan for the whole result set at once
+    if not process_files_flag:
+        write_plan(result_df)
+        return 0
+    
+    PROGRESS_BOARD.plan(pd.to_numeric(result_df['durationSeconds'], errors='coerce').fillna(0).sum())
+    
+    if max_jobs > 1:
+        return process_files_concurrent(result_df, conn, shutdown_when_finished, max_jobs, slots,
+                                        preflight_ratio, chunk_seconds, verify)
+    if prefetch_depth > 0:
+        return process_files_pipelined(result_df, conn, shutdown_when_finished, prefetch_depth,
+                                       preflight_ratio, chunk_seconds, verify)
+    
     overwrite_flag = '-n'
     total_saved_space = 0
+    exported = 0
     row_count = len(result_df)
     
     # Initialize command export file
-    with open(COMMAND_EXPORT_FILE, "w") as f:
-        f.write('{"query": "' + query + '", "commandList": [')
+    start_command_export()
     
     for row in result_df.itertuples():
         # Check for cancellation
@@ -397,72 +965,398 @@ def process_files(result_df, df, process_files_flag, shutdown_when_finished):
             handle_cancellation(shutdown_when_finished)
             break
         
-        # Extract path information using pathlib
-        full_path = Path(row.filePath)
-        filename = full_path.name
-        directory_path = str(full_path.parent)
-        parent_directory = full_path.parent.name
-        gparent_directory = full_path.parent.parent.name
-        file_stem = full_path.stem
-        file_extension = full_path.suffix
+        command_object, paths = prepare_conversion(row, overwrite_flag)
+        filename = paths['filename']
         
         row_index = row.Index + 1
         set_terminal_title_windows(f"File {row_index} of {row_count}: {filename}")
         
-        # Build conversion command
-        command_object = build_conversion_command(
-            row, gparent_directory, parent_directory, filename,
-            file_stem, directory_path, overwrite_flag
-        )
-        
-        # Write command to export file (display-only mode)
-        if not process_files_flag:
-            with open(COMMAND_EXPORT_FILE, "a") as f:
-                prefix = "\n" if row.Index == 0 else "\n,"
-                f.write(f"{prefix}{json.dumps(command_object)}")
-            continue
-        
         # Execute conversion
         logging.info(f"Processing file {row_index}/{row_count}: {filename}")
-        error_flag = execute_commands(command_object, row, row_index, row_count, filename)
+        error_flag, results = convert_file(row, row_count, command_object, paths,
+                                           preflight_ratio=preflight_ratio,
+                                           chunk_seconds=chunk_seconds, verify=verify)
         
         if error_flag:
+            record_file_metrics(row, error_flag, results)
             logging.error("Error occurred during conversion")
-            input("Press Enter to continue...")
+            if not check_for_cancel():
+                input("Press Enter to continue...")
             continue
         
-        # Handle conversion results
-        results = handle_conversion_results(
-            command_object, directory_path, file_stem,
-            row, row.videoCodecName, file_extension
-        )
-        
         if results:
-            # Update CSVs
-            update_csv_with_conversion_results(
-                df, result_df, command_object['fileId'],
-                results['fields'], results['values']
-            )
-            
-            # Update command object and export
-            command_object['fields_array'] = results['fields']
-            command_object['values_array'] = results['values']
-            
-            with open(COMMAND_EXPORT_FILE, "a") as f:
-                prefix = "\n" if row.Index == 0 else "\n,"
-                f.write(f"{prefix}{json.dumps(command_object, indent=4)}")
+            record_conversion_results(row.Index, command_object, results, exported == 0)
+            exported += 1
             
             # Track total space saved
             total_saved_space += results['space_saved']
             logging.info(f"Total space saved this session: {total_saved_space:,} bytes")
+        record_file_metrics(row, error_flag, results)
     
-    # Finalize command export file
-    with open(COMMAND_EXPORT_FILE, "a") as f:
-        f.write("\n]}")
+    finish_processing(conn, result_df, process_files_flag)
+    return total_saved_space
+
+
+def process_files_concurrent(result_df, conn, shutdown_when_finished, max_jobs, slots,
+                             preflight_ratio=None, chunk_seconds=None, verify=None):
+    """
+    Convert up to max_jobs files at once. Copy and encode commands wait for
+    their own slots, each job's output goes to its own log in JOB_LOG_DIR,
+    and catalog updates are made from the scheduling thread only.
+    """
+    overwrite_flag = '-n'
+    row_count = len(result_df)
+    state = {'saved': 0, 'exported': 0, 'done': 0}
+    slots = slots or conversion_scheduler.SlotLimits(ENCODER_SLOTS, COPY_SLOTS)
+    os.makedirs(JOB_LOG_DIR, exist_ok=True)
+    
+    start_command_export()
+    
+    def run_job(row):
+        command_object, paths = prepare_conversion(row, overwrite_flag)
+        log_path = os.path.join(JOB_LOG_DIR, f"{command_object['fileId']}_{paths['file_stem']}.log")
+        logging.info(f"Starting file {row.Index + 1}/{row_count}: {paths['filename']} (log: {log_path})")
+        
+        with open(log_path, 'w', encoding='utf-8', errors='replace') as output:
+            error_flag, results = convert_file(row, row_count, command_object, paths, slots, output,
+                                               preflight_ratio, chunk_seconds, verify)
+        return command_object, error_flag, results
+    
+    def on_done(row, outcome):
+        state['done'] += 1
+        set_terminal_title_windows(f"{state['done']} of {row_count} files done ({max_jobs} jobs)")
+        if not outcome:
+            record_file_metrics(row, True, None)
+            return
+        
+        command_object, error_flag, results = outcome
+        if error_flag:
+            logging.error(f"Error occurred during conversion of {row.filePath} - see {JOB_LOG_DIR}")
+        elif results:
+            record_conversion_results(row.Index, command_object, results, state['exported'] == 0)
+            state['exported'] += 1
+            state['saved'] += results['space_saved']
+            logging.info(f"Finished {row.filePath}. Total space saved this session: {state['saved']:,} bytes")
+        record_file_metrics(row, error_flag, results)
+    
+    cancelled = conversion_scheduler.run_jobs(
+        result_df.itertuples(), run_job, max_jobs,
+        should_cancel=check_for_cancel, on_done=on_done
+    )
+    
+    finish_processing(conn, result_df, True)
+    
+    if cancelled:
+        handle_cancellation(shutdown_when_finished)
+    return state['saved']
+
+
+def process_files_pipelined(result_df, conn, shutdown_when_finished, depth, preflight_ratio=None,
+                            chunk_seconds=None, verify=None):
+    """
+    Convert files one at a time while the backup moves of the next `depth`
+    files run on a background thread, so disk and encoder work overlap.
+    Staged files that never get encoded (cancel, error, interrupt) and
+    files whose encode fails or is interrupted are moved back out of the
+    backup folder.
+    """
+    overwrite_flag = '-n'
+    total_saved_space = 0
+    exported = 0
+    cancelled = False
+    row_count = len(result_df)
+    rows = result_df.itertuples()
+    staged = deque()
+    # The file being encoded, until its results are committed
+    in_flight = None
+    os.makedirs(JOB_LOG_DIR, exist_ok=True)
+    
+    start_command_export()
+    
+    def stage_backup(row, command_object, paths):
+        # None means the preflight skipped the file before anything moved
+        JOBS.record(command_object['fileId'], job_journal.PLANNED, command=command_object)
+        if run_file_preflight(row, command_object, paths, preflight_ratio):
+            return None
+        backup_only = dict(command_object, commands=command_object['commands'][:1])
+        with open(os.path.join(JOB_LOG_DIR, 'prefetch.log'), 'a',
+                  encoding='utf-8', errors='replace') as output:
+            execute_commands(backup_only, row, row.Index + 1, row_count,
+                             paths['filename'], output=output)
+        return os.path.exists(command_object['originalFileBackup'])
     
+    with ThreadPoolExecutor(max_workers=1) as stager:
+        try:
+            while True:
+                if check_for_cancel():
+                    cancelled = True
+                    break
+                
+                # Keep the current file plus `depth` look-ahead backups queued
+                while len(staged) <= depth:
+                    row = next(rows, None)
+                    if row is None:
+                        break
+                    command_object, paths = prepare_conversion(row, overwrite_flag)
+                    future = stager.submit(stage_backup, row, command_object, paths)
+                    staged.append((row, command_object, paths, future))
+                
+                if not staged:
+                    break
+                
+                row, command_object, paths, future = staged.popleft()
+                filename = paths['filename']
+                row_index = row.Index + 1
+                
+                staged_ok = future.result()
+                if staged_ok is None:
+                    record_file_metrics(row, False, None, 'skipped')
+                    continue
+                if not staged_ok:
+                    record_file_metrics(row, True, None)
+                    logging.error(f"Backup of {row.filePath} failed - see {JOB_LOG_DIR}\\prefetch.log")
+                    continue
+                
+                set_terminal_title_windows(f"File {row_index} of {row_count}: {filename}")
+                logging.info(f"Processing file {row_index}/{row_count}: {filename}")
+                in_flight = (row, command_object, paths)
+                error_flag = execute_encode(command_object, row, row_index, row_count, filename,
+                                            chunk_seconds=chunk_seconds)
+                
+                if error_flag and check_for_cancel():
+                    # Chunked work is kept for a later resume; the original goes back below
+                    logging.info("Encode interrupted by cancel marker")
+                    record_file_metrics(row, True, None, 'cancelled')
+                    cancelled = True
+                    break
+                if error_flag:
+                    logging.error("Error occurred during conversion - restoring original")
+                    with RUN_METRICS.file(row.id).stage(conversion_metrics.REVERT_STAGE):
+                        restore_backup(command_object, paths, remove_output=True)
+                    in_flight = None
+                    record_file_metrics(row, True, None)
+                    continue
+                
+                results = handle_conversion_results(
+                    command_object, paths['directory_path'], paths['file_stem'],
+                    row, row.videoCodecName, paths['file_extension'], verify
+                )
+                in_flight = None
+                
+                if results:
+                    record_conversion_results(row.Index, command_object, results, exported == 0)
+                    exported += 1
+                    total_saved_space += results['space_saved']
+                    logging.info(f"Total space saved this session: {total_saved_space:,} bytes")
+                record_file_metrics(row, False, results)
+        finally:
+            # Put back the interrupted file and anything moved ahead of the encoder
+            if in_flight is not None:
+                row, command_object, paths = in_flight
+                logging.info(f"Restoring interrupted file: {row.filePath}")
+                restore_backup(command_object, paths, remove_output=True)
+            for row, command_object, paths, future in staged:
+                if future.cancel():
+                    continue
+                try:
+                    if future.result():
+                        restore_backup(command_object, paths)
+                except Exception as e:
+                    logging.error(f"Staging of {row.filePath} failed: {e}")
+    
+    finish_processing(conn, result_df, True)
+    
+    if cancelled:
+        handle_cancellation(shutdown_when_finished)
+    return total_saved_space
+
+
+def process_files_resume(result_df, conn, jobs, shutdown_when_finished, slots=None, chunk_seconds=None,
+                         verify=None):
+    """
+    Continue the unfinished jobs of an interrupted run one file at a time,
+    each from the step recorded in the job journal (checked against the
+    files on disk). Committed files are never re-encoded.
+    """
+    total_saved_space = 0
+    exported = 0
+    cancelled = False
+    row_count = len(result_df)
+    
+    start_command_export()
+    
+    for row in result_df.itertuples():
+        if check_for_cancel():
+            cancelled = True
+            break
+        
+        job = jobs[row.id]
+        command_object = job['command']
+        _, paths = prepare_conversion(row, command_object['commands'][-1][1])
+        original_path = f"{paths['directory_path']}\\{paths['filename']}"
+        row_index = row.Index + 1
+        step = job_journal.resume_step(job, original_path)
+        
+        set_terminal_title_windows(f"Resuming file {row_index} of {row_count}: {paths['filename']}")
+        logging.info(f"Resuming file {row_index}/{row_count} after '{job['state']}' ({step}): {paths['filename']}")
+        
+        error_flag = False
+        results = None
+        if step is None:
+            error_flag = True
+        elif step == 'commit':
+            results = job['results']
+        elif step == 'convert':
+            # The original is still in place, so a backup copy is incomplete
+            if os.path.exists(command_object['originalFileBackup']):
+                os.remove(command_object['originalFileBackup'])
+                BACKUPS.remove(command_object['originalFileBackup'])
+            error_flag, results = convert_file(row, row_count, command_object, paths, slots,
+                                               chunk_seconds=chunk_seconds, verify=verify)
+        else:
+            # The backup is complete, so anything at the output path is a partial encode
+            if os.path.exists(command_object['newFilePath']):
+                os.remove(command_object['newFilePath'])
+            error_flag = execute_encode(command_object, row, row_index, row_count, paths['filename'],
+                                        slots, chunk_seconds=chunk_seconds)
+            if not error_flag:
+                results = handle_conversion_results(
+                    command_object, paths['directory_path'], paths['file_stem'],
+                    row, row.videoCodecName, paths['file_extension'], verify
+                )
+        
+        if error_flag:
+            logging.error(f"Could not resume {row.filePath}")
+        elif results:
+            record_conversion_results(row.Index, command_object, results, exported == 0)
+            exported += 1
+            total_saved_space += results['space_saved']
+            logging.info(f"Total space saved this session: {total_saved_space:,} bytes")
+        record_file_metrics(row, error_flag, results)
+    
+    finish_processing(conn, result_df, True)
+    
+    if cancelled:
+        handle_cancellation(shutdown_when_finished)
     return total_saved_space
 
 
+def load_resume_rows(conn, jobs):
+    """Fetch the catalog rows of unfinished jobs, in journal order."""
+    file_ids = list(jobs)
+    placeholders = ', '.join('?' for _ in file_ids)
+    df = pd.read_sql_query(
+        f"SELECT * FROM {catalog_db.CATALOG_TABLE} WHERE id IN ({placeholders})", conn, params=file_ids
+    )
+    order = {file_id: index for index, file_id in enumerate(file_ids)}
+    df = df.sort_values('id', key=lambda ids: ids.map(order), kind='stable')
+    return df.reset_index(drop=True)
+
+
+def process_files_watch(result_df, conn, watcher, where_clause, args, max_jobs, slots):
+    """
+    Convert the query results, then keep converting the files the library
+    watcher adds or updates in the catalog that match the query, until the
+    cancel marker appears. Paths of queued jobs are held so the watcher does
+    not catalogue their backups and encodes as new media, and the journal
+    is compacted after every file so the catalog stays current.
+    
+    Files left unfinished by an earlier run belong to --resume; their ids
+    are read from the job journal once, not for every watcher event.
+    """
+    overwrite_flag = '-n'
+    conversions = queue.Queue()
+    queued = set()
+    unfinished = set(JOBS.unfinished())
+    queued_lock = threading.Lock()
+    finished = []
+    state = {'saved': 0, 'exported': 0, 'done': 0, 'count': 0}
+    os.makedirs(JOB_LOG_DIR, exist_ok=True)
+    
+    start_command_export()
+    
+    def enqueue(candidates):
+        for record in candidates.to_dict('records'):
+            with queued_lock:
+                if record['id'] in queued:
+                    continue
+                queued.add(record['id'])
+            duration = pd.to_numeric(record['durationSeconds'], errors='coerce')
+            PROGRESS_BOARD.extend_plan(0 if pd.isna(duration) else duration)
+            conversions.put(record)
+            logging.info(f"Queued {record['filePath']} ({conversions.qsize()} waiting)")
+    
+    def on_row(watch_conn, row):
+        with queued_lock:
+            if row['id'] in queued or row['id'] in unfinished:
+                return
+        enqueue(match_watch_filter(watch_conn, row['id'], where_clause, args))
+    
+    def next_jobs():
+        # Runs on the scheduling thread; None lets run_jobs collect finished jobs
+        while True:
+            try:
+                record = conversions.get(timeout=WATCH_IDLE_SECONDS)
+            except queue.Empty:
+                yield None
+                continue
+            row_df = pd.DataFrame([record], index=[state['count']])
+            state['count'] += 1
+            row = next(row_df.itertuples())
+            command_object, paths = prepare_conversion(row, overwrite_flag)
+            watcher.hold([row.filePath, command_object['newFilePath']])
+            yield row_df, row, command_object, paths
+    
+    def run_job(job):
+        _, row, command_object, paths = job
+        log_path = os.path.join(JOB_LOG_DIR, f"{command_object['fileId']}_{paths['file_stem']}.log")
+        logging.info(f"Starting file {row.Index + 1}: {paths['filename']} (log: {log_path})")
+        
+        with open(log_path, 'w', encoding='utf-8', errors='replace') as output:
+            return convert_file(row, state['count'], command_object, paths, slots, output,
+                                args.preflight, args.chunked, args.verify)
+    
+    def on_done(job, outcome):
+        row_df, row, command_object, paths = job
+        state['done'] += 1
+        set_terminal_title_windows(f"{state['done']} files done, {conversions.qsize()} queued (watching)")
+        error_flag, results = outcome or (True, None)
+        if error_flag:
+            logging.error(f"Error occurred during conversion of {row.filePath} - see {JOB_LOG_DIR}")
+        elif results:
+            record_conversion_results(row.Index, command_object, results, state['exported'] == 0)
+            state['exported'] += 1
+            state['saved'] += results['space_saved']
+            logging.info(f"Finished {row.filePath}. Total space saved this session: {state['saved']:,} bytes")
+        record_file_metrics(row, error_flag, results)
+        
+        try:
+            catalog_db.compact_journal(conn, UPDATE_JOURNAL)
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Could not compact {UPDATE_JOURNAL} yet, keeping it for the next file: {e}")
+        finished.append(row_df)
+        watcher.release([row.filePath, command_object['newFilePath']])
+        with queued_lock:
+            queued.discard(row.id)
+    
+    enqueue(result_df)
+    watcher.on_row = on_row
+    watch_thread = threading.Thread(target=watcher.run, name='library-watcher', daemon=True)
+    watch_thread.start()
+    
+    cancelled = conversion_scheduler.run_jobs(
+        next_jobs(), run_job, max_jobs, should_cancel=check_for_cancel, on_done=on_done
+    )
+    
+    watcher.stop()
+    watch_thread.join()
+    finish_processing(conn, pd.concat(finished) if finished else result_df, True)
+    
+    if cancelled:
+        handle_cancellation(False)
+    return state['saved']
+
+
 # ==================== MAIN EXECUTION ====================
 def main():
     """Main entry point for the script."""
@@ -473,6 +1367,7 @@ def main():
     )
     parser.add_argument(
         'where_clause',
+        nargs='?',
         help='SQL WHERE clause for filtering (e.g., "WHERE videoCodecName=\'h264\'")'
     )
     parser.add_argument(
@@ -480,43 +1375,149 @@ def main():
         action='store_true',
         help='Execute conversions (default: display only)'
     )
+    parser.add_argument(
+        '--backend',
+        choices=['sqlite', 'columnar'],
+        default=CATALOG_BACKEND,
+        help='Catalog to query: SQLite database or Parquet snapshot'
+    )
+    parser.add_argument(
+        '--order',
+        choices=savings_estimator.ORDER_CHOICES,
+        default=JOB_ORDER,
+        help='Job order: bytes saved per encode second (rate), total savings, or catalog order'
+    )
+    parser.add_argument(
+        '--min-savings',
+        type=float,
+        default=MIN_EXPECTED_SAVINGS,
+        help='Skip files expected to save fewer bytes than this'
+    )
+    parser.add_argument(
+        '--max-grow-probability',
+        type=float,
+        default=MAX_GROW_PROBABILITY,
+        help='Skip files more likely than this (0-1) to grow and be reverted'
+    )
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        default=MAX_JOBS,
+        help='Number of files to convert at once (with --exec)'
+    )
+    parser.add_argument(
+        '--encoder-slots',
+        default=','.join(f"{name}={count}" for name, count in ENCODER_SLOTS.items()),
+        help='Concurrent sessions per encoder, e.g. "hevc_nvenc=2,libx265=4"'
+    )
+    parser.add_argument(
+        '--copy-slots',
+        type=int,
+        default=COPY_SLOTS,
+        help='Concurrent backup/copy commands'
+    )
+    parser.add_argument(
+        '--prefetch',
+        type=int,
+        default=PREFETCH_DEPTH,
+        help=f'Back up the next N files while the current one encodes (max {MAX_PREFETCH_DEPTH})'
+    )
+    parser.add_argument(
+        '--chunked',
+        nargs='?',
+        type=int,
+        const=chunked_encode.CHUNK_SECONDS,
+        default=CHUNK_SECONDS,
+        metavar='CHUNK_SECONDS',
+        help=f'Encode files longer than {chunked_encode.CHUNK_MIN_DURATION}s in keyframe-aligned '
+             f'chunks of about this many seconds, in parallel (default {chunked_encode.CHUNK_SECONDS})'
+    )
+    parser.add_argument(
+        '--preflight',
+        nargs='?',
+        type=float,
+        const=preflight.PREFLIGHT_MIN_SAVINGS_RATIO,
+        default=PREFLIGHT_MIN_SAVINGS_RATIO,
+        metavar='MIN_SAVINGS_RATIO',
+        help='Sample-encode each file first and skip it unless it is predicted to '
+             f'shrink by at least this ratio (default {preflight.PREFLIGHT_MIN_SAVINGS_RATIO})'
+    )
+    parser.add_argument(
+        '--verify',
+        nargs='?',
+        type=verify_quality.parse_thresholds,
+        const=verify_quality.DEFAULT_THRESHOLDS,
+        default=VERIFY_THRESHOLDS,
+        metavar='THRESHOLDS',
+        help='Score sampled windows of each encode against the original before committing it and '
+             'revert it below these minimum scores, e.g. "ssim=0.95,psnr=32" (default '
+             + ','.join(f"{name}={value:g}" for name, value in verify_quality.DEFAULT_THRESHOLDS.items())
+             + ')'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help=f'Continue the unfinished files recorded in {JOB_JOURNAL} instead of running a query'
+    )
+    parser.add_argument(
+        '--plan',
+        nargs='?',
+        const=PLAN_FILE,
+        metavar='PLAN_FILE',
+        help=f'Write the conversion plan for the query to a file and exit (default {PLAN_FILE})'
+    )
+    parser.add_argument(
+        '--from-plan',
+        metavar='PLAN_FILE',
+        help='Execute a plan file written with --plan instead of running a query'
+    )
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='After the query results, keep watching the library and convert new or changed files '
+             f'matching the query (saved to {WATCH_FILTER}, used when no WHERE clause is given)'
+    )
+    parser.add_argument(
+        '--watch-root',
+        action='append',
+        help='Library root to watch (repeatable, default: the scanner\'s library root)'
+    )
     
     args = parser.parse_args()
-    
-    # Validate WHERE clause for basic SQL injection prevention
-    if not validate_where_clause(args.where_clause):
-        logging.error("Invalid WHERE clause - potential SQL injection detected")
-        sys.exit(1)
-    
-    # Load CSV file
-    try:
-        df = pd.read_csv(CSV_FILE)
-        logging.info(f"Loaded {len(df)} records from {CSV_FILE}")
-    except FileNotFoundError:
-        logging.error(f"CSV file not found: {CSV_FILE}")
-        sys.exit(1)
-    except Exception as e:
-        logging.error(f"Error loading CSV: {e}")
-        sys.exit(1)
-    
-    # Validate DataFrame
-    if not validate_dataframe(df):
-        sys.exit(1)
-    
-    # Build and execute query
-    global query
-    if 'fileSize' in args.where_clause:
-        query = f"SELECT * FROM df {args.where_clause}"
+    if args.resume:
+        return resume_main(args)
+    if args.watch:
+        if not args.exec or args.backend != 'sqlite':
+            parser.error("--watch needs --exec and the sqlite backend")
+        if args.where_clause:
+            save_watch_filter(args.where_clause)
+        else:
+            args.where_clause = load_watch_filter()
+            if not args.where_clause:
+                parser.error(f"--watch needs a WHERE clause - none saved in {WATCH_FILTER} yet")
+    if args.from_plan:
+        conn, result_df = load_plan_candidates(args.from_plan)
+    elif args.where_clause:
+        conn, result_df = query_candidates(args)
     else:
-        query = f"SELECT * FROM df {args.where_clause} AND fileSize > {DEFAULT_FILESIZE_THRESHOLD}"
+        parser.error("where_clause is required unless --resume or --from-plan is given")
     
-    logging.info(f"Executing query: {query}")
+    if args.plan:
+        write_plan(result_df, args.plan)
+        sys.exit()
     
-    try:
-        result_df = sqldf(query, globals())
-    except Exception as e:
-        logging.error(f"Error executing query: {e}")
-        sys.exit(1)
+    # Files left half-done by an interrupted run belong to --resume
+    if args.exec:
+        unfinished = JOBS.unfinished()
+        if unfinished:
+            logging.warning(f"{len(unfinished)} unfinished files in {JOB_JOURNAL} are left out - "
+                            f"run with --resume to finish them")
+            result_df = result_df[~result_df['id'].isin(list(unfinished))].reset_index(drop=True)
+        else:
+            JOBS.reset_if_finished()
+    
+    if args.watch:
+        return watch_main(args, conn, result_df)
     
     record_count = len(result_df)
     
@@ -532,7 +1533,8 @@ def main():
     
     # Display-only mode
     if not args.exec:
-        logging.info(f"Display-only mode - results saved to {QUERY_RESULTS_FILE}")
+        write_plan(result_df)
+        logging.info(f"Display-only mode - results saved to {QUERY_RESULTS_FILE}, commands to {PLAN_FILE}")
         os.startfile(QUERY_RESULTS_FILE)
         sys.exit()
     
@@ -548,8 +1550,207 @@ def main():
     shutdown_when_finished = get_yes_no_input("Shutdown PC when finished?")
     
     # Process files
-    total_saved = process_files(result_df, df, process_files_flag, shutdown_when_finished)
+    slots = build_slot_limits(args)
+    
+    prefetch_depth = min(max(0, args.prefetch), MAX_PREFETCH_DEPTH)
+    if prefetch_depth and args.jobs > 1:
+        logging.warning("--prefetch is ignored with --jobs; use --copy-slots instead")
+    
+    total_saved = process_files(result_df, conn, process_files_flag, shutdown_when_finished,
+                                max(1, args.jobs), slots, prefetch_depth, args.preflight,
+                                args.chunked, args.verify)
+    finish_run(total_saved, shutdown_when_finished)
+
+
+def get_catalog_columns(conn, backend):
+    """Column names of the catalog the query will run against."""
+    if backend == 'columnar':
+        import catalog_columnar
+        catalog_columnar.refresh_if_stale(conn, db_file=CATALOG_DB, journal_file=UPDATE_JOURNAL)
+        return catalog_columnar.get_parquet_columns()
+    return catalog_db.get_columns(conn)
+
+
+def build_where_clause(where_clause, conn, backend):
+    """Add the default size threshold and the duplicate filter to a WHERE clause."""
+    if 'fileSize' not in where_clause:
+        where_clause = f"{where_clause} AND fileSize > {DEFAULT_FILESIZE_THRESHOLD}"
+    # Copies marked by duplicate_finder.py are left out unless the clause mentions them
+    if 'duplicateOf' not in where_clause and 'duplicateOf' in get_catalog_columns(conn, backend):
+        where_clause = f"{where_clause} AND duplicateOf IS NULL"
+    return where_clause
+
+
+def query_candidates(args):
+    """Open the catalog and run the query; returns (conn, ordered candidate rows)."""
+    # Validate WHERE clause for basic SQL injection prevention
+    if not validate_where_clause(args.where_clause):
+        logging.error("Invalid WHERE clause - potential SQL injection detected")
+        sys.exit(1)
+    
+    # Open the catalog database
+    try:
+        conn = catalog_db.open_catalog(CATALOG_DB, CSV_FILE, UPDATE_JOURNAL)
+    except Exception as e:
+        logging.error(f"Error opening catalog: {e}")
+        sys.exit(1)
+    
+    # Build and execute query
+    global query
+    where_clause = build_where_clause(args.where_clause, conn, args.backend)
+    query = f"SELECT * FROM {catalog_db.CATALOG_TABLE} {where_clause}"
     
+    logging.info(f"Executing query ({args.backend}): {query}")
+    
+    try:
+        if args.backend == 'columnar':
+            import catalog_columnar
+            result_df = catalog_columnar.query_columnar(where_clause)
+        else:
+            result_df = pd.read_sql_query(query, conn)
+    except Exception as e:
+        logging.error(f"Error executing query: {e}")
+        sys.exit(1)
+    
+    # Validate DataFrame
+    if not validate_dataframe(result_df):
+        sys.exit(1)
+    
+    # Leave out files already reverted with this encoder profile
+    if not os.path.exists(SKIP_LIST):
+        SKIPS.seed_from_catalog(conn, ENCODER_PROFILE)
+    skipped = pd.Series([SKIPS.is_skipped(path, size, ENCODER_PROFILE)
+                         for path, size in zip(result_df['filePath'], result_df['fileSize'])],
+                        index=result_df.index, dtype=bool)
+    if skipped.any():
+        logging.info(f"Skipping {skipped.sum()} files reverted before with this encoder profile "
+                     f"(see {SKIP_LIST})")
+        result_df = result_df[~skipped]
+    
+    # Estimate savings against the NVENC profile, then filter and order jobs
+    result_df = savings_estimator.estimate_savings(result_df, NVENC_MAXRATE, NVENC_CQ)
+    result_df = savings_estimator.order_candidates(
+        result_df, args.order, args.min_savings, args.max_grow_probability
+    )
+    return conn, result_df
+
+
+def load_plan_candidates(plan_file):
+    """
+    Load a plan file for execution. The catalog is optional: without one,
+    catalog updates stay in the update journal for the catalog host.
+    """
+    global query
+    try:
+        query, result_df = read_plan(plan_file)
+    except (OSError, ValueError) as e:
+        logging.error(f"Error reading plan {plan_file}: {e}")
+        sys.exit(1)
+    
+    if not validate_dataframe(result_df):
+        sys.exit(1)
+    
+    conn = None
+    if os.path.exists(CATALOG_DB):
+        conn = catalog_db.open_catalog(CATALOG_DB, CSV_FILE, UPDATE_JOURNAL)
+    return conn, result_df
+
+
+def build_slot_limits(args):
+    """Build the copy/encoder slot limits from the command-line options."""
+    try:
+        return conversion_scheduler.SlotLimits(
+            conversion_scheduler.parse_slot_limits(args.encoder_slots), max(1, args.copy_slots)
+        )
+    except ValueError as e:
+        logging.error(str(e))
+        sys.exit(1)
+
+
+def resume_main(args):
+    """Resume the unfinished files of an interrupted run from the job journal."""
+    global query
+    jobs = JOBS.unfinished()
+    if not jobs:
+        logging.info(f"Nothing to resume - no unfinished files in {JOB_JOURNAL}")
+        sys.exit()
+    
+    try:
+        conn = catalog_db.open_catalog(CATALOG_DB, CSV_FILE, UPDATE_JOURNAL)
+        result_df = load_resume_rows(conn, jobs)
+    except Exception as e:
+        logging.error(f"Error opening catalog: {e}")
+        sys.exit(1)
+    
+    query = f"RESUME {JOB_JOURNAL}"
+    missing = len(jobs) - len(result_df)
+    if missing:
+        logging.warning(f"{missing} unfinished files are no longer in the catalog")
+    for file_id, job in jobs.items():
+        logging.info(f"File {file_id}: last state '{job['state']}' (run {job.get('run')})")
+    
+    if not get_yes_no_input(f"{len(result_df)} unfinished files found. Resume them?"):
+        logging.info("User cancelled processing")
+        sys.exit()
+    
+    shutdown_when_finished = get_yes_no_input("Shutdown PC when finished?")
+    total_saved = process_files_resume(result_df, conn, jobs, shutdown_when_finished,
+                                       build_slot_limits(args), args.chunked, args.verify)
+    finish_run(total_saved, shutdown_when_finished)
+
+
+def save_watch_filter(where_clause, watch_file=WATCH_FILTER):
+    """Save the watch query so --watch can be restarted without it."""
+    with open(watch_file, 'w', encoding='utf-8') as f:
+        json.dump({'where': where_clause, 'saved': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+
+
+def load_watch_filter(watch_file=WATCH_FILTER):
+    """Return the saved watch query, or None."""
+    if not os.path.exists(watch_file):
+        return None
+    with open(watch_file, 'r', encoding='utf-8') as f:
+        saved = json.load(f)
+    logging.info(f"Watch query from {watch_file} (saved {saved.get('saved')}): {saved['where']}")
+    return saved['where']
+
+
+def match_watch_filter(conn, file_id, where_clause, args):
+    """
+    Return the catalog row of a file the watcher updated, estimated and
+    filtered like the query results, if it matches the watch query. The
+    skip list is checked against its in-memory entries by path.
+    """
+    result_df = pd.read_sql_query(
+        f"SELECT * FROM (SELECT * FROM {catalog_db.CATALOG_TABLE} {where_clause}) WHERE id = ?",
+        conn, params=[int(file_id)]
+    )
+    if result_df.empty or SKIPS.is_skipped(
+            result_df['filePath'].iloc[0], result_df['fileSize'].iloc[0], ENCODER_PROFILE):
+        return result_df.iloc[0:0]
+    result_df = savings_estimator.estimate_savings(result_df, NVENC_MAXRATE, NVENC_CQ)
+    return savings_estimator.order_candidates(
+        result_df, args.order, args.min_savings, args.max_grow_probability
+    )
+
+
+def watch_main(args, conn, result_df):
+    """Convert the query results, then keep converting matches the library watcher finds."""
+    if not get_yes_no_input(f"{len(result_df)} files found. Process them and keep watching the library?"):
+        logging.info("User cancelled processing")
+        sys.exit()
+    
+    result_df.to_csv(QUERY_RESULTS_FILE, index=False)
+    watcher = library_watcher.LibraryWatcher(args.watch_root, db_file=CATALOG_DB, backups=BACKUPS,
+                                             cache=PROBES)
+    where_clause = build_where_clause(args.where_clause, conn, args.backend)
+    total_saved = process_files_watch(result_df, conn, watcher, where_clause, args,
+                                      max(1, args.jobs), build_slot_limits(args))
+    finish_run(total_saved, False)
+
+
+def finish_run(total_saved, shutdown_when_finished):
+    """Report the session and offer the follow-up actions."""
     # Cleanup and final actions
     set_terminal_title_windows("Command")
     logging.info(f"Processing complete. Total space saved: {total_saved:,} bytes")
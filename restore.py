@@ -1,22 +1,29 @@
 import sys
 import os
 import shutil
+import backup_index
+import skip_list
 
 sourcePath = sys.argv[1]
 destPath   = sys.argv[2]
 
+# Backups of reverted files are only placeholders, known from the skip list
+skippedBackups = skip_list.SkipList().backup_keys()
+
 try:
     if os.path.exists(sourcePath) and os.path.exists(destPath):
         destFolder = os.path.dirname(destPath)
         srcFolder  = os.path.dirname(sourcePath)
-        if os.path.getsize(sourcePath) > 50:
+        sourceKey = '\\'.join(backup_index.split_key(sourcePath)).casefold()
+        # Only files under the marker size are checked; the skip list saves opening them
+        isPlaceholder = os.path.getsize(sourcePath) <= skip_list.MARKER_MAX_SIZE and \
+            (sourceKey in skippedBackups or skip_list.is_marker(sourcePath))
+        if not isPlaceholder:
             os.remove(destPath)
             shutil.move(sourcePath, destFolder)
             print(f"moved {sourcePath} to folder {destFolder}")
         else:
-            with open(sourcePath, 'r') as file:
-                file_content = file.read().replace('\n','')
-                input(f"removing the placeholder, {file_content}: {sourcePath}")
+            input(f"removing the placeholder, {skip_list.MARKER_TEXT}: {sourcePath}")
             os.remove(sourcePath)
     else:
         input(f"a path is missing. {sourcePath}, {destPath}")
@@ -24,6 +31,3 @@ try:
 except Exception as e:
     # This is a general exception handler that catches any other unexpected errors
     input(f"An unexpected error occurred: {e}")
-
-
-
@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+import logging
+
+#####################################
+##                                 ##
+##  Conversion Savings Estimator   ##
+##    Vectorized size prediction   ##
+##    and job ordering             ##
+##                                 ##
+#####################################
+
+# ==================== MODEL SETTINGS ====================
+# Typical hevc_nvenc output for 1080p film content at the reference CQ
+REFERENCE_PIXELS = 1920 * 1080
+REFERENCE_KBPS = 2200
+REFERENCE_CQ = 28
+# Each +6 CQ roughly halves the bitrate
+CQ_HALVING_STEP = 6
+# Bitrate grows slower than pixel count
+RESOLUTION_EXPONENT = 0.75
+
+# Expected output/input video bitrate ratio at similar quality, by source codec
+CODEC_EFFICIENCY = {
+    'mpeg1video': 0.30,
+    'mpeg2video': 0.35,
+    'msmpeg4v3': 0.45,
+    'mpeg4': 0.45,
+    'wmv3': 0.45,
+    'vc1': 0.50,
+    'h264': 0.60,
+    'vp8': 0.60,
+    'hevc': 1.00,
+    'vp9': 1.05,
+    'av1': 1.20
+}
+DEFAULT_CODEC_EFFICIENCY = 0.60
+
+# Audio is stream-copied; assume this much of the file bitrate is audio
+AUDIO_KBPS = 448
+MAX_AUDIO_SHARE = 0.3
+
+# Log-normal spread of the actual output size around the estimate
+SIZE_UNCERTAINTY = 0.35
+
+# Encode speed (x realtime) for 1080p, scaled by pixel count
+ENCODE_SPEED_1080P = 6.0
+
+ORDER_CHOICES = ['catalog', 'savings', 'rate']
+
+
+def parse_rate_kbps(rate):
+    """Convert an ffmpeg rate such as '3000k' or '3M' to kbps."""
+    text = str(rate).strip().lower()
+    if text.endswith('k'):
+        return float(text[:-1])
+    if text.endswith('m'):
+        return float(text[:-1]) * 1000
+    return float(text) / 1000
+
+
+def _normal_cdf(z):
+    """Vectorized standard normal CDF (Abramowitz and Stegun 7.1.26)."""
+    x = np.abs(z) / np.sqrt(2.0)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+                + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+# ==================== ESTIMATION ====================
+def estimate_savings(df, maxrate, cq):
+    """
+    Add savings estimates to a copy of the catalog rows, using the target
+    maxrate/CQ profile. All arithmetic is done on whole columns.
+    """
+    df = df.copy()
+    maxrate_kbps = parse_rate_kbps(maxrate)
+
+    duration = pd.to_numeric(df['durationSeconds'], errors='coerce').fillna(0).to_numpy(float)
+    file_size = pd.to_numeric(df['fileSize'], errors='coerce').fillna(0).to_numpy(float)
+    width = pd.to_numeric(df['frameWidth'], errors='coerce').fillna(0).to_numpy(float)
+    height = pd.to_numeric(df['frameHeight'], errors='coerce').fillna(0).to_numpy(float)
+    pixels = np.where(width * height > 0, width * height, REFERENCE_PIXELS)
+    codec = df['videoCodecName'].astype(str).str.lower()
+    efficiency = codec.map(CODEC_EFFICIENCY).fillna(DEFAULT_CODEC_EFFICIENCY).to_numpy(float)
+
+    # Rows without a duration end up as NaN and are treated as "will grow"
+    with np.errstate(invalid='ignore', divide='ignore'):
+        safe_duration = np.where(duration > 0, duration, np.nan)
+        source_kbps = file_size * 8 / 1024 / safe_duration
+        audio_kbps = np.minimum(AUDIO_KBPS, source_kbps * MAX_AUDIO_SHARE)
+        source_video_kbps = source_kbps - audio_kbps
+
+        # CQ-driven target, capped by maxrate and by what the source codec allows
+        cq_kbps = (REFERENCE_KBPS * (pixels / REFERENCE_PIXELS) ** RESOLUTION_EXPONENT
+                   * 2 ** ((REFERENCE_CQ - float(cq)) / CQ_HALVING_STEP))
+        video_kbps = np.minimum(np.minimum(cq_kbps, maxrate_kbps), source_video_kbps * efficiency)
+        output_bytes = (video_kbps + audio_kbps) * 1024 / 8 * safe_duration
+
+        # Probability that the real output ends up larger than the source
+        ratio = np.where(output_bytes > 0, file_size / output_bytes, np.nan)
+        grow_probability = 1.0 - _normal_cdf(np.log(np.where(ratio > 0, ratio, np.nan)) / SIZE_UNCERTAINTY)
+
+        # Files that grow get reverted, so they contribute no savings
+        saved_bytes = np.clip(file_size - output_bytes, 0, None) * (1.0 - grow_probability)
+        encode_seconds = duration * (pixels / REFERENCE_PIXELS) / ENCODE_SPEED_1080P
+
+    df['estimatedOutputBytes'] = np.where(np.isnan(output_bytes), file_size, output_bytes).round()
+    df['estimatedSavedBytes'] = np.nan_to_num(saved_bytes).round()
+    df['growProbability'] = np.nan_to_num(grow_probability, nan=1.0).round(3)
+    df['estimatedEncodeSeconds'] = encode_seconds.round()
+    df['savingsPerEncodeSecond'] = np.where(
+        encode_seconds > 0, df['estimatedSavedBytes'] / np.maximum(encode_seconds, 1), 0
+    ).round()
+    return df
+
+
+def order_candidates(df, order='rate', min_savings=0, max_grow_probability=1.0):
+    """
+    Filter and order estimated rows. 'rate' puts the most bytes saved per
+    encode second first, so a cancelled run has banked most of the
+    achievable savings; 'savings' orders by total bytes; 'catalog' keeps
+    the query order.
+    """
+    keep = (df['estimatedSavedBytes'] >= min_savings) & (df['growProbability'] <= max_grow_probability)
+    skipped = int((~keep).sum())
+    if skipped:
+        logging.info(f"Skipping {skipped} files below the savings/grow-probability thresholds")
+    df = df[keep]
+
+    if order == 'savings':
+        df = df.sort_values('estimatedSavedBytes', ascending=False, kind='stable')
+    elif order == 'rate':
+        df = df.sort_values('savingsPerEncodeSecond', ascending=False, kind='stable')
+    return df.reset_index(drop=True)
@@ -0,0 +1,412 @@
+import subprocess
+import argparse
+import logging
+import json
+import time
+import csv
+import sys
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from media_info import normalize_media_info
+import catalog_db
+import backup_index
+import header_probe
+import probe_cache
+
+#####################################
+##                                 ##
+##  Emby Library Scanner           ##
+##    Single-pass replacement for  ##
+##    get-library-details-json.bat ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+FFPROBE_PATH = 'H:\\ffmpeg\\ffprobe'
+LIBRARY_ROOT = 'H:\\HTPC\\embyServer\\libraries\\Public Libraries\\'
+BACKUP_ROOT = 'H:\\HTPC\\libraryAnalyzer\\originalStreams'
+CSV_FILE = 'fileList.csv'
+DEFAULT_EXCLUDES = '\\Home Videos,\\Christmas'
+MEDIA_EXTENSIONS = ('.mkv', '.avi', '.mpeg', '.mp4', '.mov', '.wmv', '.flv', '.webm')
+PROBE_WORKERS = 8
+PROGRESS_INTERVAL = 0.5
+
+# Catalog columns, in the order the batch scanner wrote them. This is a
+# superset of query_csv_AIRefactored.REQUIRED_COLUMNS.
+CATALOG_COLUMNS = [
+    'id', 'filePath', 'fileExt', 'videoCodecName', 'audioCodecName',
+    'frameWidth', 'frameHeight', 'durationSeconds', 'formattedDuration',
+    'fileSize', 'kbps', 'originalFileBackup', 'originalFileSize', 'fileMtime'
+]
+
+# Columns a changed file keeps from its previous catalog row; everything else
+# (media details, duplicateOf) described the old contents
+IDENTITY_COLUMNS = ['id', 'originalFileBackup', 'originalFileSize']
+
+
+# ==================== DIRECTORY WALK ====================
+def parse_excludes(exclude_arg):
+    """Split the comma separated exclusion argument ("0" disables exclusions)."""
+    if exclude_arg is None:
+        exclude_arg = DEFAULT_EXCLUDES
+    if exclude_arg.strip() in ('', '0'):
+        return []
+    return [part.strip().replace('\\', os.sep).casefold()
+            for part in exclude_arg.split(',') if part.strip()]
+
+
+def is_excluded(path, excludes):
+    """Return True if the directory path contains any excluded substring."""
+    folded = path.casefold()
+    return any(excl in folded for excl in excludes)
+
+
+def iter_media_files(roots, excludes):
+    """
+    Walk the library roots once with os.scandir, yielding (path, size,
+    mtime_ns) for each media file. Excluded directories are pruned before
+    descending.
+    """
+    stack = list(reversed(roots))
+    while stack:
+        directory = stack.pop()
+        subdirs = []
+        files = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if is_excluded(entry.path, excludes):
+                                logging.info(f"Skipped: {entry.path}")
+                            else:
+                                subdirs.append(entry.path)
+                        elif entry.name.lower().endswith(MEDIA_EXTENSIONS):
+                            stat = entry.stat()
+                            files.append((entry.path, stat.st_size, stat.st_mtime_ns))
+                    except OSError as e:
+                        logging.warning(f"Could not read {entry.path}: {e}")
+        except OSError as e:
+            logging.warning(f"Could not scan directory {directory}: {e}")
+            continue
+
+        yield from sorted(files)
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+# ==================== PROBING ====================
+def probe_file(filepath, use_headers=True):
+    """
+    Probe a single file and return ffprobe-shaped JSON. Matroska and MP4
+    files are read from their container headers in-process; other files,
+    and any the header parser cannot handle, are probed with ffprobe.
+    """
+    if use_headers:
+        return header_probe.probe_with_fallback(filepath, run_ffprobe)
+    return run_ffprobe(filepath)
+
+
+def run_ffprobe(filepath):
+    """Probe a single file with ffprobe; raises CalledProcessError on failure."""
+    command = [
+        FFPROBE_PATH,
+        '-v', 'error',
+        '-show_streams',
+        '-show_entries',
+        'format=duration:stream=codec_type,codec_name,width,height',
+        '-of', 'json=c=1',
+        filepath
+    ]
+    result = subprocess.run(command, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout)
+
+
+def scan_file(file_id, filepath, file_size, file_mtime, backups, previous_row=None, use_headers=True,
+              cache=None):
+    """
+    Probe one file and build its catalog row. When a previous catalog row is
+    given, only its id and backup details are carried over. fileMtime is
+    left empty if the probe fails, so the next incremental scan retries the
+    file. With a probe cache, files whose size and mtime are unchanged are
+    not probed.
+    """
+    row = dict.fromkeys(CATALOG_COLUMNS, '')
+    if previous_row:
+        row.update({column: previous_row.get(column, '') for column in IDENTITY_COLUMNS})
+    row.update({
+        'id': file_id,
+        'filePath': filepath,
+        'fileExt': os.path.splitext(filepath)[1].lstrip('.'),
+        'fileSize': file_size
+    })
+
+    backup = backups.find_original(filepath)
+    if backup:
+        row['originalFileBackup'], row['originalFileSize'] = backup
+
+    try:
+        probe = lambda path: probe_file(path, use_headers)
+        info = cache.get_or_probe(filepath, probe, file_size, file_mtime) if cache else probe(filepath)
+        row.update(normalize_media_info(info, file_size))
+        row['fileMtime'] = file_mtime
+    except subprocess.CalledProcessError as e:
+        logging.error(f"Error calling ffprobe for {filepath}: {e.stderr.strip()}")
+    except FileNotFoundError:
+        logging.error(f"Error: ffprobe not found at {FFPROBE_PATH}")
+    except (json.JSONDecodeError, KeyError, ValueError) as e:
+        logging.error(f"Could not parse ffprobe output for {filepath}: {e}")
+    return row
+
+
+# ==================== PROGRESS ====================
+class ScanProgress:
+    """Single-line console progress, redrawn at most every PROGRESS_INTERVAL."""
+
+    def __init__(self):
+        self.found = 0
+        self.probed = 0
+        self.last_draw = 0.0
+
+    def update(self, current_path, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_draw < PROGRESS_INTERVAL:
+            return
+        self.last_draw = now
+        pct = int(self.probed * 100 / self.found) if self.found else 0
+        line = f"Scanning: {self.found:>7} found, {self.probed:>7} probed ({pct:>3}%): {current_path}"
+        sys.stdout.write(f"\r{line[:199]:<199}")
+        sys.stdout.flush()
+
+    def finish(self):
+        sys.stdout.write("\n")
+        sys.stdout.flush()
+
+
+# ==================== INCREMENTAL RESCAN ====================
+def load_catalog(catalog_file):
+    """Load an existing catalog CSV, returning (columns, rows keyed by path)."""
+    with open(catalog_file, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        rows = {os.path.normcase(row['filePath']): row for row in reader}
+        return reader.fieldnames or [], rows
+
+
+def load_catalog_db(db_file):
+    """Load the catalog database, returning (columns, rows keyed by path)."""
+    conn = catalog_db.open_catalog(db_file, csv_file='')
+    try:
+        rows = {os.path.normcase(row['filePath']): row
+                for row in catalog_db.iter_rows(conn) if row['filePath']}
+        return catalog_db.get_columns(conn), rows
+    finally:
+        conn.close()
+
+
+def is_unchanged(row, file_size, file_mtime):
+    """
+    Decide from stat() results alone whether a catalog row is still current.
+    Rows written before fileMtime existed are matched on size only.
+    """
+    if not row.get('videoCodecName'):
+        return False
+    try:
+        if int(float(row.get('fileSize'))) != file_size:
+            return False
+    except (TypeError, ValueError):
+        return False
+    mtime = row.get('fileMtime')
+    return mtime in (None, '') or str(mtime) == str(file_mtime)
+
+
+def next_catalog_id(rows):
+    """Return the next unused id so that existing ids stay stable."""
+    ids = [int(float(row['id'])) for row in rows.values() if row.get('id')]
+    return max(ids, default=0) + 1
+
+
+# ==================== MAIN SCAN ====================
+def scan_library(roots, excludes, output_file=CSV_FILE, workers=PROBE_WORKERS,
+                 backup_root=BACKUP_ROOT, incremental=False, db_file=catalog_db.CATALOG_DB,
+                 backup_index_file=None, use_headers=True, cache_file=probe_cache.PROBE_CACHE):
+    """
+    Scan the library roots and write the catalog CSV. Files are probed on a
+    bounded thread pool; rows are written in discovery order as they finish.
+
+    In incremental mode the existing catalog is reconciled against stat()
+    results: unchanged rows are kept as-is, only new or modified files are
+    probed, rows for missing files are dropped and ids are preserved. The
+    catalog database is the reference when it exists, otherwise the CSV.
+
+    Originals are looked up in a backup index keyed by gparent\\parent,
+    built with one walk of backup_root, or loaded from backup_index_file
+    (saved by the conversion tool) when given.
+
+    Unless use_headers is False, Matroska and MP4 files are probed from
+    their headers without starting ffprobe. Probe results are cached in
+    cache_file unless it is empty.
+
+    The finished CSV is imported into the catalog database unless db_file
+    is empty.
+    """
+    columns = list(CATALOG_COLUMNS)
+    existing = {}
+    if incremental:
+        if db_file and os.path.exists(db_file):
+            previous_columns, existing = load_catalog_db(db_file)
+            columns += [col for col in previous_columns if col not in columns]
+            logging.info(f"Loaded {len(existing)} existing records from {db_file}")
+        elif os.path.exists(output_file):
+            previous_columns, existing = load_catalog(output_file)
+            columns += [col for col in previous_columns if col not in columns]
+            logging.info(f"Loaded {len(existing)} existing records from {output_file}")
+        else:
+            logging.warning(f"No existing catalog at {output_file} - running a full scan")
+    next_id = next_catalog_id(existing)
+
+    if backup_index_file:
+        backups = backup_index.BackupIndex.load(backup_index_file, root=backup_root)
+    else:
+        backups = backup_index.BackupIndex(backup_root)
+    cache = probe_cache.ProbeCache(cache_file) if cache_file else None
+    progress = ScanProgress()
+    max_pending = workers * 4
+    temp_file = f"{output_file}.tmp"
+    unchanged_count = 0
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, \
+            open(temp_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        pending = deque()
+
+        def write_next():
+            row = pending.popleft().result()
+            writer.writerow(row)
+            progress.probed += 1
+            progress.update(row['filePath'])
+
+        for filepath, file_size, file_mtime in iter_media_files(roots, excludes):
+            progress.found += 1
+            previous_row = existing.pop(os.path.normcase(filepath), None)
+
+            if previous_row and is_unchanged(previous_row, file_size, file_mtime):
+                previous_row['fileMtime'] = file_mtime
+                done = Future()
+                done.set_result(previous_row)
+                pending.append(done)
+                unchanged_count += 1
+            else:
+                if previous_row:
+                    file_id = previous_row['id']
+                else:
+                    file_id = next_id
+                    next_id += 1
+                pending.append(pool.submit(scan_file, file_id, filepath, file_size,
+                                           file_mtime, backups, previous_row, use_headers, cache))
+
+            if len(pending) >= max_pending:
+                write_next()
+
+        while pending:
+            write_next()
+
+    progress.update('done', force=True)
+    progress.finish()
+    if cache:
+        cache.close()
+        logging.info(cache.stats())
+    os.replace(temp_file, output_file)
+
+    if incremental:
+        logging.info(f"Unchanged: {unchanged_count}, probed: {progress.probed - unchanged_count}, "
+                     f"removed: {len(existing)}")
+    logging.info(f"Wrote {progress.probed} records to {output_file}")
+
+    if db_file:
+        conn = catalog_db.connect(db_file)
+        try:
+            catalog_db.import_csv(conn, output_file)
+        finally:
+            conn.close()
+    return progress.probed
+
+
+def main():
+    """Main entry point for the script."""
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('scan.log'),
+            logging.StreamHandler()
+        ]
+    )
+
+    parser = argparse.ArgumentParser(
+        description='Scan the media library and write the catalog CSV',
+        epilog='Example: python scan_library.py "\\Home Videos,\\Christmas" --workers 8'
+    )
+    parser.add_argument(
+        'excludes',
+        nargs='?',
+        default=DEFAULT_EXCLUDES,
+        help='Comma separated path substrings to skip ("0" for none)'
+    )
+    parser.add_argument(
+        '--root',
+        action='append',
+        help=f'Library root to scan (repeatable, default: {LIBRARY_ROOT})'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=PROBE_WORKERS,
+        help='Number of concurrent ffprobe processes'
+    )
+    parser.add_argument(
+        '--output',
+        default=CSV_FILE,
+        help='Catalog CSV to write'
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Only re-probe new or changed files in the existing catalog'
+    )
+    parser.add_argument(
+        '--db',
+        default=catalog_db.CATALOG_DB,
+        help='Catalog database to update ("" to only write the CSV)'
+    )
+    parser.add_argument(
+        '--ffprobe-only',
+        action='store_true',
+        help='Probe every file with ffprobe instead of reading Matroska/MP4 headers directly'
+    )
+    parser.add_argument(
+        '--probe-cache',
+        default=probe_cache.PROBE_CACHE,
+        help='Probe result cache ("" to probe every file)'
+    )
+    parser.add_argument(
+        '--backup-index',
+        help=f'Use the backup index saved by a conversion run (e.g. {backup_index.BACKUP_INDEX}) '
+             f'instead of walking {BACKUP_ROOT}'
+    )
+
+    args = parser.parse_args()
+    excludes = parse_excludes(args.excludes)
+    logging.info(f"excluding: {args.excludes if excludes else 'nothing'}")
+
+    scan_library(args.root or [LIBRARY_ROOT], excludes, args.output, max(1, args.workers),
+                 incremental=args.incremental, db_file=args.db, backup_index_file=args.backup_index,
+                 use_headers=not args.ffprobe_only, cache_file=args.probe_cache)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        logging.info("\nScan interrupted by user")
+        sys.exit(0)
@@ -0,0 +1,137 @@
+import threading
+import logging
+import time
+import os
+import catalog_db
+import backup_index
+
+#####################################
+##                                 ##
+##  Conversion Skip List           ##
+##    Files not worth re-encoding  ##
+##    with the same profile        ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+SKIP_LIST = 'skipList.jsonl'
+
+# Reasons
+REVERTED = 'reverted'
+LOW_QUALITY = 'low-quality'
+CLEARED = 'cleared'
+
+# Reverted rows get this originalFileSize in the catalog; reverts from before
+# the skip list also left a marker file over the backup
+MARKER_TEXT = 'DO NOT PROCESS'
+MARKER_MAX_SIZE = 50
+MARKER_ORIGINAL_SIZE = 16
+
+
+def is_marker(path):
+    """True for a legacy 'DO NOT PROCESS' placeholder left at a backup path."""
+    try:
+        if os.path.getsize(path) > MARKER_MAX_SIZE:
+            return False
+        with open(path, 'r', errors='replace') as f:
+            return f.read().strip() == MARKER_TEXT
+    except OSError:
+        return False
+
+
+def path_key(path):
+    """Casefolded library path with backslashes, the skip list's key."""
+    return str(path).replace('/', '\\').casefold()
+
+
+class SkipList:
+    """
+    Append-only list of files whose conversion was reverted, with the
+    encoder profile and sizes of the attempt. Entries are keyed by library
+    path, so they survive a full rescan renumbering the catalog ids, and
+    hold the file's size so a replaced file is tried again. The latest
+    entry per path wins; a 'cleared' entry removes a file again.
+    """
+
+    def __init__(self, skip_file=SKIP_LIST):
+        self.skip_file = skip_file
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @property
+    def entries(self):
+        """{path key: latest entry} of the files currently skipped."""
+        with self._lock:
+            return self._load()
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = {}
+            for entry in catalog_db.read_journal(self.skip_file):
+                self._apply(entry)
+        return self._entries
+
+    def _apply(self, entry):
+        key = path_key(entry['filePath'])
+        if entry['reason'] == CLEARED:
+            self._entries.pop(key, None)
+        else:
+            self._entries[key] = entry
+
+    def _append(self, entry):
+        with self._lock:
+            self._load()
+            catalog_db.append_journal_entry(entry, self.skip_file)
+            self._apply(entry)
+
+    def record(self, file_path, file_size, reason, profile, original_size, encoded_size=None,
+               backup_path=None, file_id=None):
+        """Add a file, with the profile and sizes of the attempt that failed."""
+        self._append({
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'filePath': file_path,
+            'fileSize': int(float(file_size)),
+            'fileId': None if file_id is None else int(file_id),
+            'reason': reason,
+            'profile': profile,
+            'originalSize': int(float(original_size)),
+            'encodedSize': None if encoded_size is None else int(encoded_size),
+            'backupPath': backup_path
+        })
+
+    def clear(self, file_path):
+        """Remove a file, e.g. after it converted successfully with a new profile."""
+        if path_key(file_path) in self.entries:
+            self._append({'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'filePath': file_path,
+                          'reason': CLEARED})
+
+    def is_skipped(self, file_path, file_size, profile):
+        """True if this file, at this size, was skipped with this encoder profile."""
+        entry = self.entries.get(path_key(file_path))
+        try:
+            return (entry is not None and entry['profile'] == profile
+                    and entry['fileSize'] == int(float(file_size)))
+        except (TypeError, ValueError):
+            return False
+
+    def backup_keys(self):
+        """gparent\\parent\\filename keys of the backups of skipped files."""
+        return {'\\'.join(backup_index.split_key(entry['backupPath'])).casefold()
+                for entry in self.entries.values() if entry.get('backupPath')}
+
+    def seed_from_catalog(self, conn, profile):
+        """
+        Create the skip list from reverts recorded before it existed, which
+        the catalog marks with originalFileSize 16. They are attributed to
+        the current profile since the one used is not known. The file is
+        created even when there are none, so seeding runs only once.
+        """
+        rows = list(catalog_db.iter_rows(
+            conn, f"WHERE originalFileSize = {MARKER_ORIGINAL_SIZE} AND originalFileBackup IS NOT NULL"
+        ))
+        for row in rows:
+            self.record(row['filePath'], row['fileSize'], REVERTED, profile, row['fileSize'],
+                        backup_path=row['originalFileBackup'], file_id=row['id'])
+        open(self.skip_file, 'a').close()
+        logging.info(f"Seeded {self.skip_file} with {len(rows)} earlier reverts")
+        return len(rows)
@@ -0,0 +1,129 @@
+import subprocess
+import unittest
+import tempfile
+import shutil
+import glob
+import json
+import time
+import sys
+import os
+from unittest import mock
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+BENCHMARK_DIR = os.path.join(REPO_DIR, 'benchmarks')
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCHMARK_DIR)
+
+import chunked_encode
+from run_benchmarks import make_stub_command
+from stub_media import describe_file
+
+#####################################
+##                                 ##
+##  Chunked Encoding Tests         ##
+##    Split, chunk encodes and     ##
+##    concat through stub binaries ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+# Described by stub_media as a 7214.844s movie with a video and an audio stream
+SOURCE_NAME = 'movie0.mkv'
+CHUNK_SECONDS = 1800
+# The stub ffprobe's keyframe interval
+KEYFRAME_INTERVAL = 4
+
+
+class ChunkedEncodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='chunked-test-')
+        self.addCleanup(shutil.rmtree, self.work_dir, ignore_errors=True)
+        stubs = os.path.join(self.work_dir, 'stubs')
+        os.makedirs(stubs)
+        self.ffmpeg_path = make_stub_command(os.path.join(BENCHMARK_DIR, 'stub_ffmpeg.py'), stubs)
+        ffprobe_path = make_stub_command(os.path.join(BENCHMARK_DIR, 'stub_ffprobe.py'), stubs)
+        patcher = mock.patch.object(chunked_encode, 'FFPROBE_PATH', ffprobe_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.source_path = os.path.join(self.work_dir, SOURCE_NAME)
+        with open(self.source_path, 'wb') as f:
+            f.truncate(1024 * 1024)
+        self.duration = describe_file(self.source_path)['duration']
+        self.output_path = os.path.join(self.work_dir, 'movie0-out.mkv')
+        self.work_root = os.path.join(self.work_dir, 'chunkWork')
+        self.chunk_dir = os.path.join(self.work_root, '7')
+        self.command_object = {
+            'fileId': 7,
+            'newFilePath': self.output_path,
+            'commands': [
+                ['robocopy', self.work_dir, self.work_dir, SOURCE_NAME, '/MOV'],
+                [self.ffmpeg_path, '-n', '-hwaccel', 'cuda', '-i', self.source_path,
+                 '-c:v', 'hevc_nvenc', '-cq:v', '28', '-c:a', 'copy', self.output_path]
+            ]
+        }
+
+    def encode(self, should_cancel=None):
+        return chunked_encode.encode_chunked(
+            self.command_object, self.duration, chunk_seconds=CHUNK_SECONDS, max_parallel=1,
+            should_cancel=should_cancel, work_root=self.work_root
+        )
+
+    def finished_chunks(self):
+        return sorted(os.path.basename(path) for path in glob.glob(os.path.join(self.chunk_dir, 'chunk_*.mkv'))
+                      if not path.endswith('.part.mkv'))
+
+    def test_plan_resume_and_concat(self):
+        # Cancel once two chunks are done; the plan and those chunks are kept
+        outcome = self.encode(should_cancel=lambda: len(self.finished_chunks()) >= 2)
+        self.assertEqual(outcome, 'cancelled')
+        self.assertEqual(self.finished_chunks(), ['chunk_0000.mkv', 'chunk_0001.mkv'])
+
+        with open(os.path.join(self.chunk_dir, chunked_encode.PLAN_FILE), 'r', encoding='utf-8') as f:
+            plan = json.load(f)
+        points = plan['points']
+        self.assertEqual(plan['source'], self.source_path)
+        self.assertEqual(points[0], 0.0)
+        self.assertEqual(points[-1], self.duration)
+        self.assertEqual(points, sorted(points))
+        for point in points[1:-1]:
+            self.assertAlmostEqual(point / KEYFRAME_INTERVAL, round(point / KEYFRAME_INTERVAL), places=3)
+            self.assertLess(abs(point - round(point / CHUNK_SECONDS) * CHUNK_SECONDS), KEYFRAME_INTERVAL)
+
+        # The second run encodes only the missing chunks, then concatenates
+        with mock.patch.object(chunked_encode, 'encode_chunk', wraps=chunked_encode.encode_chunk) as encode_chunk, \
+                mock.patch.object(chunked_encode.subprocess, 'run', wraps=subprocess.run) as run:
+            outcome = self.encode()
+        self.assertEqual(outcome, 'done')
+        self.assertEqual([call.args[3] for call in encode_chunk.call_args_list], list(range(2, len(points) - 1)))
+        self.assertTrue(os.path.exists(self.output_path))
+        self.assertFalse(os.path.exists(self.chunk_dir))
+
+        concat = next(call.args[0] for call in run.call_args_list if call.args[0][0] == self.ffmpeg_path)
+        list_path = os.path.join(self.chunk_dir, chunked_encode.CONCAT_LIST_FILE)
+        self.assertEqual(concat[concat.index('-f'):concat.index('-map')],
+                         ['-f', 'concat', '-safe', '0', '-i', list_path, '-i', self.source_path])
+        # Video from the chunks; audio (stream 1 of the stub source), metadata and chapters from the source
+        self.assertEqual(concat[concat.index('-map'):concat.index('-map_metadata')],
+                         ['-map', '0:v', '-map', '1:1'])
+        self.assertEqual(concat[concat.index('-map_metadata'):-1],
+                         ['-map_metadata', '1', '-map_chapters', '1', '-c:v', 'copy', '-c:a', 'copy'])
+        self.assertEqual(concat[-1], self.output_path)
+
+    def test_cancel_stops_running_chunk(self):
+        # A slow stub: each chunk would take 18s
+        started = time.monotonic()
+        with mock.patch.dict(os.environ, {'STUB_FFMPEG_SPEED': '100'}), \
+                mock.patch.object(chunked_encode, 'CANCEL_POLL_SECONDS', 0.05):
+            outcome = self.encode(should_cancel=lambda: time.monotonic() - started > 1)
+        self.assertEqual(outcome, 'cancelled')
+        self.assertLess(time.monotonic() - started, 10)
+        self.assertEqual(self.finished_chunks(), [])
+        self.assertEqual(glob.glob(os.path.join(self.chunk_dir, '*.part.mkv')), [])
+        self.assertTrue(os.path.exists(os.path.join(self.chunk_dir, chunked_encode.PLAN_FILE)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import subprocess
+import functools
+import logging
+import json
+import time
+import re
+from concurrent.futures import ThreadPoolExecutor
+import preflight
+
+#####################################
+##                                 ##
+##  Conversion Verification        ##
+##    Sampled SSIM/PSNR/VMAF plus  ##
+##    duration and stream checks   ##
+##                                 ##
+#####################################
+
+# ==================== CONFIGURATION ====================
+VERIFY_SAMPLES = 4
+VERIFY_SAMPLE_SECONDS = 5
+# Windows are scored on the CPU, one ffmpeg process each
+VERIFY_WORKERS = 4
+VERIFY_LOG = 'verifyLog.jsonl'
+
+# Lowest acceptable score of any window; VMAF is only used when ffmpeg has libvmaf
+DEFAULT_THRESHOLDS = {'ssim': 0.95, 'psnr': 32.0, 'vmaf': 85.0}
+# Output duration may differ from the original by this many seconds or this share
+DURATION_TOLERANCE_SECONDS = 1.0
+DURATION_TOLERANCE_RATIO = 0.005
+# The encode keeps ffmpeg's default selection: one stream of each of these types
+CHECKED_STREAM_TYPES = ('video', 'audio')
+
+# Outcomes
+PASSED = 'passed'
+LOW_QUALITY = 'low-quality'
+BROKEN = 'broken'
+
+SSIM_PATTERN = re.compile(r'SSIM .*All:([\d.]+)')
+PSNR_PATTERN = re.compile(r'PSNR .*average:([\d.]+|inf)')
+VMAF_PATTERN = re.compile(r'VMAF score[:=]\s*([\d.]+)')
+
+
+def parse_thresholds(spec):
+    """Parse "ssim=0.95,psnr=32,vmaf=85" over the default thresholds."""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    for part in (spec or '').split(','):
+        if not part.strip():
+            continue
+        name, _, value = part.partition('=')
+        name = name.strip().lower()
+        if name not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Unknown metric '{name}' - expected one of {', '.join(DEFAULT_THRESHOLDS)}")
+        try:
+            thresholds[name] = float(value)
+        except ValueError:
+            raise ValueError(f"Invalid threshold '{part}' - expected metric=value")
+    return thresholds
+
+
+# ==================== STRUCTURE CHECKS ====================
+def stream_counts(info):
+    """Count the streams of an ffprobe result by codec_type."""
+    counts = {}
+    for stream in info.get('streams', []):
+        codec_type = stream.get('codec_type')
+        counts[codec_type] = counts.get(codec_type, 0) + 1
+    return counts
+
+
+def check_structure(original_info, output_info):
+    """
+    Compare durations and stream counts of the original and the output.
+    Returns '' when they match, otherwise the reason.
+    """
+    try:
+        original_duration = float(original_info['format']['duration'])
+        output_duration = float(output_info['format']['duration'])
+    except (KeyError, TypeError, ValueError):
+        return 'duration missing'
+    tolerance = max(DURATION_TOLERANCE_SECONDS, original_duration * DURATION_TOLERANCE_RATIO)
+    if abs(original_duration - output_duration) > tolerance:
+        return f'duration {output_duration:.1f}s, original {original_duration:.1f}s'
+
+    original_counts = stream_counts(original_info)
+    output_counts = stream_counts(output_info)
+    for codec_type in CHECKED_STREAM_TYPES:
+        expected = min(original_counts.get(codec_type, 0), 1)
+        if output_counts.get(codec_type, 0) < expected:
+            return f'{codec_type} stream missing'
+    return ''
+
+
+# ==================== QUALITY SCORES ====================
+@functools.lru_cache(maxsize=None)
+def has_vmaf(ffmpeg_path):
+    """True if this ffmpeg build has the libvmaf filter."""
+    try:
+        result = subprocess.run([ffmpeg_path, '-hide_banner', '-filters'], capture_output=True, text=True)
+    except OSError:
+        return False
+    return ' libvmaf ' in result.stdout
+
+
+def build_score_command(ffmpeg_path, original_path, output_path, start, seconds, use_vmaf):
+    """
+    One ffmpeg run scoring a window of the output (first input) against the
+    same window of the original, decoded on the CPU.
+    """
+    metrics = ['ssim', 'psnr'] + (['libvmaf'] if use_vmaf else [])
+    count = len(metrics)
+    distorted = ''.join(f'[d{index}]' for index in range(count))
+    reference = ''.join(f'[r{index}]' for index in range(count))
+    graph = (f"[0:v]settb=AVTB,setpts=PTS-STARTPTS,split={count}{distorted};"
+             f"[1:v]settb=AVTB,setpts=PTS-STARTPTS,split={count}{reference};"
+             + ';'.join(f'[d{index}][r{index}]{metric}' for index, metric in enumerate(metrics)))
+    window = ['-ss', f"{start:.3f}", '-t', str(seconds)]
+    return [ffmpeg_path, '-hide_banner', '-nostats',
+            *window, '-i', output_path,
+            *window, '-i', original_path,
+            '-lavfi', graph, '-f', 'null', '-']
+
+
+def parse_scores(log):
+    """Read the SSIM, PSNR and VMAF summaries from ffmpeg's log."""
+    scores = {}
+    for name, pattern in (('ssim', SSIM_PATTERN), ('psnr', PSNR_PATTERN), ('vmaf', VMAF_PATTERN)):
+        match = pattern.search(log)
+        if match:
+            scores[name] = float(match.group(1))
+    return scores
+
+
+def score_window(ffmpeg_path, original_path, output_path, start, seconds, use_vmaf):
+    """Score one window; returns {} if ffmpeg fails."""
+    command = build_score_command(ffmpeg_path, original_path, output_path, start, seconds, use_vmaf)
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, errors='replace')
+    except OSError as e:
+        logging.warning(f"Could not run {ffmpeg_path}: {e}")
+        return {}
+    if result.returncode != 0:
+        return {}
+    return parse_scores(result.stderr)
+
+
+def score_samples(ffmpeg_path, original_path, output_path, duration,
+                  count=VERIFY_SAMPLES, seconds=VERIFY_SAMPLE_SECONDS, workers=VERIFY_WORKERS):
+    """
+    Score evenly spaced windows in parallel and return the lowest score of
+    each metric over all windows, or None if any window could not be scored.
+    Files too short to sample are scored from the start.
+    """
+    starts = preflight.sample_windows(duration, count, seconds) or [0.0]
+    use_vmaf = has_vmaf(ffmpeg_path)
+    with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as pool:
+        windows = list(pool.map(
+            lambda start: score_window(ffmpeg_path, original_path, output_path, start, seconds, use_vmaf),
+            starts
+        ))
+    if not all(windows):
+        return None
+    return {name: min(window[name] for window in windows if name in window)
+            for name in DEFAULT_THRESHOLDS if any(name in window for window in windows)}
+
+
+# ==================== VERIFICATION ====================
+def verify_conversion(ffmpeg_path, original_path, output_path, original_info, output_info,
+                      thresholds=None, file_id=None, log_file=VERIFY_LOG):
+    """
+    Check an encode against its original before it is committed. Returns
+    (outcome, reason): PASSED, BROKEN for a wrong duration, missing streams
+    or windows that cannot be decoded, or LOW_QUALITY for a score below its
+    threshold. Every result is appended to the verification log.
+    """
+    thresholds = thresholds or DEFAULT_THRESHOLDS
+    started = time.perf_counter()
+    scores = None
+    reason = check_structure(original_info, output_info)
+    if reason:
+        outcome = BROKEN
+    else:
+        scores = score_samples(ffmpeg_path, original_path, output_path,
+                               float(original_info['format']['duration']))
+        if scores is None:
+            outcome, reason = BROKEN, 'sample windows could not be scored'
+        else:
+            low = [f"{name} {scores[name]:.3f} < {thresholds[name]}"
+                   for name in scores if scores[name] < thresholds[name]]
+            outcome, reason = (LOW_QUALITY, ', '.join(low)) if low else (PASSED, '')
+
+    entry = {
+        'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'fileId': None if file_id is None else int(file_id),
+        'filePath': output_path,
+        'outcome': outcome,
+        'reason': reason,
+        'scores': scores,
+        'seconds': round(time.perf_counter() - started, 2)
+    }
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry) + '\n')
+
+    if outcome == PASSED:
+        logging.info(f"Verified {output_path}: {scores}")
+    else:
+        logging.warning(f"Verification {outcome} for {output_path}: {reason}")
+    return outcome, reason